@@ -103,5 +103,13 @@ def test():
         print('Unit tests successful!')
 
 
+@cli.command()
+def benchmark():
+    """Run the performance benchmarks."""
+    print('Running benchmarks...')
+    from tests.benchmark import run_benchmarks
+    run_benchmarks()
+
+
 if __name__ == '__main__':
     cli()
@@ -3,7 +3,8 @@ import re
 
 from dists.msem.category import add_card_categories as msem_card_categories
 from dists.penny_dreadful.category import add_card_categories as pd_card_categories
-from shared.helpers.database import connect
+from shared.helpers.bulk_writer import bulk_insert
+from shared.helpers.database import bump_card_generation, connect
 from shared.helpers.util2 import print_card
 from shared.types.card import Card
 from shared.types.set import Expansion
@@ -91,7 +92,7 @@ def run() -> None:
     expansions = expansions_msem + expansions_pd
     logger.info(f'Found {len(expansions)} expansions, inserting...')
     client_sc.expansions.delete_many({})
-    client_sc.expansions.insert_many(expansions)
+    bulk_insert(client_sc.expansions, expansions)
     logger.info('Expansions inserted.')
 
     logger.info('Loading cards')
@@ -100,7 +101,8 @@ def run() -> None:
     cards = merge(cards_pd, cards_msem)
     logger.info(f'Found {len(cards)} cards, inserting...')
     client_sc.cards.delete_many({})
-    client_sc.cards.insert_many(cards)
+    bulk_insert(client_sc.cards, cards)
     logger.info('Cards inserted.')
+    bump_card_generation(client_sc)
     # logger.info('Checking exact matches.')
     # check_exactness({x['code']: Expansion().load(x) for x in expansions})
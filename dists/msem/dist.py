@@ -38,14 +38,28 @@ def scrape_decks() -> None:
 
 
 @msem.command()
-def calculate_popularities() -> None:
-    """Create the rules for color combinations."""
+@click.option('--competition', 'competitions', multiple=True,
+              help='Only update the popularities affected by this new competition. Can be repeated.')
+@click.option('--workers', default=1, help='The number of processes that tag decks and calculate formats in parallel.')
+def calculate_popularities(competitions: tuple[str, ...] = (), workers: int = 1) -> None:
+    """Calculate card popularities, either from scratch or for new competitions."""
     from .jobs.calculate_popularities import run
     logger.info('Starting calculation...')
-    run()
+    run(competitions=list(competitions), workers=workers)
     logger.info('Calculation complete.')
 
 
+@msem.command()
+@click.option('--only-new', is_flag=True, help='Only tag the decks that were not tagged yet.')
+@click.option('--workers', default=1, help='The number of processes that tag decks in parallel.')
+def tag_decks(only_new: bool = False, workers: int = 1) -> None:
+    """Apply the deck rules to the decks."""
+    from shared.helpers.tagging.core import run_all_decks, run_new_decks
+    logger.info('Starting tagging...')
+    (run_new_decks if only_new else run_all_decks)('msem', workers=workers)
+    logger.info('Tagging complete.')
+
+
 if __name__ == '__main__':
     initlogger()
     msem()
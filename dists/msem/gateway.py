@@ -6,6 +6,7 @@ from pymongo.errors import OperationFailure
 
 from shared.helpers.exceptions import DreadriseError, InvalidArgumentError
 from shared.helpers.tagging.core import MaybeCC
+from shared.helpers.util import clean_name
 from shared.types.card import Card
 
 logger = logging.getLogger('dreadrise.gateway.msem')
@@ -19,12 +20,12 @@ def parse(data: dict) -> dict:
             update_cards()
         elif data['action'] == 'create_competition':
             cache = create_competition(data)
-            create_archetype_thread(cache)
+            create_archetype_thread(cache, [clean_name(data['competition_name'])])
         elif data['action'] == 'create_multiple_competitions':
             cache = None
             for i in data['objects']:
                 cache = create_competition(i, card_cache=cache)
-            create_archetype_thread(cache)
+            create_archetype_thread(cache, [clean_name(x['competition_name']) for x in data['objects']])
         else:
             raise InvalidArgumentError('Invalid action: ' + data['action'])
 
@@ -43,19 +44,22 @@ def update_cards() -> None:
 
 
 def create_competition(data: dict, card_cache: MaybeCC = None) -> dict[str, Card]:
+    from shared.helpers.caching.competition_summaries import update_competition_summary
+
     from .jobs.scrape_decks import run_json
 
     logger.info('Updating decks...')
-    data = run_json(data, False, card_cache=card_cache)
+    cards = run_json(data, False, card_cache=card_cache)
+    update_competition_summary('msem', clean_name(data['competition_name']))
     logger.info('Update complete.')
-    return data
+    return cards
 
 
-def create_archetype_thread(card_cache: MaybeCC = None) -> None:
+def create_archetype_thread(card_cache: MaybeCC = None, competitions: list[str] | None = None) -> None:
     from .jobs.calculate_popularities import run
 
     def run_with_cache() -> None:
-        run(card_cache=card_cache, only_new=True)
+        run(card_cache=card_cache, only_new=True, competitions=competitions)
 
     logger.info('Updating archetypes...')
     archetype_thread = Thread(target=run_with_cache)
@@ -2,9 +2,10 @@ import logging
 
 import arrow
 
-from shared.helpers.caching.full_popularities import run_all_popularities
+from shared.helpers.caching.full_popularities import run_all_popularities, run_new_popularities
 from shared.helpers.database import connect
 from shared.helpers.tagging.core import MaybeCC, run_all_decks, run_new_decks
+from shared.helpers.util2 import get_dist_constants
 from shared.types.caching import CardPlayability
 from shared.types.deck import Deck
 
@@ -30,16 +31,27 @@ def _postprocess_playability(cp: CardPlayability, fmt: str, fmt_count: int) -> N
             cp.playability = 'played'
 
 
-def run(card_cache: MaybeCC = None, only_new: bool = False) -> None:
+def run(card_cache: MaybeCC = None, only_new: bool = False, competitions: list[str] | None = None,
+        workers: int = 1) -> None:
     """
     Calculates the popularity of various MSEM cards.
+    :param card_cache: the card dictionary, if it was already loaded
+    :param only_new: only tag the decks that do not have tags yet
+    :param competitions: if passed, only update the popularities affected by these new competitions
+    :param workers: the number of processes that tag decks and calculate formats in parallel
     :return: nothing
     """
     logger.info('Connecting...')
     client = connect('msem')
     logger.info('Running the archetype calculator')
     func = run_new_decks if only_new else run_all_decks
-    card_cache = func('msem', card_cache=card_cache)
+    card_cache = func('msem', card_cache=card_cache, workers=workers)
     logger.info('Calculating popularities')
-    # run_all_popularities(client, _postprocess_playability, _timecheck, card_cache=card_cache)
-    run_all_popularities(client, _postprocess_playability, card_cache=card_cache)
+    sideboard_importance = get_dist_constants('msem').GetSideboardImportance
+    if competitions:
+        run_new_popularities(client, _postprocess_playability, competitions, card_cache=card_cache,
+                             sideboard_importance=sideboard_importance, workers=workers)
+    else:
+        # run_all_popularities(client, _postprocess_playability, _timecheck, card_cache=card_cache)
+        run_all_popularities(client, _postprocess_playability, card_cache=card_cache,
+                             sideboard_importance=sideboard_importance, workers=workers)
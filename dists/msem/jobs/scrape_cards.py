@@ -5,8 +5,9 @@ from time import sleep
 import arrow
 
 from shared import fetch_tools
+from shared.helpers.bulk_writer import bulk_insert
 from shared.helpers.card_engines.cockatrice import process_cockatrice_set
-from shared.helpers.database import connect
+from shared.helpers.database import bump_card_generation, connect
 from shared.helpers.exceptions import DreadriseError, RisingDataError
 from shared.helpers.util2 import compare_cards
 from shared.types.card import Card
@@ -124,10 +125,11 @@ def run(check_integrity: bool = False) -> None:
         logger.warning('Starting the operation.')
         client = connect('msem')
         client.cards.delete_many({})
-        client.cards.insert_many([x.save() for x in card_arr])
+        bulk_insert(client.cards, (x.save() for x in card_arr))
         logger.info('Inserted cards.')
+        bump_card_generation(client)
         client.expansions.delete_many({})
-        client.expansions.insert_many([x.save() for x in expansions])
+        bulk_insert(client.expansions, (x.save() for x in expansions))
         logger.info('Inserted expansions.')
 
     except (DreadriseError, KeyError, ValueError):
@@ -1,13 +1,16 @@
 import logging
 import traceback
+from itertools import chain
 from time import sleep
 
 import arrow
 from pymongo.database import Database
 
 from shared import fetch_tools
-from shared.helpers.database import connect
+from shared.helpers.bulk_writer import bulk_insert
+from shared.helpers.database import bump_deck_generation, connect
 from shared.helpers.exceptions import DreadriseError, RisingDataError
+from shared.helpers.job_report import JobReport
 from shared.helpers.util import clean_card, clean_name, fix_long_words, shorten_name
 from shared.helpers.util2 import calculate_color_data
 from shared.types.card import Card
@@ -89,127 +92,135 @@ def smart_clean(name: str, cards: dict[str, Card]) -> str:
 def run_json(json: dict, timeout: bool = True, card_cache: dict[str, Card] | None = None) -> dict[str, Card]:
     logger.info('Connecting to the database')
     client = connect('msem')
-
-    already_loaded_cards = {} if not card_cache else set(card_cache.keys())
-    logger.info('Loading cards')
-    if card_cache:
-        all_cards = card_cache
-    else:
-        init_cards = {x['name']: Card().load(x) for x in client.cards.find({'layout': {'$ne': 'normal'}})}
-        all_cards = card_cache or {}
-        for k, v in init_cards.items():
-            all_cards[k] = v
-            if len(v.faces) > 1:
-                for f in v.faces:
-                    all_cards[f.name] = v
-                all_cards[' // '.join([x.name for x in v.faces])] = v
-
-    all_card_set = {clean_card(x) for y in json['decks'] for x in y['cards'] if x not in already_loaded_cards}
-    non_split_names = [x for x in all_card_set if x not in all_cards]
-    non_split_iter = ((x['name'], Card().load(x)) for x in client.cards.find({'name': {'$in': non_split_names}}))
-    for name, card in non_split_iter:
-        all_cards[name] = card
-    logger.info('{n} decks, {m} matches, {k} cards loaded'.format(n=len(json['decks']), m=len(json['matches']),
-                                                                  k=len(all_cards)))
-
-    comp_name, date, decks, matches = json['competition_name'], json['date'], json['decks'], json['matches']
-    date_object = arrow.get('20' + date.replace('_', '-')).datetime
-
-    old_comp = client.competitions.find_one({'name': comp_name})
-    # comp = Competition.objects(name=comp_name).first()
-    if old_comp:
-        if timeout:
-            logger.warning(f'Deleting {comp_name} in 5 seconds!')
-            sleep(5)
-        client.competitions.delete_one({'name': comp_name})
-        client.decks.delete_many({'competition': clean_name(comp_name)})
-        logger.warning(f'Deleted {comp_name}.')
-
-    if not decks:
-        logger.info('Not inserting any decks.')
-        return all_cards
-
-    comp = Competition()
-    comp.competition_id = clean_name(comp_name)
-    comp.name = comp_name
-    comp.format = 'msem'
-    comp.type = 'gp' if 'GP' in comp_name or 'Grand Prix' in comp_name else 'league'
-    comp.date = date_object
-    client.competitions.insert_one(comp.save())
-    logger.info('Created the competition')
-
-    for m in matches:
-        for u in m['players']:
-            if 'list' in u:
-                u['list'] = clean_name(u['list'][1:].replace('.txt', ''))
+    with JobReport('msem_decks', client, competition=json['competition_name']) as report:
+        with report.phase('load cards') as phase:
+            already_loaded_cards = {} if not card_cache else set(card_cache.keys())
+            logger.info('Loading cards')
+            if card_cache:
+                all_cards = card_cache
             else:
-                u['list'] = u['username'].lower() + str(u['run'])
-    logger.info('Parsed matches')
-
-    decks_by_id = {}
-    decks_by_name = {}
-    legacy_deck_ids = {}
-    for item in decks:
-        cards, deck_id = item['cards'], item.get('deck_id', '')
-        if 'name' in item:
-            deckname = item['name']
-        elif 'deck_name' in item:
-            deckname = item['deck_name']
-        else:
-            deckname = 'No name'
-        discord = item['user_discord'] if 'user_discord' in item else None
-        # this default username is tough but we'd have to work w/ it
-        if not deck_id and 'user' not in item:
-            raise RisingDataError('Some deck is missing both User and Deck ID keys!')
-        username = item['user'] if 'user' in item else deck_id.split('/')[-1].replace('.txt', '')[:-1]
-        removal = f"{username}'s "
-        deckname = fix_long_words(deckname.replace(removal, ''))
-        user_id = _create_user(client, shorten_name(username), discord)
-
-        d = Deck()
-        d.date = date_object
-        # if comp_type == CompetitionType.GP:
-        # d.deck_id = f'{comp.comp_id}--{clean_name(username)}'
-        # else:
-        if deck_id:
-            d.deck_id = clean_name(deck_id[1:].replace('.txt', ''))
-            decks_by_id[d.deck_id] = d
-        else:
-            d.deck_id = comp.competition_id + '-' + clean_name(username)
-            decks_by_name[username] = d
-            legacy_deck_ids[username] = d.deck_id
-        d.format = 'msem'
-        d.name = deckname
-        if 'name' not in item and 'deck_name' not in item:
-            d.is_name_placeholder = True
-        d.author = user_id
-        d.competition = comp.competition_id
-        d.mainboard = {smart_clean(name, all_cards): value['mainCount'] for name, value in cards.items() if
-                       value['mainCount'] > 0}
-        d.sideboard = {smart_clean(name, all_cards): value['sideCount'] for name, value in cards.items() if
-                       value['sideCount'] > 0}
-        d.is_sorted = False
-        d.color_data = calculate_color_data(d, all_cards)
-
-        # awesome way to fix list names
-        for m in matches:
-            for p in m['players']:
-                if d.deck_id.endswith('-' + p['list']):
-                    p['list'] = d.deck_id
-
-    logger.info('Finished building decks')
-
-    if decks_by_name:
-        logger.warning(f'Using obsolete data format for {comp_name}!')
-        for deck_name, d in decks_by_name.items():
-            _build_deck_record(d, matches, deck_name, legacy_deck_ids)
-    for deck_id, d in decks_by_id.items():
-        _build_deck_record(d, matches, deck_id, None)
-    logger.info('Finished building records')
-
-    client.decks.insert_many([x.save() for x in decks_by_id.values()] + [x.save() for x in decks_by_name.values()])
-    logger.info('Operation complete.')
-    return all_cards
+                init_cards = {x['name']: Card().load(x) for x in client.cards.find({'layout': {'$ne': 'normal'}})}
+                all_cards = card_cache or {}
+                for k, v in init_cards.items():
+                    all_cards[k] = v
+                    if len(v.faces) > 1:
+                        for f in v.faces:
+                            all_cards[f.name] = v
+                        all_cards[' // '.join([x.name for x in v.faces])] = v
+
+            all_card_set = {clean_card(x) for y in json['decks'] for x in y['cards'] if x not in already_loaded_cards}
+            non_split_names = [x for x in all_card_set if x not in all_cards]
+            non_split_iter = ((x['name'], Card().load(x))
+                              for x in client.cards.find({'name': {'$in': non_split_names}}))
+            for name, card in non_split_iter:
+                all_cards[name] = card
+            logger.info('{n} decks, {m} matches, {k} cards loaded'.format(n=len(json['decks']), m=len(json['matches']),
+                                                                          k=len(all_cards)))
+            phase.count(len(all_cards))
+
+        comp_name, date, decks, matches = json['competition_name'], json['date'], json['decks'], json['matches']
+        date_object = arrow.get('20' + date.replace('_', '-')).datetime
+
+        old_comp = client.competitions.find_one({'name': comp_name})
+        # comp = Competition.objects(name=comp_name).first()
+        if old_comp:
+            if timeout:
+                logger.warning(f'Deleting {comp_name} in 5 seconds!')
+                sleep(5)
+            client.competitions.delete_one({'name': comp_name})
+            client.decks.delete_many({'competition': clean_name(comp_name)})
+            logger.warning(f'Deleted {comp_name}.')
+
+        if not decks:
+            logger.info('Not inserting any decks.')
+            return all_cards
+
+        comp = Competition()
+        comp.competition_id = clean_name(comp_name)
+        comp.name = comp_name
+        comp.format = 'msem'
+        comp.type = 'gp' if 'GP' in comp_name or 'Grand Prix' in comp_name else 'league'
+        comp.date = date_object
+        client.competitions.insert_one(comp.save())
+        logger.info('Created the competition')
+
+        with report.phase('build decks') as phase:
+            for m in matches:
+                for u in m['players']:
+                    if 'list' in u:
+                        u['list'] = clean_name(u['list'][1:].replace('.txt', ''))
+                    else:
+                        u['list'] = u['username'].lower() + str(u['run'])
+            logger.info('Parsed matches')
+
+            decks_by_id = {}
+            decks_by_name = {}
+            legacy_deck_ids = {}
+            for item in decks:
+                cards, deck_id = item['cards'], item.get('deck_id', '')
+                if 'name' in item:
+                    deckname = item['name']
+                elif 'deck_name' in item:
+                    deckname = item['deck_name']
+                else:
+                    deckname = 'No name'
+                discord = item['user_discord'] if 'user_discord' in item else None
+                # this default username is tough but we'd have to work w/ it
+                if not deck_id and 'user' not in item:
+                    raise RisingDataError('Some deck is missing both User and Deck ID keys!')
+                username = item['user'] if 'user' in item else deck_id.split('/')[-1].replace('.txt', '')[:-1]
+                removal = f"{username}'s "
+                deckname = fix_long_words(deckname.replace(removal, ''))
+                user_id = _create_user(client, shorten_name(username), discord)
+
+                d = Deck()
+                d.date = date_object
+                # if comp_type == CompetitionType.GP:
+                # d.deck_id = f'{comp.comp_id}--{clean_name(username)}'
+                # else:
+                if deck_id:
+                    d.deck_id = clean_name(deck_id[1:].replace('.txt', ''))
+                    decks_by_id[d.deck_id] = d
+                else:
+                    d.deck_id = comp.competition_id + '-' + clean_name(username)
+                    decks_by_name[username] = d
+                    legacy_deck_ids[username] = d.deck_id
+                d.format = 'msem'
+                d.name = deckname
+                if 'name' not in item and 'deck_name' not in item:
+                    d.is_name_placeholder = True
+                d.author = user_id
+                d.competition = comp.competition_id
+                d.mainboard = {smart_clean(name, all_cards): value['mainCount'] for name, value in cards.items() if
+                               value['mainCount'] > 0}
+                d.sideboard = {smart_clean(name, all_cards): value['sideCount'] for name, value in cards.items() if
+                               value['sideCount'] > 0}
+                d.is_sorted = False
+                d.color_data = calculate_color_data(d, all_cards)
+
+                # awesome way to fix list names
+                for m in matches:
+                    for p in m['players']:
+                        if d.deck_id.endswith('-' + p['list']):
+                            p['list'] = d.deck_id
+
+            logger.info('Finished building decks')
+
+            if decks_by_name:
+                logger.warning(f'Using obsolete data format for {comp_name}!')
+                for deck_name, d in decks_by_name.items():
+                    _build_deck_record(d, matches, deck_name, legacy_deck_ids)
+            for deck_id, d in decks_by_id.items():
+                _build_deck_record(d, matches, deck_id, None)
+            logger.info('Finished building records')
+            phase.count(len(decks_by_id) + len(decks_by_name))
+
+        with report.phase('insert') as phase:
+            generation = bump_deck_generation(client)
+            phase.count(bulk_insert(client.decks, ({**x.save(), 'generation': generation}
+                                                   for x in chain(decks_by_id.values(), decks_by_name.values()))))
+        logger.info('Operation complete.')
+        return all_cards
 
 
 def run() -> None:
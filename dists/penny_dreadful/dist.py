@@ -90,20 +90,22 @@ def prepare_rotation() -> None:
 
 
 @pd.command()
-def full_recalculate_popularities() -> None:
-    """Create the rules for color combinations."""
+@click.option('--workers', default=1, help='The number of processes that calculate seasons in parallel.')
+def full_recalculate_popularities(workers: int = 1) -> None:
+    """Calculate card popularities for every season."""
     from .jobs.calculate_popularities import run_all_seasons
     logger.info('Starting calculation...')
-    run_all_seasons()
+    run_all_seasons(workers)
     logger.info('Calculation complete.')
 
 
 @pd.command()
-def calculate_ls_popularities() -> None:
-    """Create the rules for color combinations."""
+@click.option('--workers', default=1, help='The number of processes that calculate formats in parallel.')
+def calculate_ls_popularities(workers: int = 1) -> None:
+    """Calculate card popularities for the last season."""
     from .jobs.calculate_popularities import run_single_season
     logger.info('Starting calculation...')
-    run_single_season()
+    run_single_season(workers)
     logger.info('Calculation complete.')
 
 
@@ -4,7 +4,7 @@ from shared.helpers.caching.ordered_popularities import run_ordered_popularities
 from shared.helpers.database import connect
 from shared.types.caching import CardPlayability
 
-from ..constants import ScrapedFormats, Update, pd_data
+from ..constants import GetSideboardImportance, ScrapedFormats, Update, pd_data
 
 logger = logging.getLogger('dreadrise.dist.pd.popularity')
 
@@ -25,21 +25,24 @@ def _postprocess_playability(cp: CardPlayability, fmt: str, full_deck_count: int
             cp.playability = 'played'
 
 
-def run_all_seasons() -> None:
+def run_all_seasons(workers: int = 1) -> None:
     """
     Calculate the popularity of various PD cards across all seasons.
+    :param workers: the number of processes that calculate seasons in parallel
     :return: nothing
     """
     logger.info('Connecting...')
     client = connect('penny_dreadful')
     logger.info('Getting PD season data...')
     Update()
-    run_ordered_popularities(client, _postprocess_playability, ScrapedFormats, ScrapedFormats + ['_all'])
+    run_ordered_popularities(client, _postprocess_playability, ScrapedFormats, ScrapedFormats + ['_all'],
+                             sideboard_importance=GetSideboardImportance, workers=workers)
 
 
-def run_single_season() -> None:
+def run_single_season(workers: int = 1) -> None:
     """
     Calculate the popularity of various PD cards across one season.
+    :param workers: the number of processes that calculate formats in parallel
     :return: nothing
     """
     logger.info('Connecting...')
@@ -47,4 +50,5 @@ def run_single_season() -> None:
     logger.info('Getting PD season data...')
     Update()
     season_num = pd_data['last_season']
-    run_ordered_popularities(client, _postprocess_playability, ScrapedFormats, [f'pds{season_num}', '_all'])
+    run_ordered_popularities(client, _postprocess_playability, ScrapedFormats, [f'pds{season_num}', '_all'],
+                             sideboard_importance=GetSideboardImportance, workers=workers)
@@ -3,8 +3,9 @@ from time import sleep
 from typing import cast
 
 from shared import fetch_tools
+from shared.helpers.bulk_writer import bulk_insert
 from shared.helpers.card_engines.scryfall import build_card, build_expansion
-from shared.helpers.database import connect
+from shared.helpers.database import bump_card_generation, connect
 from shared.helpers.exceptions import RisingDataError
 from shared.helpers.magic import get_rarity
 from shared.types.card import Card
@@ -136,8 +137,9 @@ def run() -> None:
     sleep(5)
     logger.warning('Starting the operation...')
     client.cards.delete_many({})
-    client.cards.insert_many([x.save() for x in card_arr])
+    bulk_insert(client.cards, (x.save() for x in card_arr))
     logger.info('Inserted cards.')
+    bump_card_generation(client)
     client.expansions.delete_many({})
-    client.expansions.insert_many([x.save() for x in expansions])
+    bulk_insert(client.expansions, (x.save() for x in expansions))
     logger.info('Inserted expansions.')
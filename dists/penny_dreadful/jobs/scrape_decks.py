@@ -11,8 +11,10 @@ from pymongo.database import Database
 
 from shared import fetch_tools
 from shared.card_enums import Archetype
-from shared.helpers.database import connect
+from shared.helpers.bulk_writer import bulk_insert
+from shared.helpers.database import bump_deck_generation, connect
 from shared.helpers.exceptions import FetchError
+from shared.helpers.job_report import JobReport
 from shared.helpers.util import clean_name
 from shared.helpers.util2 import calculate_color_data
 from shared.types.card import Card
@@ -260,34 +262,40 @@ def inject_matches(decks: dict[int, Deck], base_url: str) -> None:
 
 def run_all_decks(season_num: int | str) -> None:
     client = init()
-    logger.info('Loading users')
-    all_users = {x['user_id']: User().load(x) for x in client.users.find()}
-    logger.info('Loading PDM')
-    decks, users, comps, user_removals = load_all(
-        all_users, {}, f'/api/decks/?deckType=all&pageSize={page_size}&seasonId={season_num}&page=')
-    logger.info('Finished loading decks, loading matches')
-    inject_matches(decks, f'/api/matches/?pageSize={match_page_size}&seasonId={season_num}&page=')
-    logger.warning(f'Deleting everything related to season {season_num} in 5 seconds!')
-    sleep(5)
-    client.decks.delete_many({'format': f'pds{season_num}', 'competition': {'$exists': 1}})
-    client.competitions.delete_many({'format': f'pds{season_num}'})
-    logger.warning('Purging complete')
-    if decks:
-        logger.info(f'Inserting {len(decks)} decks...')
-        client.decks.insert_many([x.save() for x in decks.values()])
-    if users:
-        if user_removals:
-            logger.warning(f'Filtering out duplicate users (found {len(user_removals)})...')
-            client.users.delete_many({'user_id': {'$in': list(user_removals.keys())}})
-            # then we need to replace the user ids in the deck entries... pain
-            operations = [UpdateMany({'author': user_id}, {'$set': {'author': new_id}})
-                          for user_id, new_id in user_removals.items()]
-            client.decks.bulk_write(operations)
-        logger.info(f'Inserting {len(users)} users...')
-        client.users.insert_many([x.save() for x in users])
-    if comps:
-        logger.info(f'Inserting {len(comps)} competitions...')
-        client.competitions.insert_many([x.save() for x in comps])
+    with JobReport('pd_decks', client, season=season_num) as report:
+        with report.phase('fetch') as p:
+            logger.info('Loading users')
+            all_users = {x['user_id']: User().load(x) for x in client.users.find()}
+            logger.info('Loading PDM')
+            decks, users, comps, user_removals = load_all(
+                all_users, {}, f'/api/decks/?deckType=all&pageSize={page_size}&seasonId={season_num}&page=')
+            logger.info('Finished loading decks, loading matches')
+            inject_matches(decks, f'/api/matches/?pageSize={match_page_size}&seasonId={season_num}&page=')
+            p.count(len(decks))
+        logger.warning(f'Deleting everything related to season {season_num} in 5 seconds!')
+        sleep(5)
+        with report.phase('purge'):
+            client.decks.delete_many({'format': f'pds{season_num}', 'competition': {'$exists': 1}})
+            client.competitions.delete_many({'format': f'pds{season_num}'})
+        logger.warning('Purging complete')
+        with report.phase('insert') as p:
+            if decks:
+                logger.info(f'Inserting {len(decks)} decks...')
+                generation = bump_deck_generation(client)
+                p.count(bulk_insert(client.decks, ({**x.save(), 'generation': generation} for x in decks.values())))
+            if users:
+                if user_removals:
+                    logger.warning(f'Filtering out duplicate users (found {len(user_removals)})...')
+                    client.users.delete_many({'user_id': {'$in': list(user_removals.keys())}})
+                    # then we need to replace the user ids in the deck entries... pain
+                    operations = [UpdateMany({'author': user_id}, {'$set': {'author': new_id}})
+                                  for user_id, new_id in user_removals.items()]
+                    client.decks.bulk_write(operations)
+                logger.info(f'Inserting {len(users)} users...')
+                p.count(bulk_insert(client.users, (x.save() for x in users)))
+            if comps:
+                logger.info(f'Inserting {len(comps)} competitions...')
+                p.count(bulk_insert(client.competitions, (x.save() for x in comps)))
     logger.info('Operation complete.')
 
 
@@ -365,5 +373,5 @@ def run_archetypes() -> None:
     sleep(5)
     client.deck_tags.delete_many({})
     logger.warning('Purging complete')
-    client.deck_tags.insert_many([x.save() for x in archetype_output])
+    bulk_insert(client.deck_tags, (x.save() for x in archetype_output))
     logger.info('Operation complete.')
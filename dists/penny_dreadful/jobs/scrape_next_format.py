@@ -3,6 +3,7 @@ from math import ceil
 from time import sleep
 
 from shared import fetch_tools
+from shared.helpers.bulk_writer import bulk_insert
 from shared.helpers.database import connect
 
 logger = logging.getLogger('dreadrise.dist.pd.next-format')
@@ -26,9 +27,7 @@ def run() -> None:
         new_page = fetch_tools.fetch_json(pdm_host + url_base + str(i))
         card_arr += new_page['objects']
 
-    ans = [{'name': x['name'], 'checks': x['hits']} for x in card_arr]
-    logger.info('Converted to the correct format')
     db = connect('penny_dreadful')
     db.next_counts.delete_many({})
-    db.next_counts.insert_many(ans)
+    bulk_insert(db.next_counts, ({'name': x['name'], 'checks': x['hits']} for x in card_arr))
     logger.info('Insertion complete.')
@@ -2,6 +2,7 @@ import logging
 
 from pymongo import UpdateMany
 
+from shared.helpers.bulk_writer import bulk_write
 from shared.helpers.database import connect
 from shared.types.competition import Competition
 
@@ -19,9 +20,6 @@ def run() -> None:
     comps = [Competition().load(x) for x in client.competitions.find({})]
     logger.info(f'{len(comps)} competitions loaded')
 
-    actions = []
-    for i in comps:
-        actions.append(UpdateMany({'source': {'$exists': 0}, 'competition': i.competition_id},
-                                  {'$set': {'source': i.type}}))
-    client.decks.bulk_write(actions)
+    bulk_write(client.decks, (UpdateMany({'source': {'$exists': 0}, 'competition': i.competition_id},
+                                         {'$set': {'source': i.type}}) for i in comps))
     logger.info('Operation complete.')
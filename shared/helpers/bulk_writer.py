@@ -0,0 +1,120 @@
+import logging
+import time
+from typing import Any, Iterable, Mapping
+
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, ConnectionFailure
+
+logger = logging.getLogger('dreadrise.bulk')
+
+WriteOperation = InsertOne | UpdateOne | UpdateMany | ReplaceOne | DeleteOne | DeleteMany
+DUPLICATE_KEY = 11000
+
+
+class BulkWriter:
+    """
+    Writes operations into a collection in unordered chunks, so that the operations never need to be in memory at once.
+    A chunk that fails because of the connection is retried. Inserts that fail as duplicates on a retry are counted
+    as written, since the failed attempt could have inserted them before the connection broke.
+    Use it as a context manager, or call close() to write the last chunk and log the throughput.
+    """
+
+    def __init__(self, collection: Collection, chunk_size: int = 1000, retries: int = 3,
+                 retry_delay: float = 1) -> None:
+        self.collection = collection
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.pending: list[WriteOperation] = []
+        self.written = 0
+        self.write_time = 0.0
+
+    def __enter__(self) -> 'BulkWriter':
+        return self
+
+    def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        if exc_type is None:
+            self.close()
+
+    def add(self, operation: WriteOperation) -> None:
+        self.pending.append(operation)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def insert(self, document: Mapping[str, Any]) -> None:
+        self.add(InsertOne(document))
+
+    def write_all(self, operations: Iterable[WriteOperation]) -> None:
+        for x in operations:
+            self.add(x)
+
+    def insert_all(self, documents: Iterable[Mapping[str, Any]]) -> None:
+        for x in documents:
+            self.add(InsertOne(x))
+
+    def flush(self) -> None:
+        """
+        Write the pending operations.
+        :return: nothing
+        """
+        if not self.pending:
+            return
+        chunk = self.pending
+        self.pending = []
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                self.collection.bulk_write(chunk, ordered=False)
+                break
+            except BulkWriteError as e:
+                if attempt > 0 and all(x['code'] == DUPLICATE_KEY and isinstance(chunk[x['index']], InsertOne)
+                                       for x in e.details['writeErrors']) and not e.details['writeConcernErrors']:
+                    break
+                raise
+            except ConnectionFailure as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.retry_delay * 2 ** attempt
+                logger.warning(f'Writing {len(chunk)} operations into {self.collection.name} failed ({e}), '
+                               f'retrying in {delay}s')
+                time.sleep(delay)
+        self.written += len(chunk)
+        self.write_time += time.perf_counter() - start
+
+    def close(self) -> int:
+        """
+        Write the pending operations and log the throughput, measured over the time spent writing.
+        :return: the amount of written operations
+        """
+        self.flush()
+        if self.written:
+            logger.info(f'Wrote {self.written} operations into {self.collection.name} in {self.write_time:.2f}s '
+                        f'({self.written / max(self.write_time, 1e-6):.0f} docs/sec)')
+        return self.written
+
+
+def bulk_insert(collection: Collection, documents: Iterable[Mapping[str, Any]], chunk_size: int = 1000) -> int:
+    """
+    Insert documents into a collection in unordered chunks.
+    :param collection: the collection
+    :param documents: the documents, can be a generator
+    :param chunk_size: the amount of documents written at once
+    :return: the amount of inserted documents
+    """
+    with BulkWriter(collection, chunk_size) as writer:
+        writer.insert_all(documents)
+    return writer.written
+
+
+def bulk_write(collection: Collection, operations: Iterable[WriteOperation], chunk_size: int = 1000) -> int:
+    """
+    Run write operations on a collection in unordered chunks.
+    :param collection: the collection
+    :param operations: the operations, can be a generator
+    :param chunk_size: the amount of operations written at once
+    :return: the amount of written operations
+    """
+    with BulkWriter(collection, chunk_size) as writer:
+        writer.write_all(operations)
+    return writer.written
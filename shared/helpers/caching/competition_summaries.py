@@ -0,0 +1,125 @@
+import logging
+from typing import Callable
+
+from shared.core_enums import Distribution
+from shared.helpers.database import connect
+from shared.helpers.db_loader import find_decks, load_cards_from_decks, popular_card_stats
+from shared.helpers.metagame import count_tag_stats
+from shared.helpers.util2 import get_dist_constants
+from shared.types.caching import CompetitionBundle, CompetitionPopularity, CompetitionSummary
+from shared.types.card import Card
+from shared.types.competition import Competition
+from shared.types.deck import Deck
+from shared.types.deck_tag import DeckTag
+
+logger = logging.getLogger('dreadrise.popularity.competitions')
+
+
+def summarize_competition(comp: Competition, decks: list[Deck], cards: dict[str, Card], users: dict[str, str],
+                          tags: dict[str, str], main_card: str,
+                          sideboard_importance: Callable[[Card, int], int]) -> \
+        tuple[CompetitionSummary, CompetitionBundle]:
+    """
+    Create the stored summary and the detail bundle of a competition.
+    The decks of the bundle are stored in the order of paged deck lists.
+    :param comp: the competition
+    :param decks: all decks of the competition
+    :param cards: the card dictionary, should include every card of the decks
+    :param users: the dictionary of user_id -> nickname, should include every author of the decks
+    :param tags: the dictionary of tag_id -> tag name, should include every tag of the decks
+    :param main_card: the name of the main card of the competition, or an empty string if unknown
+    :param sideboard_importance: the GetSideboardImportance function of the distribution
+    :return: the summary and the bundle
+    """
+    cs = CompetitionSummary()
+    cs.competition = comp.competition_id
+    cs.format = comp.format
+    cs.deck_count = len(decks)
+    cs.main_card = main_card
+    popular_cards = popular_card_stats(decks, cards, sideboard_importance)
+    cs.popular_cards = [{'card_name': name, 'weight': weight, 'wins': wins, 'losses': losses}
+                        for name, weight, wins, losses in popular_cards]
+    cs.metagame = [{'tag': tag, 'deck_count': count, 'wins': wins, 'losses': losses}
+                   for tag, (count, wins, losses) in count_tag_stats(decks).items()]
+
+    cb = CompetitionBundle()
+    cb.competition = comp.competition_id
+    cb.format = comp.format
+    cb.decks = [{
+        'deck_id': x.deck_id,
+        'name': x.name,
+        'author': x.author,
+        'tags': x.tags,
+        'wins': x.wins,
+        'losses': x.losses,
+        'ties': x.ties,
+        'format': x.format,
+        'color_data': x.color_data
+    } for x in sorted(decks, key=lambda u: (-u.wins, u.losses, u.deck_id))]
+    authors = {x.author for x in decks}
+    deck_tags = {y for x in decks for y in x.tags}
+    cb.users = [(x, users[x]) for x in sorted(authors) if x in users]
+    cb.tags = [(x, tags[x]) for x in sorted(deck_tags) if x in tags]
+    return cs, cb
+
+
+def run_competition_summaries(fmt: str, all_cards: dict[str, Card], decks: list[Deck],
+                              all_competitions: list[Competition], comp_pop: list[CompetitionPopularity],
+                              users: dict[str, str], all_tags: list[DeckTag],
+                              sideboard_importance: Callable[[Card, int], int]) -> \
+        tuple[list[CompetitionSummary], list[CompetitionBundle]]:
+    decks_by_competition: dict[str, list[Deck]] = {}
+    for d in decks:
+        if d.format == fmt and d.competition:
+            decks_by_competition.setdefault(d.competition, []).append(d)
+
+    main_cards: dict[str, CompetitionPopularity] = {}
+    for cp in comp_pop:
+        if cp.competition not in main_cards or cp.true_popularity > main_cards[cp.competition].true_popularity:
+            main_cards[cp.competition] = cp
+
+    tags = {x.tag_id: x.name for x in all_tags}
+    summaries, bundles = [], []
+    for comp in all_competitions:
+        if comp.format != fmt or comp.competition_id not in decks_by_competition:
+            continue
+        main_card = main_cards[comp.competition_id].card_name if comp.competition_id in main_cards else ''
+        cs, cb = summarize_competition(comp, decks_by_competition[comp.competition_id], all_cards, users, tags,
+                                       main_card, sideboard_importance)
+        summaries.append(cs)
+        bundles.append(cb)
+    return summaries, bundles
+
+
+def update_competition_summary(dist: Distribution, competition_id: str) -> None:
+    """
+    Recalculate the stored summary of a single competition from the database.
+    If the competition does not exist anymore, its summary is removed.
+    :param dist: the distribution
+    :param competition_id: the competition to process
+    :return: nothing
+    """
+    db = connect(dist)
+    comp_obj = db.competitions.find_one({'competition_id': competition_id})
+    if not comp_obj:
+        logger.warning(f'Competition {competition_id} not found, removing its summary')
+        db.competition_summaries.delete_one({'competition': competition_id})
+        db.competition_bundles.delete_one({'competition': competition_id})
+        return
+
+    comp = Competition().load(comp_obj)
+    decks = find_decks(db, {'competition': competition_id}, 'listing')
+    cards = load_cards_from_decks(dist, decks)
+    authors = list({x.author for x in decks})
+    users = {x['user_id']: x['nickname'] for x in db.users.find({'user_id': {'$in': authors}})}
+    tag_ids = list({y for x in decks for y in x.tags})
+    tags = {x['tag_id']: x['name'] for x in db.deck_tags.find({'tag_id': {'$in': tag_ids}})}
+    main_card_obj = db.competition_popularities.find_one({'competition': competition_id, 'format': comp.format},
+                                                         sort=[('true_popularity', -1)])
+    main_card = main_card_obj['card_name'] if main_card_obj else ''
+
+    constants = get_dist_constants(dist)
+    cs, cb = summarize_competition(comp, decks, cards, users, tags, main_card, constants.GetSideboardImportance)
+    db.competition_summaries.update_one({'competition': competition_id}, {'$set': cs.save()}, upsert=True)
+    db.competition_bundles.update_one({'competition': competition_id}, {'$set': cb.save()}, upsert=True)
+    logger.info(f'Updated the summary of {competition_id}')
@@ -0,0 +1,95 @@
+import logging
+from typing import Callable, Iterator
+
+from pymongo import UpdateOne
+from pymongo.database import Database
+
+from shared.helpers.bulk_writer import bulk_insert, bulk_write
+from shared.helpers.fork_pool import ForkPool
+from shared.types.caching import (CardPlayability, CompetitionBundle, CompetitionPopularity, CompetitionSummary,
+                                  DeckTagCache, DeckTagPopularity, Popularity)
+
+logger = logging.getLogger('dreadrise.popularity')
+
+
+class FormatResult:
+    """
+    Everything that the popularity jobs calculate for a single format.
+    """
+
+    def __init__(self, fmt: str) -> None:
+        self.format = fmt
+        self.comp_pop: list[CompetitionPopularity] = []
+        self.dt_pop: list[DeckTagPopularity] = []
+        self.f_pop = Popularity()
+        self.deck_tops: dict[str, str] = {}
+        self.summaries: list[CompetitionSummary] = []
+        self.bundles: list[CompetitionBundle] = []
+        self.arch_cache: list[DeckTagCache] = []
+        self.staple_cache: list[CardPlayability] = []
+
+
+FormatTask = Callable[[str], FormatResult]
+
+
+def map_formats(task: FormatTask, formats: list[str], workers: int = 1) -> Iterator[FormatResult]:
+    """
+    Calculate the results of each format, in a pool of worker processes if there are multiple workers.
+    The workers are forked after the data is loaded, see ForkPool. Only the results are sent back, in the order in
+    which they are done.
+    :param task: the calculation for a single format
+    :param formats: the formats to process
+    :param workers: the number of worker processes, 1 means no pool
+    :return: the result of each format
+    """
+    if workers <= 1 or len(formats) <= 1:
+        for x in formats:
+            yield task(x)
+        return
+
+    logger.info(f'Processing {len(formats)} formats with {min(workers, len(formats))} workers')
+    with ForkPool(task, min(workers, len(formats))) as pool:
+        yield from pool.imap_unordered(formats)
+
+
+def write_format_result(client: Database, result: FormatResult, store_format_popularity: bool,
+                        suffix: str = '') -> int:
+    """
+    Insert the results of a format into the cache collections.
+    :param client: the database
+    :param result: the results of the format
+    :param store_format_popularity: whether the format popularity should be inserted
+    :param suffix: the suffix of the cache collection names, used for staging collections
+    :return: the amount of written documents
+    """
+    x = result.format
+    written = len(result.comp_pop) + len(result.dt_pop) + len(result.summaries) + len(result.bundles) + \
+        len(result.arch_cache) + len(result.staple_cache) + len(result.deck_tops)
+    logger.info(f'Calculated {len(result.comp_pop)} popularity entries for competitions in {x}, '
+                f'{len(result.dt_pop)} for tags')
+    if not bulk_insert(client['competition_popularities' + suffix], (y.save() for y in result.comp_pop)):
+        logger.warning(f'No competition popularities found in {x}.')
+    if not bulk_insert(client['tag_popularities' + suffix], (y.save() for y in result.dt_pop)):
+        logger.warning(f'No tag popularities found in {x}.')
+    if store_format_popularity and hasattr(result.f_pop, 'self_popularity'):
+        client['format_popularities' + suffix].insert_one(result.f_pop.save())
+        written += 1
+
+    if bulk_insert(client['competition_summaries' + suffix], (y.save() for y in result.summaries)):
+        bulk_insert(client['competition_bundles' + suffix], (y.save() for y in result.bundles))
+        logger.info(f'Inserted {len(result.summaries)} competition summaries')
+
+    if bulk_insert(client['archetype_cache' + suffix], (y.save() for y in result.arch_cache)):
+        logger.info(f'Inserted {len(result.arch_cache)} tag covers')
+    else:
+        logger.warning(f'No archetypes generated in {x}.')
+
+    if bulk_insert(client['card_playability' + suffix], (y.save() for y in result.staple_cache)):
+        logger.info(f'Inserted {len(result.staple_cache)} staples entries')
+    else:
+        logger.info(f'Staples not detected in {x}.')
+
+    if bulk_write(client.decks, (UpdateOne({'deck_id': y}, {'$set': {'main_card': z}})
+                                 for y, z in result.deck_tops.items())):
+        logger.info('Top cards updated.')
+    return written
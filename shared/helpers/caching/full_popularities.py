@@ -2,113 +2,172 @@ import logging
 import traceback
 from typing import Callable
 
-from pymongo import UpdateOne
+import numpy as np
 from pymongo.database import Database
 
+from shared.helpers.bulk_writer import bulk_insert
+from shared.helpers.db_loader import stream_decks
+from shared.helpers.deck_matrix import DeckMatrix
 from shared.helpers.exceptions import DreadriseError
+from shared.helpers.job_report import JobReport
 from shared.types.caching import CardPlayability
 from shared.types.card import Card
 from shared.types.competition import Competition
 from shared.types.deck import Deck
 from shared.types.deck_tag import DeckTag
 
+from .competition_summaries import run_competition_summaries
+from .format_pool import FormatResult, map_formats, write_format_result
 from .playability import run_playability
-from .popularity import run_popularity
+from .popularity import count, run_format_popularity, run_popularity
+from .staging import (abort_staging, finish_staging, popularity_collections, staging_lock, staging_suffix,
+                      start_staging, summary_collections)
 from .tag_covers import run_tag_covers
 
 logger = logging.getLogger('dreadrise.popularity')
 
+PopularityData = tuple[dict[str, Card], list[Competition], list[DeckTag], list[Deck], dict[str, str]]
+
+
+def load_popularity_data(client: Database, card_cache: dict[str, Card] | None = None) -> PopularityData:
+    """
+    Load everything the popularity calculation needs.
+    :param client: the database
+    :param card_cache: the card dictionary, if it was already loaded
+    :return: cards, competitions, deck tags, decks from competitions, user nicknames
+    """
+    logger.info('Loading data...')
+
+    if card_cache:
+        all_cards = card_cache
+    else:
+        all_card_iter = (Card().load(x) for x in client.cards.find())
+        all_cards = {x.name: x for x in all_card_iter}
+    logger.info(f'Loaded {len(all_cards)} cards.')
+    all_competitions = [Competition().load(x) for x in client.competitions.find()]
+    logger.info(f'Loaded {len(all_competitions)} competitions.')
+    all_tags = [DeckTag().load(x) for x in client.deck_tags.find()]
+    logger.info(f'Loaded {len(all_tags)} deck tags.')
+    all_decks: list[Deck] = list(stream_decks(client, {'competition': {'$exists': 1}}, 'listing'))
+    logger.info(f'Loaded {len(all_decks)} decks.')
+    users = {x['user_id']: x['nickname'] for x in client.users.find({}, {'user_id': 1, 'nickname': 1})}
+    logger.info(f'Loaded {len(users)} users.')
+    logger.info('Loaded data!')
+    return all_cards, all_competitions, all_tags, all_decks, users
+
+
+def _run_popularities(client: Database, job: str, postprocess_playability: Callable[[CardPlayability, str, int], None],
+                      time_check: Callable[[Deck], bool], card_cache: dict[str, Card] | None,
+                      sideboard_importance: Callable[[Card, int], int] | None, workers: int,
+                      competition_ids: list[str] | None) -> None:
+    staged = popularity_collections + (summary_collections if sideboard_importance else [])
+    with staging_lock(client, job):
+        finished = False
+        try:
+            with JobReport(job, client, workers=workers, competitions=competition_ids) as report:
+                with report.phase('load') as p:
+                    all_cards, all_competitions, all_tags, all_decks, users = load_popularity_data(client, card_cache)
+                    p.count(len(all_decks))
+                formats = {x.format for x in all_competitions}
+                formats.add('_all')  # does not really matter if there's 1 format only
+                format_counts = {x: len([y for y in all_decks if y.format == x or x == '_all']) for x in formats}
+                if competition_ids is None:
+                    updated = formats
+                else:
+                    updated = {x.format for x in all_decks if x.competition in competition_ids} & formats
+                    if not updated:
+                        logger.warning(f'No decks found for competitions {competition_ids}')
+                        finished = True  # nothing was staged
+                        return
+                    updated.add('_all')
+                    logger.info(f'Updating the formats {", ".join(sorted(updated))}')
+
+                with report.phase('staging'):
+                    if competition_ids is None:
+                        start_staging(client, staged)
+                    else:
+                        # the format popularities compare every format with all decks, so all of them are replaced
+                        start_staging(client, [x for x in staged if x != 'format_popularities'],
+                                      keep={'format': {'$nin': list(updated)}})
+                        start_staging(client, ['format_popularities'])
+
+                with report.phase('deck matrix') as p:
+                    logger.info('Building the deck matrix...')
+                    deck_matrix = DeckMatrix.build(all_decks)
+                    recent_decks = deck_matrix.subset(np.array([time_check(y) for y in all_decks], dtype=np.bool_))
+                    all_format_popularities = count(deck_matrix, all_cards)
+                    p.count(deck_matrix.deck_count)
+                for x in formats:
+                    if not format_counts[x]:
+                        logger.info(f'Skipping format {x}')
+                store_format_popularity = len(formats) > 1
+
+                def process_format(x: str) -> FormatResult:
+                    logger.warning(f'Processing format {x}')
+                    r = FormatResult(x)
+                    r.comp_pop, r.dt_pop, r.f_pop, r.deck_tops = run_popularity(
+                        x, all_cards, deck_matrix, all_competitions, all_tags, all_format_popularities)
+                    if sideboard_importance and x != '_all':
+                        r.summaries, r.bundles = run_competition_summaries(
+                            x, all_cards, all_decks, all_competitions, r.comp_pop, users, all_tags,
+                            sideboard_importance)
+                    r.arch_cache = run_tag_covers(x, deck_matrix, all_tags, r.dt_pop)
+                    r.staple_cache = run_playability(x, all_cards, recent_decks)
+                    for i in r.staple_cache:
+                        postprocess_playability(i, x, format_counts[x])
+                    return r
+
+                results = map_formats(process_format, [x for x in updated if format_counts[x]], workers)
+                for result in report.iterate('calculate', results):
+                    with report.phase('write') as p:
+                        p.count(write_format_result(client, result, store_format_popularity and result.format != '_all',
+                                                    staging_suffix))
+                    logger.info(f'Format {result.format} complete.')
+                if store_format_popularity:
+                    with report.phase('format popularities') as p:
+                        others = [run_format_popularity(x, all_cards, deck_matrix, all_format_popularities)
+                                  for x in formats - updated if format_counts[x]]
+                        others = [x for x in others if hasattr(x, 'self_popularity')]
+                        p.count(bulk_insert(client['format_popularities' + staging_suffix], (x.save() for x in others)))
+                with report.phase('finish staging'):
+                    finish_staging(client, staged)
+                    finished = True
+
+        except (DreadriseError, KeyError, ValueError):
+            logger.error('A error occured!')
+            traceback.print_exc()
+        finally:
+            # any failure, including a database error, leaves the current collections as they were
+            if not finished:
+                abort_staging(client, staged)
+
 
 def run_all_popularities(client: Database, postprocess_playability: Callable[[CardPlayability, str, int], None],
                          time_check: Callable[[Deck], bool] = lambda a: True,
-                         card_cache: dict[str, Card] | None = None) -> None:
+                         card_cache: dict[str, Card] | None = None,
+                         sideboard_importance: Callable[[Card, int], int] | None = None, workers: int = 1) -> None:
     """
     Calculate the popularity of various cards.
+    Competition summaries are only stored if sideboard_importance is passed.
+    With multiple workers, the formats are calculated in parallel and written by this process.
     :return: nothing
     """
-    try:
-        logger.info('Loading data...')
-
-        if card_cache:
-            all_cards = card_cache
-        else:
-            all_card_iter = (Card().load(x) for x in client.cards.find())
-            all_cards = {x.name: x for x in all_card_iter}
-        logger.info(f'Loaded {len(all_cards)} cards.')
-        all_competitions = [Competition().load(x) for x in client.competitions.find()]
-        logger.info(f'Loaded {len(all_competitions)} competitions.')
-        all_tags = [DeckTag().load(x) for x in client.deck_tags.find()]
-        logger.info(f'Loaded {len(all_tags)} deck tags.')
-        all_decks = [Deck().load(x) for x in client.decks.find({'competition': {'$exists': 1}})]
-        logger.info(f'Loaded {len(all_decks)} decks.')
-        logger.info('Loaded data!')
-
-        logger.warning('Dropping collections')
-        client.competition_popularities.delete_many({})
-        client.tag_popularities.delete_many({})
-        client.format_popularities.delete_many({})
-        client.archetype_cache.delete_many({})
-        client.card_playability.delete_many({})
-
-        formats = {x.format for x in all_competitions}
-        formats.add('_all')  # does not really matter if there's 1 format only
-        format_counts = {x: len([y for y in all_decks if y.format == x or x == '_all']) for x in formats}
-        for x in formats:
-            if format_counts[x]:
-                logger.warning(f'Processing format {x}')
-
-                logger.info('Calculating popularities...')
-                comp_pop, dt_pop, f_pop, deck_tops = run_popularity(
-                    x, all_cards, all_decks, all_competitions, all_tags)
-                logger.info(f'Calculated {len(comp_pop)} popularity entries for competitions, {len(dt_pop)} for tags')
-
-                if comp_pop:
-                    logger.info('Inserting competition popularities...')
-                    client.competition_popularities.insert_many([y.save() for y in comp_pop])
-                else:
-                    logger.warning('No competition popularities found.')
-                if dt_pop:
-                    logger.info('Inserting tag popularities...')
-                    client.tag_popularities.insert_many([y.save() for y in dt_pop])
-                else:
-                    logger.warning('No tag popularities found.')
-
-                if len(formats) > 1 and x != '_all' and hasattr(f_pop, 'self_popularity'):
-                    client.format_popularities.insert_one(f_pop.save())
-                logger.info('Insert complete.')
+    _run_popularities(client, 'popularities', postprocess_playability, time_check, card_cache, sideboard_importance,
+                      workers, None)
 
-                logger.info('Calculating tag covers...')
-                arch_cache = run_tag_covers(x, all_decks, all_tags, dt_pop)
-                logger.info(f'Calculated {len(arch_cache)} tag covers')
 
-                if arch_cache:
-                    logger.info('Inserting archetypes...')
-                    client.archetype_cache.insert_many([y.save() for y in arch_cache])
-                else:
-                    logger.warning('No archetypes generated.')
-                logger.info('Insert complete.')
-
-                logger.info('Calculating staples cache...')
-                staple_cache = run_playability(x, all_cards, [y for y in all_decks if time_check(y)])
-                for i in staple_cache:
-                    postprocess_playability(i, x, format_counts[x])
-                logger.info(f'Calculated {len(staple_cache)} staples entries')
-
-                if len(staple_cache) > 0:
-                    logger.info('Inserting staples...')
-                    client.card_playability.insert_many([y.save() for y in staple_cache])
-                    logger.info('Insert complete.')
-                else:
-                    logger.info('Staples not detected.')
-
-                if deck_tops:
-                    logger.info('Updating top cards...')
-                    actions = [UpdateOne({'deck_id': x}, {'$set': {'main_card': y}}) for x, y in deck_tops.items()]
-                    client.decks.bulk_write(actions)
-                    logger.info('Top cards updated.')
-            else:
-                logger.info(f'Skipping format {x}')
-
-    except (DreadriseError, KeyError, ValueError):
-        logger.error('A error occured!')
-        traceback.print_exc()
+def run_new_popularities(client: Database, postprocess_playability: Callable[[CardPlayability, str, int], None],
+                         competition_ids: list[str], time_check: Callable[[Deck], bool] = lambda a: True,
+                         card_cache: dict[str, Card] | None = None,
+                         sideboard_importance: Callable[[Card, int], int] | None = None, workers: int = 1) -> None:
+    """
+    Update the cached popularities after some competitions were added, instead of rebuilding them.
+    The popularities are normalized over a format, so a new deck can change every row of its format: the formats of
+    the new decks and _all are calculated again, the rows of the other formats are kept. Only the format
+    popularities of the other formats are calculated again, since they are compared with the decks of every format.
+    The rows are replaced through the staging collections like in run_all_popularities.
+    :param competition_ids: the new competitions
+    :return: nothing
+    """
+    _run_popularities(client, 'new_popularities', postprocess_playability, time_check, card_cache,
+                      sideboard_importance, workers, competition_ids)
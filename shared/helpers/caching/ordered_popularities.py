@@ -2,13 +2,20 @@ import logging
 import traceback
 from typing import Callable
 
-from pymongo import UpdateOne
+import numpy as np
 from pymongo.database import Database
 
+from shared.helpers.caching.competition_summaries import run_competition_summaries
+from shared.helpers.caching.format_pool import FormatResult, map_formats, write_format_result
 from shared.helpers.caching.playability import run_playability
-from shared.helpers.caching.popularity import run_popularity
+from shared.helpers.caching.popularity import prefix_counts, run_popularity
+from shared.helpers.caching.staging import (abort_staging, finish_staging, popularity_collections, staging_lock,
+                                            staging_suffix, start_staging, summary_collections)
 from shared.helpers.caching.tag_covers import run_tag_covers
+from shared.helpers.db_loader import stream_decks
+from shared.helpers.deck_matrix import DeckMatrix
 from shared.helpers.exceptions import DreadriseError
+from shared.helpers.job_report import JobReport
 from shared.types.caching import CardPlayability
 from shared.types.card import Card
 from shared.types.competition import Competition
@@ -19,87 +26,98 @@ logger = logging.getLogger('dreadrise.popularity')
 
 
 def run_ordered_popularities(client: Database, postprocess_playability: Callable[[CardPlayability, str, int], None],
-                             format_order: list[str], formats: list[str]) -> None:
+                             format_order: list[str], formats: list[str],
+                             sideboard_importance: Callable[[Card, int], int] | None = None,
+                             workers: int = 1) -> None:
     """
     Calculate the popularity of various cards with ordered formats.
+    Competition summaries are only stored if sideboard_importance is passed.
+    With multiple workers, the formats are calculated in parallel and written by this process.
     :return: nothing
     """
-    try:
-        logger.info('Loading data...')
-        all_card_iter = (Card().load(x) for x in client.cards.find())
-        all_cards = {x.name: x for x in all_card_iter}
-        logger.info(f'Loaded {len(all_cards)} cards.')
-        all_competitions = [Competition().load(x) for x in client.competitions.find()]
-        logger.info(f'Loaded {len(all_competitions)} competitions.')
-        all_tags = [DeckTag().load(x) for x in client.deck_tags.find()]
-        logger.info(f'Loaded {len(all_tags)} deck tags.')
-        all_decks = [Deck().load(x) for x in client.decks.find()]
-        logger.info(f'Loaded {len(all_decks)} decks.')
-        logger.info('Loaded data!')
-
-        logger.warning('Dropping collections')
-        query = {'format': {'$in': formats}}
-        client.competition_popularities.delete_many(query)
-        client.tag_popularities.delete_many(query)
-        client.format_popularities.delete_many(query)
-        client.archetype_cache.delete_many(query)
-        client.card_playability.delete_many(query)
-
-        format_counts = {x: len([y for y in all_decks if y.format == x or x == '_all']) for x in formats}
-        for x in formats:
-            if format_counts[x]:
-                logger.warning(f'Processing format {x}')
-
-                expected_formats = []
-                for i in format_order:  # if x is not in format_order, then it just uses every format, like _all
-                    expected_formats.append(i)
-                    if i == x:
-                        break
-                logger.info(f'Found {len(expected_formats)} formats before this one, getting the list of decks...')
-                local_decks = [x for x in all_decks if x.format in expected_formats]
-                logger.info(f'Found {len(local_decks)} decks')
-
-                logger.info('Calculating popularities...')
-                comp_pop, dt_pop, f_pop, deck_tops = run_popularity(
-                    x, all_cards, local_decks, all_competitions, all_tags)
-                logger.info(f'Calculated {len(comp_pop)} popularity entries for competitions, {len(dt_pop)} for tags')
-
-                logger.info('Inserting popularities...')
-                client.competition_popularities.insert_many([y.save() for y in comp_pop])
-                client.tag_popularities.insert_many([y.save() for y in dt_pop])
-                if len(format_order) > 1 and x != '_all':
-                    client.format_popularities.insert_one(f_pop.save())
-                logger.info('Insert complete.')
-
-                logger.info('Calculating tag covers...')
-                arch_cache = run_tag_covers(x, local_decks, all_tags, dt_pop)
-                logger.info(f'Calculated {len(arch_cache)} tag covers')
-
-                logger.info('Inserting archetypes...')
-                client.archetype_cache.insert_many([y.save() for y in arch_cache])
-                logger.info('Insert complete.')
-
-                logger.info('Calculating staples cache...')
-                staple_cache = run_playability(x, all_cards, local_decks)
-                for j in staple_cache:
-                    postprocess_playability(j, x, format_counts[x])
-                logger.info(f'Calculated {len(staple_cache)} staples entries')
-
-                if len(staple_cache) > 0:
-                    logger.info('Inserting staples...')
-                    client.card_playability.insert_many([y.save() for y in staple_cache])
-                    logger.info('Insert complete.')
-                else:
-                    logger.info('Staples not detected.')
-
-                if deck_tops:
-                    logger.info('Updating top cards...')
-                    actions = [UpdateOne({'deck_id': x}, {'$set': {'main_card': y}}) for x, y in deck_tops.items()]
-                    client.decks.bulk_write(actions)
-                    logger.info('Top cards updated.')
-            else:
-                logger.info(f'Skipping format {x}')
-
-    except (DreadriseError, KeyError, ValueError):
-        logger.error('A error occured!')
-        traceback.print_exc()
+    staged = popularity_collections + (summary_collections if sideboard_importance else [])
+    with staging_lock(client, 'ordered_popularities'):
+        finished = False
+        try:
+            with JobReport('ordered_popularities', client, formats=formats, workers=workers) as report:
+                with report.phase('load') as p:
+                    logger.info('Loading data...')
+                    all_card_iter = (Card().load(x) for x in client.cards.find())
+                    all_cards = {x.name: x for x in all_card_iter}
+                    logger.info(f'Loaded {len(all_cards)} cards.')
+                    all_competitions = [Competition().load(x) for x in client.competitions.find()]
+                    logger.info(f'Loaded {len(all_competitions)} competitions.')
+                    all_tags = [DeckTag().load(x) for x in client.deck_tags.find()]
+                    logger.info(f'Loaded {len(all_tags)} deck tags.')
+                    all_decks: list[Deck] = list(stream_decks(client, {}, 'listing'))
+                    logger.info(f'Loaded {len(all_decks)} decks.')
+                    users = {x['user_id']: x['nickname'] for x in client.users.find({}, {'user_id': 1, 'nickname': 1})}
+                    logger.info(f'Loaded {len(users)} users.')
+                    logger.info('Loaded data!')
+                    p.count(len(all_decks))
+
+                with report.phase('staging'):
+                    start_staging(client, staged, keep={'format': {'$nin': formats}})
+
+                with report.phase('deck matrix') as p:
+                    logger.info('Building the deck matrix...')
+                    deck_matrix = DeckMatrix.build(all_decks)
+                    format_matrices = deck_matrix.split_by_format()
+                    p.count(deck_matrix.deck_count)
+                decks_by_format: dict[str, list[Deck]] = {}
+                for y in all_decks:
+                    decks_by_format.setdefault(y.format, []).append(y)
+                format_counts = {x: len(all_decks) if x == '_all' else len(decks_by_format.get(x, [])) for x in formats}
+                for x in formats:
+                    if not format_counts[x]:
+                        logger.info(f'Skipping format {x}')
+                # the popularity of the cards of all decks up to each format, used for the format popularities
+                with report.phase('prefix sums'):
+                    logger.info('Calculating the popularities of format prefixes...')
+                    prefix_popularities = prefix_counts(deck_matrix, all_cards, format_order)
+
+                def process_format(x: str) -> FormatResult:
+                    logger.warning(f'Processing format {x}')
+                    # everything except the format popularity only looks at the decks of x itself,
+                    # unless x is not in format_order, then it just uses the decks of every format, like _all
+                    if x in format_order:
+                        local_matrix = format_matrices[x]
+                        local_decks = decks_by_format[x]
+                        total_popularities = prefix_popularities[x]
+                    else:
+                        local_matrix = deck_matrix.subset(np.isin(deck_matrix.formats, [
+                            i for i, y in enumerate(deck_matrix.format_names) if y in format_order]))
+                        local_decks = [y for y in all_decks if y.format in format_order]
+                        total_popularities = None
+                    logger.info(f'Found {local_matrix.deck_count} decks')
+
+                    r = FormatResult(x)
+                    r.comp_pop, r.dt_pop, r.f_pop, r.deck_tops = run_popularity(
+                        x, all_cards, local_matrix, all_competitions, all_tags, total_popularities)
+                    if sideboard_importance and x != '_all':
+                        r.summaries, r.bundles = run_competition_summaries(
+                            x, all_cards, local_decks, all_competitions, r.comp_pop, users, all_tags,
+                            sideboard_importance)
+                    r.arch_cache = run_tag_covers(x, local_matrix, all_tags, r.dt_pop)
+                    r.staple_cache = run_playability(x, all_cards, local_matrix)
+                    for j in r.staple_cache:
+                        postprocess_playability(j, x, format_counts[x])
+                    return r
+
+                results = map_formats(process_format, [x for x in formats if format_counts[x]], workers)
+                for result in report.iterate('calculate', results):
+                    with report.phase('write') as p:
+                        p.count(write_format_result(client, result, len(format_order) > 1 and result.format != '_all',
+                                                    staging_suffix))
+                    logger.info(f'Format {result.format} complete.')
+                with report.phase('finish staging'):
+                    finish_staging(client, staged)
+                    finished = True
+
+        except (DreadriseError, KeyError, ValueError):
+            logger.error('A error occured!')
+            traceback.print_exc()
+        finally:
+            # any failure, including a database error, leaves the current collections as they were
+            if not finished:
+                abort_staging(client, staged)
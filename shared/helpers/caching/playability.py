@@ -1,33 +1,28 @@
 import logging
 
+import numpy as np
+
+from shared.helpers.deck_matrix import DeckMatrix
 from shared.types.caching import CardPlayability
 from shared.types.card import Card
-from shared.types.deck import Deck
 
 logger = logging.getLogger('dreadrise.popularity.playability')
 
 
-def run_playability(fmt: str, g_cards: dict[str, Card], g_decks: list[Deck]) -> list[CardPlayability]:
-    decks_in_format = [x for x in g_decks if x.format == fmt] if fmt != '_all' else g_decks
-    logger.info('Staple calculation: fast way')
-    card_stuff = [(x, z.wins, z.losses) for z in decks_in_format for x in z.mainboard if x in g_cards]
-    counter: dict[str, CardPlayability] = {}
-    wins_losses: dict[str, tuple[int, int]] = {}
-    for card_name, wins, losses in card_stuff:
-        cp = counter.get(card_name, None)
-        if not cp:
-            cp = CardPlayability()
-            cp.format = fmt
-            cp.card_name = card_name
-            cp.deck_count = 0
-            counter[card_name] = cp
-
-        cp.deck_count += 1
-        wl = wins_losses.get(card_name, (0, 0))
-        wins_losses[card_name] = (wl[0] + wins, wl[1] + losses)
+def run_playability(fmt: str, g_cards: dict[str, Card], g_decks: DeckMatrix) -> list[CardPlayability]:
+    logger.info('Staple calculation: deck matrix')
+    entry_mask = g_decks.card_mask(g_cards)[g_decks.cards] & g_decks.in_format(fmt)[g_decks.entry_decks]
+    values = [np.ones(len(g_decks.cards), dtype=np.int64), g_decks.wins[g_decks.entry_decks],
+              g_decks.losses[g_decks.entry_decks]]
+    _, card_ids, (deck_counts, wins, losses), first = g_decks.card_totals(values, entry_mask)
 
-    for name, cp in counter.items():
-        deck_wins, deck_losses = wins_losses[name]
+    ans = []
+    for i in np.argsort(first).tolist():
+        cp = CardPlayability()
+        cp.format = fmt
+        cp.card_name = g_decks.card_names[card_ids[i]]
+        cp.deck_count = int(deck_counts[i])
+        deck_wins, deck_losses = int(wins[i]), int(losses[i])
         cp.winrate = deck_wins / max(1, deck_losses + deck_wins)
-
-    return list(counter.values())
+        ans.append(cp)
+    return ans
@@ -1,96 +1,223 @@
 import logging
-from collections import Counter
-from typing import Iterable
+
+import numpy as np
 
 from shared.card_enums import format_popularity, popularity_multiplier
+from shared.helpers.deck_matrix import BoolArray, DeckMatrix, FloatArray, GroupSums, IntArray
 from shared.types.caching import CompetitionPopularity, DeckTagPopularity, FormatPopularity, Popularity
 from shared.types.card import Card
 from shared.types.competition import Competition
-from shared.types.deck import Deck
 from shared.types.deck_tag import DeckTag
 
 logger = logging.getLogger('dreadrise.popularity')
 
 
-def count(decks: list[Deck], cards: dict[str, Card]) -> dict[str, float]:
-    card_counts: dict[str, int] = Counter()
-    for i in decks:
-        if i.competition:
-            for j, c in i.mainboard.items():
-                if j in cards and cards[j].main_type != 'land':
-                    card_counts[j] += c * (i.wins * 2 + i.losses + 1)
-    max_popularity = max(card_counts.values()) + 1 if len(card_counts) > 0 else 1
-    return {x: c / max_popularity for x, c in card_counts.items()}
+def entry_weights(decks: DeckMatrix, cards: dict[str, Card]) -> tuple[IntArray, BoolArray]:
+    """
+    Calculate the popularity weight of each entry of a deck matrix.
+    Only nonland cards of decks from competitions are counted.
+    :param decks: the deck matrix
+    :param cards: the card dictionary
+    :return: the weight of each entry, the entries that are counted
+    """
+    nonland = decks.card_mask(cards, lambda c: c.main_type != 'land')
+    counted = nonland[decks.cards] & (decks.competitions >= 0)[decks.entry_decks]
+    weights = decks.counts * (decks.wins * 2 + decks.losses + 1)[decks.entry_decks]
+    return weights, counted
 
 
-def run_popularity(fmt: str, all_cards: dict[str, Card], all_decks: list[Deck], all_competitions: list[Competition],
-                   all_tags: list[DeckTag]) -> \
-        tuple[list[CompetitionPopularity], list[DeckTagPopularity], Popularity, dict[str, str]]:
-    decks_from_format = [x for x in all_decks if x.format == fmt] if fmt != '_all' else all_decks
-    all_format_popularities = count(all_decks, all_cards)
-    card_popularities = count(decks_from_format, all_cards)
+def normalize(card_counts: FloatArray) -> FloatArray:
+    max_popularity = card_counts.max() + 1 if len(card_counts) > 0 else 1
+    return card_counts / max_popularity
 
-    nonland_cards = {x for x, y in all_cards.items() if y.main_type != 'land'}
-    basics = {x for x, y in all_cards.items() if 'Basic' not in y.types}
 
-    comp_pop: list[CompetitionPopularity] = []
-    dt_pop: list[DeckTagPopularity] = []
-    for i in all_competitions:
-        decks = [x for x in decks_from_format if x.competition == i.competition_id]
-        if not decks:
+def count(decks: DeckMatrix, cards: dict[str, Card]) -> FloatArray:
+    """
+    Calculate the normalized popularity of the cards of a deck matrix.
+    :param decks: the deck matrix
+    :param cards: the card dictionary
+    :return: the popularity of each card of the matrix, 0 for cards that are not counted
+    """
+    weights, counted = entry_weights(decks, cards)
+    _, card_ids, (card_counts,), _ = decks.card_totals([weights], counted)
+    popularities = np.zeros(decks.card_count)
+    popularities[card_ids] = normalize(card_counts)
+    return popularities
+
+
+def prefix_counts(decks: DeckMatrix, cards: dict[str, Card], format_order: list[str]) -> dict[str, FloatArray]:
+    """
+    Calculate the normalized popularity of cards over the decks of each prefix of an ordered list of formats.
+    The weights of each format are summed once and accumulated, so the result for a format is equal to
+    count() of the decks of that format and every format before it.
+    :param decks: the deck matrix
+    :param cards: the card dictionary
+    :param format_order: the formats, in order
+    :return: the popularity of each card of the matrix for each format of format_order
+    """
+    weights, counted = entry_weights(decks, cards)
+    format_ids, card_ids, (card_counts,), _ = decks.sum_by_format([weights], counted)
+    bounds = np.searchsorted(format_ids, np.arange(len(decks.format_names) + 1))
+    running = np.zeros(decks.card_count)
+    ans: dict[str, FloatArray] = {}
+    for x in format_order:
+        if x in ans:
             continue
+        if x in decks.format_names:
+            i = decks.format_names.index(x)
+            running[card_ids[bounds[i]:bounds[i + 1]]] += card_counts[bounds[i]:bounds[i + 1]]
+        ans[x] = normalize(running)
+    return ans
+
+
+def top_popularities(groups: GroupSums, card_popularities: FloatArray) -> dict[int, list[tuple[int, float]]]:
+    """
+    Find the three most popular cards of each group, compared to their popularity in the format.
+    Ties are kept in the order of the first occurrence of the cards in the group.
+    :param groups: the card weights of each group
+    :param card_popularities: the popularity of each card in the format
+    :return: the top cards of each group and their popularity in it
+    """
+    group_ids, card_ids, (card_counts,), first = groups
+    if not len(group_ids):
+        return {}
+    starts = np.flatnonzero(np.r_[True, group_ids[1:] != group_ids[:-1]])
+    lengths = np.diff(np.r_[starts, len(group_ids)])
+    values = card_counts / np.repeat(np.maximum.reduceat(card_counts, starts) + 1, lengths)
+    keys = card_popularities[card_ids] * popularity_multiplier - values
+    # group_ids is sorted, so the groups stay where they were and the first three rows of each group are its top
+    order = np.lexsort((first, keys, group_ids))
+    ranks = np.arange(len(order)) - np.repeat(starts, lengths)
+    ans: dict[int, list[tuple[int, float]]] = {}
+    for i in order[ranks < 3].tolist():
+        ans.setdefault(int(group_ids[i]), []).append((int(card_ids[i]), float(values[i])))
+    return ans
+
+
+def top_cards(decks: DeckMatrix, deck_mask: BoolArray, cards: dict[str, Card], nonland: BoolArray,
+              card_popularities: FloatArray) -> dict[str, str]:
+    """
+    Find the most characteristic card of each deck.
+    :param decks: the deck matrix
+    :param deck_mask: the decks to process
+    :param cards: the card dictionary
+    :param nonland: the nonland cards of the matrix
+    :param card_popularities: the popularity of each card in the format
+    :return: the top card of each deck
+    """
+    entries = np.flatnonzero(deck_mask[decks.entry_decks] & nonland[decks.cards])
+    scores = decks.counts[entries] / 2 - card_popularities[decks.cards[entries]]
+    order = entries[np.lexsort((entries, -scores, decks.entry_decks[entries]))]
+    top_decks, first = np.unique(decks.entry_decks[order], return_index=True)
+    ans = {decks.deck_ids[x]: decks.card_names[y]
+           for x, y in zip(top_decks.tolist(), decks.cards[order[first]].tolist())}
+
+    without_nonlands = deck_mask.copy()
+    without_nonlands[top_decks] = False
+    for i in np.flatnonzero(without_nonlands).tolist():
+        mainboard = [(decks.card_names[x], y) for x, y in zip(
+            decks.cards[decks.indptr[i]:decks.indptr[i + 1]].tolist(),
+            decks.counts[decks.indptr[i]:decks.indptr[i + 1]].tolist())]
+        if mainboard:
+            logger.warning(f'Deck with only lands: {decks.deck_ids[i]} ({decks.deck_names[i]})')
+            ans[decks.deck_ids[i]] = max(
+                mainboard, key=lambda u: (100 if u[0] not in cards or 'Basic' in cards[u[0]].types else 0) + u[1])[0]
+        else:
+            logger.warning(f'Deck with empty mainboard: {decks.deck_ids[i]} ({decks.deck_names[i]})')
+    return ans
+
 
-        counter = count(decks, all_cards)
-        for c, val in sorted(counter.items(), key=lambda x: card_popularities[x[0]] * popularity_multiplier - x[1])[:3]:
+def _format_popularity(fmt: str, all_decks: DeckMatrix, in_format: BoolArray, format_cards: IntArray,
+                       format_counts: FloatArray, format_first: IntArray, total_popularities: FloatArray) -> Popularity:
+    if fmt == '_all' or not len(format_cards):
+        return Popularity()
+    card_popularities = normalize(format_counts)
+    keys = total_popularities[format_cards] * format_popularity - card_popularities
+    i = int(np.lexsort((format_first, keys))[0])
+    fp = FormatPopularity()
+    fp.format = fmt
+    fp.card_name = all_decks.card_names[format_cards[i]]
+    fp.self_popularity = float(card_popularities[i])
+    fp.total_popularity = fp.self_popularity
+    fp.true_popularity = fp.self_popularity - fp.total_popularity
+    fp.deck_count = int(in_format.sum())
+    return fp
+
+
+def run_format_popularity(fmt: str, all_cards: dict[str, Card], all_decks: DeckMatrix,
+                          total_popularities: FloatArray) -> Popularity:
+    """
+    Find the most characteristic card of a format, the format popularity part of run_popularity.
+    :param fmt: the format
+    :param all_cards: the card dictionary
+    :param all_decks: the matrix of all decks that are considered
+    :param total_popularities: count(all_decks, all_cards)
+    :return: the format popularity, an empty Popularity for _all and formats without cards
+    """
+    in_format = all_decks.in_format(fmt)
+    weights, counted = entry_weights(all_decks, all_cards)
+    _, format_cards, (format_counts,), format_first = all_decks.card_totals(
+        [weights], counted & in_format[all_decks.entry_decks])
+    return _format_popularity(fmt, all_decks, in_format, format_cards, format_counts, format_first, total_popularities)
+
+
+def run_popularity(fmt: str, all_cards: dict[str, Card], all_decks: DeckMatrix, all_competitions: list[Competition],
+                   all_tags: list[DeckTag], all_format_popularities: FloatArray | None = None) -> \
+        tuple[list[CompetitionPopularity], list[DeckTagPopularity], Popularity, dict[str, str]]:
+    """
+    Calculate the popularity of cards in a format, its competitions and its tags.
+    :param fmt: the format
+    :param all_cards: the card dictionary
+    :param all_decks: the matrix of all decks that are considered
+    :param all_competitions: all competitions
+    :param all_tags: all tags
+    :param all_format_popularities: count(all_decks, all_cards), if it was already calculated
+    :return: competition popularities, tag popularities, format popularity, the top card of each deck
+    """
+    in_format = all_decks.in_format(fmt)
+    weights, counted = entry_weights(all_decks, all_cards)
+    format_entries = counted & in_format[all_decks.entry_decks]
+    _, format_cards, (format_counts,), format_first = all_decks.card_totals([weights], format_entries)
+    card_popularities = np.zeros(all_decks.card_count)
+    card_popularities[format_cards] = normalize(format_counts)
+    if all_format_popularities is not None:
+        total_popularities = all_format_popularities
+    else:
+        total_popularities = card_popularities if fmt == '_all' else count(all_decks, all_cards)
+
+    competition_top = top_popularities(all_decks.sum_by_competition([weights], format_entries), card_popularities)
+    competition_index = {x: i for i, x in enumerate(all_decks.competition_names)}
+    comp_pop: list[CompetitionPopularity] = []
+    for i in all_competitions:
+        for c, val in competition_top.get(competition_index.get(i.competition_id, -1), []):
             cp = CompetitionPopularity()
             cp.format = fmt
-            cp.card_name = c
+            cp.card_name = all_decks.card_names[c]
             cp.self_popularity = val
-            cp.total_popularity = card_popularities[c]
+            cp.total_popularity = float(card_popularities[c])
             cp.competition = i.competition_id
             cp.preprocess()
             comp_pop.append(cp)
 
+    tag_top = top_popularities(all_decks.sum_by_tag([weights], format_entries), card_popularities)
+    tag_index = {x: i for i, x in enumerate(all_decks.tag_names)}
+    dt_pop: list[DeckTagPopularity] = []
     for j in all_tags:
-        decks = [x for x in decks_from_format if j.tag_id in x.tags]
-        if not decks:
-            continue
-
-        counter = count(decks, all_cards)
-        for c, val in sorted(counter.items(), key=lambda x: card_popularities[x[0]] * popularity_multiplier - x[1])[:3]:
+        for c, val in tag_top.get(tag_index.get(j.tag_id, -1), []):
             dtp = DeckTagPopularity()
             dtp.format = fmt
-            dtp.card_name = c
+            dtp.card_name = all_decks.card_names[c]
             dtp.self_popularity = val
-            dtp.total_popularity = card_popularities[c]
+            dtp.total_popularity = float(card_popularities[c])
             dtp.deck_tag = j.tag_id
             dtp.preprocess()
             dt_pop.append(dtp)
 
-    if fmt == '_all' or not card_popularities:
-        fp = Popularity()
-    else:
-        c, val = min(card_popularities.items(), key=lambda x: all_format_popularities[x[0]] * format_popularity - x[1])
-        fp = FormatPopularity()
-        fp.format = fmt
-        fp.card_name = c
-        fp.self_popularity = val
-        fp.total_popularity = card_popularities[c]
-        fp.true_popularity = fp.self_popularity - fp.total_popularity
-        fp.deck_count = len(decks_from_format)
+    fp = _format_popularity(fmt, all_decks, in_format, format_cards, format_counts, format_first, total_popularities)
 
     top_cards_per_id = {}
     if fmt != '_all':
-        for k in decks_from_format:
-            nonland_cards_lst: Iterable[tuple[str, int]] = [x for x in k.mainboard.items() if x[0] in nonland_cards]
-            if nonland_cards_lst:
-                top_cards_per_id[k.deck_id] = max(
-                    nonland_cards_lst, key=lambda u: u[1] / 2 - card_popularities[u[0]])[0]
-            elif k.mainboard:
-                logger.warning(f'Deck with only lands: {k.deck_id} ({k.name})')
-                top_cards_per_id[k.deck_id] = max(
-                    k.mainboard.items(), key=lambda u: (100 if u[0] not in basics else 0) + u[1])[0]
-            else:
-                logger.warning(f'Deck with empty mainboard: {k.deck_id} ({k.name})')
+        nonland = all_decks.card_mask(all_cards, lambda c: c.main_type != 'land')
+        top_cards_per_id = top_cards(all_decks, in_format, all_cards, nonland, card_popularities)
 
     return comp_pop, dt_pop, fp, top_cards_per_id
@@ -0,0 +1,90 @@
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterator
+from uuid import uuid4
+
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError
+
+from shared.helpers.database import setup_cache_indexes
+
+logger = logging.getLogger('dreadrise.popularity')
+
+staging_suffix = '_staging'
+popularity_collections = ['competition_popularities', 'tag_popularities', 'format_popularities', 'archetype_cache',
+                          'card_playability']
+summary_collections = ['competition_summaries', 'competition_bundles']
+# a lock older than this was left by a job that died
+STAGING_LOCK_TIMEOUT = timedelta(hours=6)
+STAGING_LOCK_POLL_SECONDS = 5
+
+
+@contextmanager
+def staging_lock(client: Database, job: str) -> Iterator[None]:
+    """
+    Run a popularity job alone. The jobs share the staging collections, and a job that swaps in its collections
+    would drop the rows another job wrote in the meantime, so a job waits until the others are done.
+    The lock is a document of the job_locks collection, a lock older than STAGING_LOCK_TIMEOUT is ignored.
+    :param client: the database
+    :param job: the name of the job, for the logs
+    :return: nothing
+    """
+    owner = uuid4().hex
+    waiting = False
+    while True:
+        try:
+            client.job_locks.insert_one({'name': 'staging', 'owner': owner, 'job': job, 'start': datetime.utcnow()})
+            break
+        except DuplicateKeyError:
+            if client.job_locks.delete_one({'name': 'staging',
+                                            'start': {'$lt': datetime.utcnow() - STAGING_LOCK_TIMEOUT}}).deleted_count:
+                logger.warning('Removed a stale staging lock')
+                continue
+            if not waiting:
+                logger.info(f'Job {job} is waiting for another popularity job to finish')
+                waiting = True
+            time.sleep(STAGING_LOCK_POLL_SECONDS)
+    try:
+        yield
+    finally:
+        client.job_locks.delete_one({'name': 'staging', 'owner': owner})
+
+
+def start_staging(client: Database, collections: list[str], keep: dict | None = None) -> None:
+    """
+    Create empty staging copies of cache collections, without secondary indexes.
+    Every staging collection is created, even if no rows are kept, so that finish_staging can rename all of them.
+    :param client: the database
+    :param collections: the collections to rebuild
+    :param keep: the query of the rows that are copied from the current collections, if any
+    :return: nothing
+    """
+    for x in collections:
+        client[x + staging_suffix].drop()
+        client.command({'create': x + staging_suffix})
+        if keep is not None:
+            client[x].aggregate([{'$match': keep}, {'$out': x + staging_suffix}])
+    logger.info(f'Staging {len(collections)} collections')
+
+
+def finish_staging(client: Database, collections: list[str]) -> None:
+    """
+    Index the staging collections and replace the current collections with them.
+    Each collection is swapped with a single rename, so readers never see an empty collection.
+    :param client: the database
+    :param collections: the rebuilt collections
+    :return: nothing
+    """
+    logger.info('Building indexes of the staging collections...')
+    setup_cache_indexes(client, collections, staging_suffix)
+    for x in collections:
+        client[x + staging_suffix].rename(x, dropTarget=True)
+    logger.info(f'Swapped in {len(collections)} collections')
+
+
+def abort_staging(client: Database, collections: list[str]) -> None:
+    for x in collections:
+        client[x + staging_suffix].drop()
+    logger.warning('Dropped the staging collections')
@@ -1,40 +1,37 @@
 import logging
 
+import numpy as np
+
+from shared.helpers.deck_matrix import DeckMatrix
 from shared.types.caching import DeckTagCache, DeckTagPopularity
-from shared.types.deck import Deck
 from shared.types.deck_tag import DeckTag
 
 logger = logging.getLogger('dreadrise.popularity.tags')
 
 
-def run_tag_covers(fmt: str, dck: list[Deck], tags: list[DeckTag], pops: list[DeckTagPopularity]) -> list[DeckTagCache]:
-    decks_in_format = [x for x in dck if x.format == fmt] if fmt != '_all' else dck
+def run_tag_covers(fmt: str, dck: DeckMatrix, tags: list[DeckTag], pops: list[DeckTagPopularity]) -> \
+        list[DeckTagCache]:
     tag_dict = {x.tag_id: x for x in tags}
-    card_stuff = [(z.tags[0], z.wins, z.losses) for z in decks_in_format if z.tags]
-    counter: dict[str, DeckTagCache] = {}
-    wins_losses: dict[str, tuple[int, int]] = {}
-    for tag_id, wins, losses in card_stuff:
-        dtc = counter.get(tag_id, None)
-        if not dtc:
-            dtc = DeckTagCache()
-            dtc.format = fmt
-            dtc.tag = tag_id
-            dtc.tag_name = tag_dict[tag_id].name if tag_id in tag_dict else '???'
-            dtc.cards = [x.card_name for x in pops if x.deck_tag == tag_id]
-            dtc.deck_count = 0
-            counter[tag_id] = dtc
-
-        dtc.deck_count += 1
-        wl = wins_losses.get(tag_id, (0, 0))
-        wins_losses[tag_id] = (wl[0] + wins, wl[1] + losses)
+    tag_cards: dict[str, list[str]] = {}
+    for x in pops:
+        tag_cards.setdefault(x.deck_tag, []).append(x.card_name)
+    tag_ids, (wins, losses), deck_counts, first = dck.deck_group_sums(
+        dck.first_tags, [dck.wins, dck.losses], dck.in_format(fmt))
 
     ans = []
-    for name, dtc in counter.items():
-        dtc.deck_wins, dtc.deck_losses = wins_losses[name]
+    for i in np.argsort(first).tolist():
+        tag_id = dck.tag_names[tag_ids[i]]
+        dtc = DeckTagCache()
+        dtc.format = fmt
+        dtc.tag = tag_id
+        dtc.tag_name = tag_dict[tag_id].name if tag_id in tag_dict else '???'
+        dtc.cards = tag_cards.get(tag_id, [])
+        dtc.deck_count = int(deck_counts[i])
+        dtc.deck_wins, dtc.deck_losses = int(wins[i]), int(losses[i])
         if dtc.cards:
             dtc.clean()
             ans.append(dtc)
         else:
-            logger.warning(f'Skipping archetype {name}')
+            logger.warning(f'Skipping archetype {tag_id}')
 
     return ans
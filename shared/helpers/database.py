@@ -1,4 +1,6 @@
-from pymongo import MongoClient
+from typing import Iterable
+
+from pymongo import IndexModel, MongoClient, ReturnDocument
 from pymongo.database import Database
 
 from shared.core_enums import Distribution
@@ -6,6 +8,22 @@ from shared.helpers import configuration
 from shared.helpers.exceptions import ConfigurationError
 
 mongo_clients: dict[Distribution, Database] = {}
+# the indexes of the collections that the popularity jobs rebuild
+cache_indexes: dict[str, list[IndexModel]] = {
+    'card_playability': [IndexModel('card_name', name='card playability')],
+    'competition_popularities': [
+        IndexModel('card_name', name='card popularity over competitions'),
+        IndexModel([('competition', 1), ('format', 1), ('true_popularity', -1)], name='competition main card')
+    ],
+    'competition_summaries': [IndexModel('competition', unique=True, name='competition summary')],
+    'competition_bundles': [IndexModel('competition', unique=True, name='competition bundle')],
+    'format_popularities': [IndexModel('card_name', name='card popularity over formats')],
+    'tag_popularities': [
+        IndexModel('card_name', name='card popularity over tags'),
+        IndexModel([('deck_tag', 1), ('format', 1)], name='tag popularities by tag')
+    ],
+    'archetype_cache': [IndexModel([('tag', 1), ('format', 1)], name='tag cover')]
+}
 
 
 def setup_indexes(d: Database) -> None:
@@ -17,6 +35,11 @@ def setup_indexes(d: Database) -> None:
     d.cards.create_index('name', unique=True, name='card name')
     d.cards.create_index('card_id', unique=True, name='card ID')
     d.decks.create_index('deck_id', unique=True, name='deck ID')
+    d.decks.create_index('competition', name='deck competition')
+    d.decks.create_index('assigned_rules', name='deck assigned rules')
+    d.decks.create_index('mainboard.$**', name='deck mainboard cards')
+    d.decks.create_index('sideboard.$**', name='deck sideboard cards')
+    d.decks.create_index('generation', name='deck generation')
     d.deck_tags.create_index('tag_id', unique=True, name='tag ID')
     d.deck_tags.create_index('name', unique=True, name='tag name')
     d.text_deck_rules.create_index('tag_id', name='text deck tag')
@@ -25,13 +48,29 @@ def setup_indexes(d: Database) -> None:
     d.users.create_index('login', unique=True, sparse=True, name='user login')
     d.users.create_index('user_id', unique=True, name='user ID')
     d.users.create_index('nickname', unique=True, sparse=True, name='user nickname I')
+    d.competitions.create_index([('type', 1), ('date', -1)], name='competition type by date')
+    d.competitions.create_index([('format', 1), ('date', -1)], name='competition format by date')
     d.expansions.create_index('code', unique=True, name='expansion code')
     d.next_counts.create_index('name', unique=True, name='next count card name')
     d.next_counts.create_index('checks', name='next count checks')
-    d.card_playability.create_index('card_name', name='card playability')
-    d.competition_popularities.create_index('card_name', name='card popularity over competitions')
-    d.format_popularities.create_index('card_name', name='card popularity over formats')
-    d.tag_popularities.create_index('card_name', name='card popularity over tags')
+    d.job_runs.create_index([('job', 1), ('start', -1)], name='job runs by date')
+    d.rule_updates.create_index('update_id', unique=True, name='rule update ID')
+    d.rule_updates.create_index('start', name='rule updates by date')
+    d.generations.create_index('name', unique=True, name='generation name')
+    d.job_locks.create_index('name', unique=True, name='job lock name')
+    setup_cache_indexes(d)
+
+
+def setup_cache_indexes(d: Database, collections: Iterable[str] = cache_indexes, suffix: str = '') -> None:
+    """
+    Set up the indexes of the collections that the popularity jobs rebuild.
+    :param d: the Database object
+    :param collections: the collections to set up
+    :param suffix: the suffix of the collection names, used for staging collections
+    :return: nothing
+    """
+    for x in collections:
+        d[x + suffix].create_indexes(cache_indexes[x])
 
 
 def connect(dist: Distribution) -> Database:
@@ -50,3 +89,51 @@ def connect(dist: Distribution) -> Database:
         setup_indexes(mongo_clients[dist])
 
     return mongo_clients[dist]
+
+
+def _get_generation(d: Database, name: str) -> int:
+    doc = d.generations.find_one({'name': name})
+    return doc['generation'] if doc else 0
+
+
+def _bump_generation(d: Database, name: str) -> int:
+    # mongo-types does not know the upsert argument and types ReturnDocument.AFTER as True
+    return d.generations.find_one_and_update({'name': name}, {'$inc': {'generation': 1}}, upsert=True,
+                                             return_document=ReturnDocument.AFTER)['generation']  # type: ignore
+
+
+def get_card_generation(d: Database) -> int:
+    """
+    Get the generation of the card data, which changes every time the cards are scraped.
+    :param d: the Database object
+    :return: the generation, 0 if the cards were never scraped since generations were introduced
+    """
+    return _get_generation(d, 'cards')
+
+
+def bump_card_generation(d: Database) -> int:
+    """
+    Mark the card data as changed, so that the results cached for the previous cards are not used anymore.
+    :param d: the Database object
+    :return: the new generation
+    """
+    return _bump_generation(d, 'cards')
+
+
+def get_deck_generation(d: Database) -> int:
+    """
+    Get the generation of the deck lists, which changes every time the cards of some decks are written.
+    :param d: the Database object
+    :return: the generation, 0 if no deck lists were written since generations were introduced
+    """
+    return _get_generation(d, 'decks')
+
+
+def bump_deck_generation(d: Database) -> int:
+    """
+    Start writing the cards of some decks. The decks must be written with the returned value in their generation
+    field, so that the deck index reloads them.
+    :param d: the Database object
+    :return: the new generation
+    """
+    return _bump_generation(d, 'decks')
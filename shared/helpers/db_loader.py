@@ -1,17 +1,22 @@
 from itertools import chain
-from typing import Any, Callable
+from math import ceil
+from typing import Any, Callable, Iterable, Iterator, Literal
 
 import arrow
+from pymongo.database import Database
 
 from shared.card_enums import card_types
 from shared.core_enums import Distribution
 from shared.helpers.database import connect
+from shared.helpers.exceptions import InvalidArgumentError
+from shared.helpers.payload import CompactPayload
 from shared.helpers.util import clean_name, shorten_name
 from shared.helpers.util2 import get_dist_constants
 from shared.type_defaults import bye_user, default_deck, default_tag, get_blank_user, make_card
+from shared.types.caching import CompetitionBundle, CompetitionSummary
 from shared.types.card import Card
 from shared.types.competition import Competition
-from shared.types.deck import Deck
+from shared.types.deck import Deck, LeanDeck
 from shared.types.deck_tag import DeckTag
 from shared.types.set import Expansion
 from shared.types.user import User
@@ -19,6 +24,28 @@ from shared.types.user import User
 CardType = list[tuple[Card, int]]  # [(card_name, card_count)]
 CardCategory = list[tuple[str, CardType, int]]  # [(card_type, CardType, total_count)]
 
+DECK_PAGE_SIZE = 250
+# the default order of paged deck lists, deck_id makes the pages stable
+deck_page_sort = [('wins', -1), ('losses', 1), ('deck_id', 1)]
+
+DeckProfile = Literal['reference', 'metagame', 'analysis', 'listing', 'tagging', 'colors', 'cards', 'full']
+# Every profile except `full` skips `games` (every match record) and the search-only fields, and only the tagging
+# profile loads `assigned_rules`. Decks loaded with these must not be saved back into the database.
+deck_projections: dict[DeckProfile, dict[str, int] | None] = {
+    'reference': {'_id': 0, 'deck_id': 1, 'name': 1, 'author': 1},
+    'metagame': {'_id': 0, 'deck_id': 1, 'tags': 1, 'wins': 1, 'losses': 1},
+    'analysis': {'_id': 0, 'deck_id': 1, 'competition': 1, 'format': 1, 'source': 1, 'tags': 1,
+                 'mainboard': 1, 'sideboard': 1, 'wins': 1, 'losses': 1, 'ties': 1},
+    'listing': {'_id': 0, 'deck_id': 1, 'name': 1, 'author': 1, 'competition': 1, 'format': 1, 'source': 1,
+                'date': 1, 'main_card': 1, 'tags': 1, 'mainboard': 1, 'sideboard': 1, 'wins': 1, 'losses': 1,
+                'ties': 1, 'privacy': 1, 'color_data': 1},
+    'tagging': {'_id': 0, 'deck_id': 1, 'name': 1, 'is_name_placeholder': 1, 'author': 1, 'tags': 1, 'mainboard': 1,
+                'sideboard': 1, 'assigned_rules': 1},
+    'colors': {'_id': 0, 'deck_id': 1, 'mainboard': 1, 'color_data': 1},
+    'cards': {'_id': 0, 'deck_id': 1, 'name': 1, 'mainboard': 1, 'sideboard': 1},
+    'full': None
+}
+
 
 class LoadedDeck:
     deck: Deck = default_deck
@@ -38,12 +65,20 @@ class LoadedDeck:
             'author': self.author.save() if self.author.nickname else get_blank_user(self.deck.author).save(),
             'main_card': self.main_card,
             'name': shorten_name(self.deck.name),
-            'date_str': arrow.get(self.deck.date).humanize() if self.deck else '?',
+            'date_str': arrow.get(self.deck.date).humanize() if hasattr(self.deck, 'date') else '?',
             'tags': [x.save() for x in self.tags] if self.tags else [default_tag.save()],
             'format': self.format,
             'competition': self.competition.save() if hasattr(self, 'competition') else False
         }
 
+    def compact(self, payload: CompactPayload) -> None:
+        tags = [(x.tag_id, x.name) for x in self.tags] or [(default_tag.tag_id, default_tag.name)]
+        competition = (self.competition.competition_id, self.competition.name) if hasattr(self, 'competition') \
+            else None
+        deck = self.deck
+        payload.add_deck(deck.deck_id, deck.name, (deck.wins, deck.losses, deck.ties), deck.color_data,
+                         (deck.format, self.format), (self.author.user_id, self.author.nickname), tags, competition)
+
 
 class PopularCardData:
     card: Card = make_card('')
@@ -59,6 +94,9 @@ class PopularCardData:
             'losses': self.losses
         }
 
+    def compact(self, payload: CompactPayload) -> None:
+        payload.add_popular_card((self.card.card_id, self.card.name), self.weight, self.wins, self.losses)
+
 
 class LoadedCompetition:
     competition: Competition
@@ -71,21 +109,32 @@ class LoadedCompetition:
     popular_cards: list[PopularCardData] = []
     date_str: str = '?'
     deck_count: int = 0
-    partial_load: bool = False
+    page_num: int = 1
 
     def jsonify(self) -> dict:
         return {
-            'competition': self.competition.save() if hasattr(self, 'competition') else False,
+            **self.jsonify_header(),
             'decks': [x.jsonify() for x in self.decks],
             'cards': {x: y.virtual_save() for x, y in self.cards.items()},
             'users': {x: y.virtual_save() for x, y in self.users.items()},
+            'tags': {x: y.virtual_save() for x, y in self.tags.items()},
+            'popular_cards': [x.jsonify() for x in self.popular_cards]
+        }
+
+    def jsonify_compact(self) -> dict:
+        return {
+            **compact_deck_list(self.decks, self.popular_cards),
+            **self.jsonify_header()
+        }
+
+    def jsonify_header(self) -> dict:
+        return {
+            'competition': self.competition.save() if hasattr(self, 'competition') else False,
             'main_card': self.main_card,
             'format': self.format,
             'date_str': self.date_str,
-            'tags': {x: y.virtual_save() for x, y in self.tags.items()},
-            'popular_cards': [x.jsonify() for x in self.popular_cards],
             'deck_count': self.deck_count,
-            'partial_load': self.partial_load
+            **deck_page_info(self.deck_count, self.page_num)
         }
 
 
@@ -116,9 +165,58 @@ class DeckAnalysis:
     example_comp: Competition
 
 
-def load_cards_from_decks(dist: Distribution, decks: list[Deck]) -> dict[str, Card]:
+def find_decks(db: Database, query: dict, profile: DeckProfile = 'full',
+               sort: list[tuple[str, int]] | None = None, skip: int = 0, limit: int = 0) -> list[Deck]:
+    """
+    Load the decks matching a query, only fetching the fields of a projection profile.
+    :param db: the database
+    :param query: the deck query
+    :param profile: the projection profile, see deck_projections
+    :param sort: the sort order, if any
+    :param skip: the amount of decks to skip
+    :param limit: the maximum amount of decks to load, 0 means no limit
+    :return: the list of loaded decks
+    """
+    projection = deck_projections[profile]
+    cursor = db.decks.find(query, projection, sort=sort, skip=skip, limit=limit) if sort else \
+        db.decks.find(query, projection, skip=skip, limit=limit)
+    return [Deck().load(x) for x in cursor]
+
+
+def stream_decks(db: Database, query: dict, profile: DeckProfile, batch_size: int = 1000) -> Iterator[LeanDeck]:
+    """
+    Iterate over the decks matching a query as lean decks, fetching them from the database in batches.
+    This is meant for batch jobs that go over every deck: only one batch of documents is in memory at a time.
+    :param db: the database
+    :param query: the deck query
+    :param profile: the projection profile, see deck_projections, `full` is not supported
+    :param batch_size: the amount of decks in a batch
+    :return: the iterator of lean decks
+    """
+    projection = deck_projections[profile]
+    if projection is None:
+        raise InvalidArgumentError('Lean decks are never loaded with the full profile')
+    for x in db.decks.find(query, projection, batch_size=batch_size):
+        yield LeanDeck.from_document(x)
+
+
+def deck_page_info(deck_count: int, page: int) -> dict:
+    """
+    Get the paging fields of a paged deck list.
+    :param deck_count: the amount of decks matching the query
+    :param page: the current page, starting from 1
+    :return: the dictionary of paging fields, sent along with the decks
+    """
+    return {
+        'page_num': page,
+        'page_size': DECK_PAGE_SIZE,
+        'last_page': max(ceil(deck_count / DECK_PAGE_SIZE), 1)
+    }
+
+
+def load_cards_from_decks(dist: Distribution, decks: Iterable[Deck]) -> dict[str, Card]:
     db = connect(dist)
-    card_list = [x for y in decks for x in y.mainboard] + [x for y in decks for x in y.sideboard]
+    card_list = list({x for y in decks for x in chain(y.mainboard, y.sideboard)})
     return {x['name']: Card().load(x) for x in db.cards.find({'name': {'$in': card_list}})}
 
 
@@ -171,7 +269,7 @@ def load_multiple_decks(dist: Distribution, decks: list[Deck]) -> tuple[list[Loa
         ld.tags = [all_tags.get(x, default_tag) for x in deck.tags]
         ld.sorted_cards = sort_deck_cards(ld)
         ld.format = constants.FormatLocalization.get(deck.format, 'Unknown')
-        ld.date_str = arrow.get(deck.date).humanize()
+        ld.date_str = arrow.get(deck.date).humanize() if hasattr(deck, 'date') else '?'
         comp = all_competitions.get(deck.competition)
         if comp:
             ld.competition = comp
@@ -180,6 +278,21 @@ def load_multiple_decks(dist: Distribution, decks: list[Deck]) -> tuple[list[Loa
     return lds, card_defs
 
 
+def compact_deck_list(decks: list[LoadedDeck], popular_cards: list[PopularCardData]) -> dict:
+    """
+    Create the v2 payload of a deck list.
+    :param decks: the loaded decks
+    :param popular_cards: the popular cards of the decks
+    :return: the jsonified payload
+    """
+    payload = CompactPayload()
+    for x in decks:
+        x.compact(payload)
+    for y in popular_cards:
+        y.compact(payload)
+    return payload.jsonify()
+
+
 def load_deck_data(dist: Distribution, deck: Deck) -> LoadedDeck:
     return load_multiple_decks(dist, [deck])[0][0]
 
@@ -212,55 +325,139 @@ def get_main_card(dist: Distribution, deck: Deck, card_defs: dict[str, Card]) ->
     return max(imps)[1]
 
 
-def generate_popular_cards(dist: Distribution, cd: dict[str, Card], decks: list[LoadedDeck],
-                           threshold: int = 0) -> list[PopularCardData]:
-    constants = get_dist_constants(dist)
-    stuff = [(x, y) for z in decks for x, y in z.deck.mainboard.items() if x in cd] + \
-            [(x, constants.GetSideboardImportance(cd[x], y))
-             for z in decks for x, y in z.deck.sideboard.items() if x in cd]
+def popular_card_stats(decks: list[Deck], cd: dict[str, Card], sideboard_importance: Callable[[Card, int], int],
+                       threshold: int = 0) -> list[tuple[str, int, int, int]]:
+    """
+    Find the most popular nonland cards of a deck list.
+    :param decks: the decks to process
+    :param cd: the card dictionary, cards not in it are skipped
+    :param sideboard_importance: the weight of a sideboard card with a given count
+    :param threshold: the amount of cards to return (ties included), defaults to the amount of decks
+    :return: the list of (card_name, weight, wins, losses), sorted by weight
+    """
     popularity_counter: dict[str, int] = {}
-    for card_name, card_weight in stuff:
-        if cd[card_name].main_type != 'land':
-            popularity_counter[card_name] = popularity_counter.get(card_name, 0) + card_weight
+    wins_losses: dict[str, tuple[int, int]] = {}
+    for deck in decks:
+        for card_name, card_weight in deck.mainboard.items():
+            if card_name in cd and cd[card_name].main_type != 'land':
+                popularity_counter[card_name] = popularity_counter.get(card_name, 0) + card_weight
+        for card_name, card_count in deck.sideboard.items():
+            if card_name in cd and cd[card_name].main_type != 'land':
+                card_weight = sideboard_importance(cd[card_name], card_count)
+                popularity_counter[card_name] = popularity_counter.get(card_name, 0) + card_weight
+        # this is counterintuitive but when we generate the records, we're considering sideboard even
+        # if the card is not important in sideboard
+        for card_name in deck.mainboard.keys() | deck.sideboard.keys():
+            wl = wins_losses.get(card_name, (0, 0))
+            wins_losses[card_name] = (wl[0] + deck.wins, wl[1] + deck.losses)
+
+    return _top_popular_cards(popularity_counter, wins_losses, threshold or len(decks))
+
+
+def _top_popular_cards(popularity_counter: dict[str, int], wins_losses: dict[str, tuple[int, int]],
+                       threshold: int) -> list[tuple[str, int, int, int]]:
     all_cards = sorted([(y, x) for x, y in popularity_counter.items()], reverse=True)
     # now we limit all_cards so we never send more cards than there are decks, probably
     # well sometimes everyone will queue with a significantly different deck, so we might send slightly more
-    threshold = threshold or len(decks)
     if len(all_cards) > threshold:
         last_num_to_pick = all_cards[threshold - 1][0]
         all_cards = [(y, x) for y, x in all_cards if y >= last_num_to_pick]
-    # this is counterintuitive but when we generate the records, we're considering sideboard even
-    # if the card is not important in sideboard
+    return [(card_name, count, *wins_losses[card_name]) for count, card_name in all_cards]
+
+
+def _popular_card_pipeline(query: dict) -> list[dict[str, Any]]:
+    # one row per (card, mainboard count, sideboard count) with the amount of decks and their records,
+    # so the weights can be calculated with the distribution's sideboard importance
+    return [
+        {'$match': query},
+        {'$project': {'_id': 1, 'wins': 1, 'losses': 1, 'cards': {'$concatArrays': [
+            {'$map': {'input': {'$objectToArray': '$mainboard'},
+                      'in': {'name': '$$this.k', 'main': '$$this.v', 'side': 0}}},
+            {'$map': {'input': {'$objectToArray': '$sideboard'},
+                      'in': {'name': '$$this.k', 'main': 0, 'side': '$$this.v'}}}
+        ]}}},
+        {'$unwind': '$cards'},
+        {'$group': {'_id': {'deck': '$_id', 'name': '$cards.name'}, 'main': {'$sum': '$cards.main'},
+                    'side': {'$sum': '$cards.side'}, 'wins': {'$first': '$wins'}, 'losses': {'$first': '$losses'}}},
+        {'$group': {'_id': {'name': '$_id.name', 'main': '$main', 'side': '$side'}, 'decks': {'$sum': 1},
+                    'wins': {'$sum': '$wins'}, 'losses': {'$sum': '$losses'}}}
+    ]
+
+
+def aggregate_popular_cards(dist: Distribution, query: dict, threshold: int) -> list[PopularCardData]:
+    """
+    Find the most popular nonland cards of every deck matching a query, without loading the decks.
+    The results are the same as generate_popular_cards over the same decks.
+    :param dist: the distribution
+    :param query: the deck query
+    :param threshold: the amount of cards to return (ties included)
+    :return: the list of popular cards, sorted by weight
+    """
+    db = connect(dist)
+    constants = get_dist_constants(dist)
+    rows = list(db.decks.aggregate(_popular_card_pipeline(query), allowDiskUse=True))
+    card_names = list({x['_id']['name'] for x in rows})
+    cd = {x['name']: Card().load(x) for x in db.cards.find({'name': {'$in': card_names}})}
+
+    popularity_counter: dict[str, int] = {}
+    wins_losses: dict[str, tuple[int, int]] = {}
+    for row in rows:
+        card_name, main, side = row['_id']['name'], row['_id']['main'], row['_id']['side']
+        wl = wins_losses.get(card_name, (0, 0))
+        wins_losses[card_name] = (wl[0] + row['wins'], wl[1] + row['losses'])
+        if card_name not in cd or cd[card_name].main_type == 'land':
+            continue
+        card_weight = main + (constants.GetSideboardImportance(cd[card_name], side) if side else 0)
+        popularity_counter[card_name] = popularity_counter.get(card_name, 0) + card_weight * row['decks']
+
+    all_data = []
+    for card_name, count, wins, losses in _top_popular_cards(popularity_counter, wins_losses, threshold):
+        pcd = PopularCardData()
+        pcd.card = cd[card_name]
+        pcd.weight = count
+        pcd.wins = wins
+        pcd.losses = losses
+        all_data.append(pcd)
+    return all_data
+
+
+def generate_popular_cards(dist: Distribution, cd: dict[str, Card], decks: list[LoadedDeck],
+                           threshold: int = 0) -> list[PopularCardData]:
+    constants = get_dist_constants(dist)
     all_data = []
-    for count, card_name in all_cards:
+    stats = popular_card_stats([x.deck for x in decks], cd, constants.GetSideboardImportance, threshold)
+    for card_name, count, wins, losses in stats:
         pcd = PopularCardData()
         pcd.card = cd[card_name]
         pcd.weight = count
-        decks_with_this = [x for x in decks if card_name in x.deck.mainboard or card_name in x.deck.sideboard]
-        pcd.wins = sum([x.deck.wins for x in decks_with_this])
-        pcd.losses = sum([x.deck.losses for x in decks_with_this])
+        pcd.wins = wins
+        pcd.losses = losses
         all_data.append(pcd)
     return all_data
 
 
+def _finish_competition(dist: Distribution, lc: LoadedCompetition, main_card_name: str | None) -> None:
+    constants = get_dist_constants(dist)
+    lc.main_card = clean_name(main_card_name) if main_card_name else constants.DefaultCard
+    lc.format = constants.FormatLocalization.get(lc.competition.format, 'Unknown')
+    lc.date_str = arrow.get(lc.competition.date).humanize()
+
+
 def load_competition_single(
-    dist: Distribution, com: Competition, req_fields: set[str] | None = None
+    dist: Distribution, com: Competition, req_fields: set[str] | None = None, page: int = 1
 ) -> LoadedCompetition:
     req_fields = req_fields or set()
     db = connect(dist)  # this doesn't actually create any overhead because of db caching
     lc = LoadedCompetition()
     lc.competition = com
+    lc.page_num = page
 
+    q: dict[str, Any] = {'competition': com.competition_id}
+    lc.deck_count = db.decks.count_documents(q)
     if 'decks' in req_fields:
-        q: dict[str, Any] = {'competition': com.competition_id}
-        lc.deck_count = db.decks.count_documents(q)
-        if lc.deck_count > 250:
-            min_wins = 5 if lc.deck_count > 1000 else 4
-            q['wins'] = {'$gte': min_wins}
-            lc.partial_load = True
-        loaded_decks = [Deck().load(x) for x in db.decks.find(q)]
-        if 'cards' in req_fields:
-            lc.cards = load_cards_from_decks(dist, loaded_decks)
+        # only one page of decks is loaded, the statistics are aggregated over all of them
+        loaded_decks = find_decks(db, q, 'listing', sort=deck_page_sort, skip=(page - 1) * DECK_PAGE_SIZE,
+                                  limit=DECK_PAGE_SIZE)
         if 'users' in req_fields:
             user_list = [x.author for x in loaded_decks]
             lc.users = {x['user_id']: User().load(x) for x in db.users.find({'user_id': {'$in': user_list}})}
@@ -268,41 +465,199 @@ def load_competition_single(
             tag_list = [y for x in loaded_decks for y in x.tags]
             lc.tags = {x['tag_id']: DeckTag().load(x) for x in db.deck_tags.find({'tag_id': {'$in': tag_list}})}
         lc.decks = import_deck_data(dist, lc, loaded_decks)
-    else:
-        lc.deck_count = db.decks.count_documents({'competition': com.competition_id})
 
     main_card_obj = db.competition_popularities.find_one({'competition': com.competition_id, 'format': com.format},
                                                          sort=[('true_popularity', -1)])
+    _finish_competition(dist, lc, main_card_obj['card_name'] if main_card_obj else None)
+    if 'cards' in req_fields:
+        lc.popular_cards = aggregate_popular_cards(dist, q, lc.deck_count)
+        lc.cards = {x.card.name: x.card for x in lc.popular_cards}
+    return lc
 
-    constants = get_dist_constants(dist)
-    lc.main_card = clean_name(main_card_obj['card_name']) if main_card_obj else constants.DefaultCard
-    lc.format = constants.FormatLocalization.get(com.format, 'Unknown')
 
-    lc.popular_cards = generate_popular_cards(dist, lc.cards, lc.decks) if 'cards' in req_fields else []
-    lc.date_str = arrow.get(com.date).humanize()
-    return lc
+def load_competition_bundle(dist: Distribution, com: Competition, page: int = 1, compact: bool = False) -> dict | None:
+    """
+    Load the detail view of a competition from its stored summary, in the same format as LoadedCompetition.
+    :param dist: the distribution
+    :param com: the competition
+    :param page: the page of decks to load, starting from 1
+    :param compact: whether to use the v2 format (like jsonify_compact) instead of the v1 one (like jsonify)
+    :return: the jsonified competition, or None if the summary was not calculated yet
+    """
+    db = connect(dist)
+    summary_obj = db.competition_summaries.find_one({'competition': com.competition_id})
+    deck_slice = [(page - 1) * DECK_PAGE_SIZE, DECK_PAGE_SIZE]
+    bundle_obj = db.competition_bundles.find_one({'competition': com.competition_id}, {
+        '_id': 0, 'competition': 1, 'format': 1, 'users': 1, 'tags': 1, 'decks': {'$slice': deck_slice}})
+    if not summary_obj or not bundle_obj:
+        return None
+    cs = CompetitionSummary().load(summary_obj)
+    cb = CompetitionBundle().load(bundle_obj)
 
+    lc = LoadedCompetition()
+    lc.competition = com
+    lc.deck_count = cs.deck_count
+    lc.page_num = page
+    _finish_competition(dist, lc, cs.main_card)
+
+    users = dict(cb.users)
+    tags = dict(cb.tags)
+    if compact:
+        payload = CompactPayload()
+        default_tag_ref = (default_tag.tag_id, default_tag.name)
+        for x in cb.decks:
+            deck_tags = [(y, tags[y]) if y in tags else default_tag_ref for y in x['tags']] or [default_tag_ref]
+            payload.add_deck(x['deck_id'], x['name'], (x['wins'], x['losses'], x['ties']),
+                             x['color_data'], (x['format'], lc.format),
+                             (x['author'], users.get(x['author'], x['author'])), deck_tags, None)
+        for y in cs.popular_cards:
+            payload.add_popular_card((clean_name(y['card_name']), y['card_name']), y['weight'], y['wins'], y['losses'])
+        return {**payload.jsonify(), **lc.jsonify_header()}
+
+    default_tag_data = default_tag.save()
+    data = lc.jsonify()
+    data['decks'] = [{
+        'deck': x,
+        'card_defs': {},
+        'author': {'user_id': x['author'], 'nickname': users.get(x['author'], x['author'])},
+        'main_card': 'island',
+        'name': shorten_name(x['name']),
+        'date_str': '?',
+        'tags': [{'tag_id': y, 'name': tags[y]} if y in tags else default_tag_data
+                 for y in x['tags']] or [default_tag_data],
+        'format': lc.format,
+        'competition': False
+    } for x in cb.decks]
+    data['popular_cards'] = [{
+        'card': {'card_id': clean_name(x['card_name']), 'name': x['card_name']},
+        'weight': x['weight'],
+        'wins': x['wins'],
+        'losses': x['losses']
+    } for x in cs.popular_cards]
+    return data
+
+
+def load_competition_list(dist: Distribution, comps: list[Competition]) -> list[LoadedCompetition]:
+    """
+    Load the list view of multiple competitions (without decks).
+    Stored summaries are used where possible, the rest is loaded with two aggregations in total.
+    :param dist: the distribution
+    :param comps: the competitions to load, the order is preserved
+    :return: the loaded competitions
+    """
+    if not comps:
+        return []
 
-def load_competitions(dist: Distribution, q: dict, required_fields: set[str] | None = None) -> list[LoadedCompetition]:
     db = connect(dist)
-    comps = [Competition().load(x) for x in db.competitions.find(q)]
-    return [load_competition_single(dist, x, required_fields) for x in comps]
-
-
-def analyze(cards_to_load: list[tuple[str, Card, list[Deck]]], attr: str = 'mainboard') -> list[SingleCardAnalysis]:
-    analysises = []
-    for card_name, card_def, s_decks in sorted(cards_to_load, key=lambda u: -len(u[2])):
-        sca = SingleCardAnalysis()
-        sca.card_name = card_name
-        sca.card_data = card_def
-        sca.deck_count = len(s_decks)
-        sca.card_count = sum([getattr(x, attr).get(card_name, 0) for x in s_decks])
-        sca.average = round(sca.card_count / sca.deck_count, 2)
-        sca.wins = sum([x.wins for x in s_decks])
-        sca.losses = sum([x.losses for x in s_decks])
-        sca.winrate = round(sca.wins * 100 / max(1, sca.wins + sca.losses), 2)
-        analysises.append(sca)
-    return analysises
+    summaries = {x['competition']: x for x in db.competition_summaries.find(
+        {'competition': {'$in': [x.competition_id for x in comps]}},
+        {'_id': 0, 'competition': 1, 'deck_count': 1, 'main_card': 1})}
+    competition_ids = [x.competition_id for x in comps if x.competition_id not in summaries]
+    count_pipeline: list[dict[str, Any]] = [
+        {'$match': {'competition': {'$in': competition_ids}}},
+        {'$group': {'_id': '$competition', 'count': {'$sum': 1}}}
+    ]
+    deck_counts = {x['_id']: x['count'] for x in db.decks.aggregate(count_pipeline)} if competition_ids else {}
+
+    main_card_pipeline: list[dict[str, Any]] = [
+        {'$match': {'competition': {'$in': competition_ids}}},
+        {'$sort': {'true_popularity': -1}},
+        {'$group': {'_id': {'competition': '$competition', 'format': '$format'}, 'card_name': {'$first': '$card_name'}}}
+    ]
+    main_cards = {(x['_id']['competition'], x['_id']['format']): x['card_name']
+                  for x in db.competition_popularities.aggregate(main_card_pipeline)} if competition_ids else {}
+
+    loaded = []
+    for com in comps:
+        lc = LoadedCompetition()
+        lc.competition = com
+        if com.competition_id in summaries:
+            lc.deck_count = summaries[com.competition_id]['deck_count']
+            _finish_competition(dist, lc, summaries[com.competition_id]['main_card'])
+        else:
+            lc.deck_count = deck_counts.get(com.competition_id, 0)
+            _finish_competition(dist, lc, main_cards.get((com.competition_id, com.format)))
+        loaded.append(lc)
+    return loaded
+
+
+def load_competitions(dist: Distribution, q: dict, required_fields: set[str] | None = None,
+                      sort: list[tuple[str, int]] | None = None, skip: int = 0,
+                      limit: int = 0) -> list[LoadedCompetition]:
+    db = connect(dist)
+    cursor = db.competitions.find(q, sort=sort, skip=skip, limit=limit) if sort else \
+        db.competitions.find(q, skip=skip, limit=limit)
+    comps = [Competition().load(x) for x in cursor]
+    if required_fields and 'decks' in required_fields:
+        return [load_competition_single(dist, x, required_fields) for x in comps]
+    return load_competition_list(dist, comps)
+
+
+CardStats = list[int]  # [deck_count, card_count, wins, losses]
+
+
+def _make_card_analysis(card_name: str, card_def: Card, stats: CardStats) -> SingleCardAnalysis:
+    sca = SingleCardAnalysis()
+    sca.card_name = card_name
+    sca.card_data = card_def
+    sca.deck_count, sca.card_count, sca.wins, sca.losses = stats
+    sca.average = round(sca.card_count / sca.deck_count, 2)
+    sca.winrate = round(sca.wins * 100 / max(1, sca.wins + sca.losses), 2)
+    return sca
+
+
+def _make_type_analysis(type_name: str, cards: dict[str, Card], stats: dict[str, CardStats], min_decks: float,
+                        total_count: int, deck_count: int) -> SingleTypeAnalysis | None:
+    # cards are iterated in the order of the card dictionary, so ties in deck count keep that order
+    to_load = [(x, y, stats[x]) for x, y in cards.items() if x in stats and stats[x][0] >= min_decks]
+    if not to_load:
+        return None
+    sta = SingleTypeAnalysis()
+    sta.sca = [_make_card_analysis(*x) for x in sorted(to_load, key=lambda u: -u[2][0])]
+    sta.type = type_name
+    sta.average_count = round(total_count / deck_count, 2)
+    return sta
+
+
+def analyze_decks(decks: list[Deck], cards: dict[str, Card], threshold: float) -> list[SingleTypeAnalysis]:
+    """
+    Analyze the cards of a group of decks, split by card type and sideboard.
+    All statistics are collected in a single pass over the decks.
+    :param decks: the decks to analyze, should not be empty
+    :param cards: the card dictionary, cards not in it are skipped (but count towards the sideboard average)
+    :param threshold: the ratio of decks a card should be in to be included
+    :return: the analysis of each card type with at least one included card
+    """
+    main_stats: dict[str, CardStats] = {}
+    side_stats: dict[str, CardStats] = {}
+    side_count = 0
+    for deck in decks:
+        for zone, stats in ((deck.mainboard, main_stats), (deck.sideboard, side_stats)):
+            for card_name, card_count in zone.items():
+                if card_name not in stats:
+                    stats[card_name] = [1, card_count, deck.wins, deck.losses]
+                else:
+                    card_stats = stats[card_name]
+                    card_stats[0] += 1
+                    card_stats[1] += card_count
+                    card_stats[2] += deck.wins
+                    card_stats[3] += deck.losses
+        side_count += sum(deck.sideboard.values())
+
+    deck_count = len(decks)
+    min_decks = deck_count * threshold
+    analysis = []
+    for ct in chain(card_types[1:-1], ['land']):
+        type_cards = {x: y for x, y in cards.items() if y.main_type == ct}
+        type_count = sum([main_stats[x][1] for x in type_cards if x in main_stats])
+        sta = _make_type_analysis(ct.title(), type_cards, main_stats, min_decks, type_count, deck_count)
+        if sta:
+            analysis.append(sta)
+
+    sta = _make_type_analysis('Sideboard', cards, side_stats, min_decks, side_count, deck_count)
+    if sta:
+        analysis.append(sta)
+    return analysis
 
 
 def get_best_deck(decks: list[Deck], deck_weight: Callable[[Deck], float]) -> Deck:
@@ -318,38 +673,20 @@ def get_best_deck(decks: list[Deck], deck_weight: Callable[[Deck], float]) -> De
 
 def load_deck_analysis(dist: Distribution, decks: list[Deck], threshold: float = 0.2) -> DeckAnalysis:
     cards = load_cards_from_decks(dist, decks)
-    deck_count = len(decks)
 
     constants = get_dist_constants(dist)
     best_deck = get_best_deck(decks, constants.GetDeckWeight)
 
     da = DeckAnalysis()
     if best_deck and best_deck.deck_id:
-        da.example_deck = load_deck_data(dist, best_deck)
-        comp = connect(dist).competitions.find_one({'competition_id': best_deck.competition})
+        db = connect(dist)
+        # the analyzed decks can be partially loaded, so the example deck is loaded fully
+        full_deck = db.decks.find_one({'deck_id': best_deck.deck_id})
+        da.example_deck = load_deck_data(dist, Deck().load(full_deck) if full_deck else best_deck)
+        comp = db.competitions.find_one({'competition_id': best_deck.competition})
         if comp:
             da.example_comp = Competition().load(comp)
-    da.card_type_analysis = []
-    for ct in chain(card_types[1:-1], ['land']):
-        cards_dict = {x: (y, [z for z in decks if x in z.mainboard]) for x, y in cards.items() if y.main_type == ct}
-        count_of_this = sum([z.mainboard.get(x, 0) for z in decks for x, y in cards.items() if y.main_type == ct])
-        cards_to_load = [(x, y[0], y[1]) for x, y in cards_dict.items() if len(y[1]) >= deck_count * threshold]
-        if cards_to_load:
-            sta = SingleTypeAnalysis()
-            sta.sca = analyze(cards_to_load)
-            sta.type = ct.title()
-            sta.average_count = round(count_of_this / len(decks), 2)
-            da.card_type_analysis.append(sta)
-
-    sb_dict = {x: (y, [z for z in decks if x in z.sideboard]) for x, y in cards.items()}
-    sb_to_load = [(x, y[0], y[1]) for x, y in sb_dict.items() if len(y[1]) >= deck_count * threshold]
-    if sb_to_load:
-        count_of_this = sum([y for z in decks for y in z.sideboard.values()])
-        sta = SingleTypeAnalysis()
-        sta.sca = analyze(sb_to_load, 'sideboard')
-        sta.type = 'Sideboard'
-        sta.average_count = round(count_of_this / len(decks), 2)
-        da.card_type_analysis.append(sta)
+    da.card_type_analysis = analyze_decks(decks, cards, threshold)
 
     da.wins = sum([x.wins for x in decks])
     da.losses = sum([x.losses for x in decks])
@@ -0,0 +1,299 @@
+from typing import Callable
+
+import numpy as np
+import numpy.typing as npt
+
+from shared.types.card import Card
+from shared.types.deck import Deck
+
+IntArray = npt.NDArray[np.signedinteger]
+FloatArray = npt.NDArray[np.floating]
+BoolArray = npt.NDArray[np.bool_]
+# (group, card, sums, first entry) of each (group, card) pair with at least one entry, sums has one array per value
+GroupSums = tuple[IntArray, IntArray, list[FloatArray], IntArray]
+
+
+class DeckMatrix:
+    """
+    The mainboards of a list of decks as a sparse deck x card matrix, with per-deck metadata arrays.
+    Each deck is a row of the matrix (CSR layout). The entries of a row are stored in the order of the mainboard,
+    so the entry positions give the order in which a dict-based loop over the decks would see the cards.
+    Competitions, formats and tags are stored as indexes into the respective name lists, missing values are -1.
+    """
+
+    card_names: list[str]
+    format_names: list[str]
+    competition_names: list[str]
+    tag_names: list[str]
+
+    deck_ids: list[str]
+    deck_names: list[str]
+    wins: IntArray
+    losses: IntArray
+    formats: IntArray
+    competitions: IntArray
+    first_tags: IntArray
+
+    indptr: IntArray  # the entries of deck i are indptr[i]:indptr[i + 1]
+    cards: IntArray  # the card of each entry
+    counts: IntArray  # the amount of copies of each entry
+    entry_decks: IntArray  # the deck of each entry
+
+    tag_indptr: IntArray  # the tags of deck i are tag_codes[tag_indptr[i]:tag_indptr[i + 1]], without repeats
+    tag_codes: IntArray
+
+    @staticmethod
+    def build(decks: list[Deck]) -> 'DeckMatrix':
+        """
+        Create the matrix of a list of decks. This is the only part that loops over the decks in Python.
+        :param decks: the decks
+        :return: the matrix
+        """
+        card_index: dict[str, int] = {}
+        format_index: dict[str, int] = {}
+        competition_index: dict[str, int] = {}
+        tag_index: dict[str, int] = {}
+        cards: list[int] = []
+        counts: list[int] = []
+        row_lengths: list[int] = []
+        tag_codes: list[int] = []
+        tag_lengths: list[int] = []
+        competitions: list[int] = []
+        formats: list[int] = []
+        for d in decks:
+            for name, count in d.mainboard.items():
+                cards.append(card_index.setdefault(name, len(card_index)))
+                counts.append(count)
+            row_lengths.append(len(d.mainboard))
+            deck_tags = [tag_index.setdefault(x, len(tag_index)) for x in dict.fromkeys(d.tags)]
+            tag_codes += deck_tags
+            tag_lengths.append(len(deck_tags))
+            formats.append(format_index.setdefault(d.format, len(format_index)))
+            competitions.append(competition_index.setdefault(d.competition, len(competition_index))
+                                if d.competition else -1)
+
+        dm = DeckMatrix()
+        dm.card_names = list(card_index)
+        dm.format_names = list(format_index)
+        dm.competition_names = list(competition_index)
+        dm.tag_names = list(tag_index)
+        dm.deck_ids = [x.deck_id for x in decks]
+        dm.deck_names = [x.name for x in decks]
+        dm.wins = np.array([x.wins for x in decks], dtype=np.int64)
+        dm.losses = np.array([x.losses for x in decks], dtype=np.int64)
+        dm.formats = np.array(formats, dtype=np.int64)
+        dm.competitions = np.array(competitions, dtype=np.int64)
+        dm.cards = np.array(cards, dtype=np.int64)
+        dm.counts = np.array(counts, dtype=np.int64)
+        dm.indptr = _offsets(np.array(row_lengths, dtype=np.int64))
+        dm.entry_decks = np.repeat(np.arange(len(decks), dtype=np.int64), row_lengths)
+        dm.tag_codes = np.array(tag_codes, dtype=np.int64)
+        dm.tag_indptr = _offsets(np.array(tag_lengths, dtype=np.int64))
+        dm.first_tags = np.full(len(decks), -1, dtype=np.int64)
+        has_tags = np.array(tag_lengths, dtype=np.int64) > 0
+        dm.first_tags[has_tags] = dm.tag_codes[dm.tag_indptr[:-1][has_tags]]
+        return dm
+
+    @property
+    def deck_count(self) -> int:
+        return len(self.deck_ids)
+
+    @property
+    def card_count(self) -> int:
+        return len(self.card_names)
+
+    def subset(self, deck_mask: BoolArray) -> 'DeckMatrix':
+        """
+        Select some of the decks, keeping their order. The name lists are shared with this matrix.
+        :param deck_mask: the decks to keep
+        :return: the matrix of the selected decks
+        """
+        selected = np.flatnonzero(deck_mask)
+        entry_mask = deck_mask[self.entry_decks]
+        tag_mask = np.repeat(deck_mask, np.diff(self.tag_indptr))
+
+        dm = DeckMatrix()
+        dm.card_names = self.card_names
+        dm.format_names = self.format_names
+        dm.competition_names = self.competition_names
+        dm.tag_names = self.tag_names
+        dm.deck_ids = [self.deck_ids[x] for x in selected]
+        dm.deck_names = [self.deck_names[x] for x in selected]
+        dm.wins = self.wins[selected]
+        dm.losses = self.losses[selected]
+        dm.formats = self.formats[selected]
+        dm.competitions = self.competitions[selected]
+        dm.first_tags = self.first_tags[selected]
+        dm.cards = self.cards[entry_mask]
+        dm.counts = self.counts[entry_mask]
+        dm.indptr = _offsets(np.diff(self.indptr)[selected])
+        dm.entry_decks = np.repeat(np.arange(len(selected), dtype=np.int64), np.diff(dm.indptr))
+        dm.tag_codes = self.tag_codes[tag_mask]
+        dm.tag_indptr = _offsets(np.diff(self.tag_indptr)[selected])
+        return dm
+
+    def rows(self, start: int, stop: int) -> 'DeckMatrix':
+        """
+        Select a range of decks. This only slices the arrays, so it costs as much as the selected decks.
+        :param start: the first deck
+        :param stop: the deck after the last one
+        :return: the matrix of the selected decks
+        """
+        first, last = int(self.indptr[start]), int(self.indptr[stop])
+        first_tag, last_tag = int(self.tag_indptr[start]), int(self.tag_indptr[stop])
+
+        dm = DeckMatrix()
+        dm.card_names = self.card_names
+        dm.format_names = self.format_names
+        dm.competition_names = self.competition_names
+        dm.tag_names = self.tag_names
+        dm.deck_ids = self.deck_ids[start:stop]
+        dm.deck_names = self.deck_names[start:stop]
+        dm.wins = self.wins[start:stop]
+        dm.losses = self.losses[start:stop]
+        dm.formats = self.formats[start:stop]
+        dm.competitions = self.competitions[start:stop]
+        dm.first_tags = self.first_tags[start:stop]
+        dm.cards = self.cards[first:last]
+        dm.counts = self.counts[first:last]
+        dm.indptr = self.indptr[start:stop + 1] - first
+        dm.entry_decks = self.entry_decks[first:last] - start
+        dm.tag_codes = self.tag_codes[first_tag:last_tag]
+        dm.tag_indptr = self.tag_indptr[start:stop + 1] - first_tag
+        return dm
+
+    def split_by_format(self) -> dict[str, 'DeckMatrix']:
+        """
+        Split the matrix into a matrix for each format, keeping the order of the decks inside of each format.
+        The decks are reordered once, after that each format is a range of rows.
+        :return: the matrix of each format that has decks
+        """
+        order = np.argsort(self.formats, kind='stable')
+        lengths = np.diff(self.indptr)[order]
+        tag_lengths = np.diff(self.tag_indptr)[order]
+        entries = _gather(self.indptr, order, lengths)
+        tag_entries = _gather(self.tag_indptr, order, tag_lengths)
+
+        dm = DeckMatrix()
+        dm.card_names = self.card_names
+        dm.format_names = self.format_names
+        dm.competition_names = self.competition_names
+        dm.tag_names = self.tag_names
+        dm.deck_ids = [self.deck_ids[x] for x in order]
+        dm.deck_names = [self.deck_names[x] for x in order]
+        dm.wins = self.wins[order]
+        dm.losses = self.losses[order]
+        dm.formats = self.formats[order]
+        dm.competitions = self.competitions[order]
+        dm.first_tags = self.first_tags[order]
+        dm.cards = self.cards[entries]
+        dm.counts = self.counts[entries]
+        dm.indptr = _offsets(lengths)
+        dm.entry_decks = np.repeat(np.arange(len(order), dtype=np.int64), lengths)
+        dm.tag_codes = self.tag_codes[tag_entries]
+        dm.tag_indptr = _offsets(tag_lengths)
+
+        bounds = np.searchsorted(dm.formats, np.arange(len(self.format_names) + 1))
+        return {x: dm.rows(int(bounds[i]), int(bounds[i + 1]))
+                for i, x in enumerate(self.format_names) if bounds[i] < bounds[i + 1]}
+
+    def in_format(self, fmt: str) -> BoolArray:
+        """
+        Get the decks of a format.
+        :param fmt: the format, `_all` selects every deck
+        :return: the deck mask
+        """
+        if fmt == '_all':
+            return np.ones(self.deck_count, dtype=np.bool_)
+        if fmt not in self.format_names:
+            return np.zeros(self.deck_count, dtype=np.bool_)
+        return self.formats == self.format_names.index(fmt)
+
+    def card_mask(self, cards: dict[str, Card], predicate: Callable[[Card], bool] = lambda c: True) -> BoolArray:
+        """
+        Get the cards of the matrix that are in a card dictionary and match a predicate.
+        :param cards: the card dictionary
+        :param predicate: the condition to check
+        :return: the card mask
+        """
+        return np.array([x in cards and predicate(cards[x]) for x in self.card_names], dtype=np.bool_)
+
+    def group_sums(self, groups: IntArray, values: list[npt.NDArray], entry_mask: BoolArray) -> GroupSums:
+        """
+        Sum per-entry values over each (group, card) pair.
+        :param groups: the group of each entry, -1 means no group
+        :param values: the arrays of values to sum, with a value for each entry
+        :param entry_mask: the entries to include
+        :return: the group, card, sums and first entry position of each pair, sorted by group and card
+        """
+        entries = np.flatnonzero(entry_mask & (groups >= 0))
+        return self._sum_entries(groups[entries], entries, values)
+
+    def card_totals(self, values: list[npt.NDArray], entry_mask: BoolArray) -> GroupSums:
+        """
+        Sum per-entry values over each card, like group_sums with a single group (0).
+        """
+        return self.group_sums(np.zeros(len(self.cards), dtype=np.int64), values, entry_mask)
+
+    def sum_by_competition(self, values: list[npt.NDArray], entry_mask: BoolArray) -> GroupSums:
+        return self.group_sums(self.competitions[self.entry_decks], values, entry_mask)
+
+    def sum_by_format(self, values: list[npt.NDArray], entry_mask: BoolArray) -> GroupSums:
+        return self.group_sums(self.formats[self.entry_decks], values, entry_mask)
+
+    def sum_by_tag(self, values: list[npt.NDArray], entry_mask: BoolArray) -> GroupSums:
+        """
+        Sum per-entry values over each (tag, card) pair. A deck with multiple tags counts for each of them.
+        :param values: the arrays of values to sum, with a value for each entry
+        :param entry_mask: the entries to include
+        :return: the tag, card, sums and first entry position of each pair, sorted by tag and card
+        """
+        tag_lengths = np.diff(self.tag_indptr)[self.entry_decks]
+        repeated = np.repeat(np.arange(len(self.cards), dtype=np.int64), tag_lengths)
+        offsets = np.arange(len(repeated), dtype=np.int64) - np.repeat(_offsets(tag_lengths)[:-1], tag_lengths)
+        tags = self.tag_codes[self.tag_indptr[self.entry_decks[repeated]] + offsets]
+        mask = entry_mask[repeated]
+        return self._sum_entries(tags[mask], repeated[mask], values)
+
+    def _sum_entries(self, groups: IntArray, entries: IntArray, values: list[npt.NDArray]) -> GroupSums:
+        keys = groups * self.card_count + self.cards[entries]
+        key_space = (int(groups.max()) + 1) * self.card_count if len(groups) else 0
+        if key_space <= 4 * len(keys):
+            # the keys are dense enough to count them directly, which avoids sorting the entries
+            first_entries = np.full(key_space, len(self.cards), dtype=np.int64)
+            np.minimum.at(first_entries, keys, entries)
+            unique_keys = np.flatnonzero(first_entries < len(self.cards))
+            sums = [np.bincount(keys, weights=x[entries], minlength=key_space)[unique_keys].astype(np.float64)
+                    for x in values]
+            return unique_keys // self.card_count, unique_keys % self.card_count, sums, first_entries[unique_keys]
+
+        unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        sums = [np.bincount(inverse, weights=x[entries], minlength=len(unique_keys)).astype(np.float64) for x in values]
+        return unique_keys // self.card_count, unique_keys % self.card_count, sums, entries[first]
+
+    def deck_group_sums(self, groups: IntArray, values: list[npt.NDArray], deck_mask: BoolArray) -> \
+            tuple[IntArray, list[FloatArray], IntArray, IntArray]:
+        """
+        Sum per-deck values over each group of decks.
+        :param groups: the group of each deck, -1 means no group
+        :param values: the arrays of values to sum, with a value for each deck
+        :param deck_mask: the decks to include
+        :return: the group, sums, deck count and first deck position of each group, sorted by group
+        """
+        decks = np.flatnonzero(deck_mask & (groups >= 0))
+        unique_groups, first, inverse, deck_counts = np.unique(groups[decks], return_index=True, return_inverse=True,
+                                                               return_counts=True)
+        inverse = inverse.reshape(-1)
+        sums = [np.bincount(inverse, weights=x[decks], minlength=len(unique_groups)).astype(np.float64) for x in values]
+        return unique_groups, sums, deck_counts, decks[first]
+
+
+def _offsets(lengths: IntArray) -> IntArray:
+    return np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(lengths, dtype=np.int64)])
+
+
+def _gather(indptr: IntArray, rows: IntArray, lengths: IntArray) -> IntArray:
+    # the positions of the entries of the given rows, row after row
+    starts = np.repeat(indptr[:-1][rows], lengths)
+    return starts + np.arange(len(starts), dtype=np.int64) - np.repeat(_offsets(lengths)[:-1], lengths)
@@ -0,0 +1,95 @@
+import hashlib
+import json
+from collections import OrderedDict
+from threading import Lock
+from typing import Hashable, cast
+
+from shared.core_enums import Distribution
+from shared.helpers.database import connect, get_card_generation
+from shared.helpers.deckcheck.core import DeckChecker, DeckCheckResult, deck_check
+from shared.helpers.deckcheck.karsten import karsten_dict
+from shared.helpers.deckcheck.legality import IndexedCards, get_legality_index
+from shared.types.deck import Deck
+
+CHECK_CACHE_SIZE = 4096
+
+
+def deck_content_hash(d: Deck) -> str:
+    """
+    Hash the content of a deck: the format, the mainboard and the sideboard, regardless of the order of the cards.
+    :param d: the deck
+    :return: the hash
+    """
+    content = [d.format, sorted(d.mainboard.items()), sorted(d.sideboard.items())]
+    return hashlib.sha256(json.dumps(content, separators=(',', ':')).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    A bounded cache of deck check results that drops the least recently used results. It can be used from several
+    threads. The results must not be modified by the callers.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.results: OrderedDict[Hashable, DeckCheckResult] = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> DeckCheckResult | None:
+        with self.lock:
+            result = self.results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.results.move_to_end(key)
+            return result
+
+    def put(self, key: Hashable, result: DeckCheckResult) -> None:
+        with self.lock:
+            self.results[key] = result
+            self.results.move_to_end(key)
+            while len(self.results) > self.size:
+                self.results.popitem(last=False)
+
+
+check_cache = ResultCache(CHECK_CACHE_SIZE)
+
+
+def cached_deck_checks(dist: Distribution, decks: list[Deck], checkers: list[DeckChecker]) -> list[DeckCheckResult]:
+    """
+    Check decks, reusing the results for the decks with the same content that were checked with the same card data.
+    The decks that were not checked yet are checked against the legality index of the distribution.
+    :param dist: the distribution
+    :param decks: the decks
+    :param checkers: the deck checkers of the distribution
+    :return: the result of each deck, see deck_check
+    """
+    index = get_legality_index(dist)
+    keys = [(dist, 'check', index.generation, deck_content_hash(x)) for x in decks]
+    results = [check_cache.get(x) for x in keys]
+    missing = [i for i, x in enumerate(results) if x is None]
+    if missing:
+        cards = IndexedCards(dist, index, [decks[i] for i in missing])
+        for i in missing:
+            result = deck_check(dist, decks[i], checkers, cards)
+            check_cache.put(keys[i], result)
+            results[i] = result
+    return cast(list[DeckCheckResult], results)
+
+
+def cached_karsten(dist: Distribution, d: Deck) -> DeckCheckResult:
+    """
+    Check the mana sources of a deck, reusing the result for a deck with the same content and the same card data.
+    :param dist: the distribution
+    :param d: the deck
+    :return: the result, see karsten_dict
+    """
+    key = (dist, 'karsten', get_card_generation(connect(dist)), deck_content_hash(d))
+    result = check_cache.get(key)
+    if result is None:
+        result = karsten_dict(dist, d)
+        check_cache.put(key, result)
+    return result
@@ -1,21 +1,23 @@
 from typing import Callable, Literal, get_args
 
 from shared.core_enums import Distribution
-from shared.helpers.db_loader import load_cards_from_decks
-from shared.types.card import Card
+from shared.helpers.deckcheck.legality import IndexedCards, get_legality_index
 from shared.types.deck import Deck
 
 DeckCheckStatus = Literal['Success!', 'Warnings found!', 'Errors found!']
 deck_check_statuses: tuple[DeckCheckStatus, ...] = get_args(DeckCheckStatus)
+DeckChecker = Callable[[Deck, IndexedCards], tuple[DeckCheckStatus, str]]
+# (status, errors, warnings, messages)
+DeckCheckResult = tuple[DeckCheckStatus, list[str], list[str], list[str]]
 
 
-def deck_check(dist: Distribution, d: Deck,
-               checkers: list[Callable[[Deck, dict[str, Card]], tuple[DeckCheckStatus, str]]]) -> \
-        tuple[DeckCheckStatus, list[str], list[str], list[str]]:
+def deck_check(dist: Distribution, d: Deck, checkers: list[DeckChecker],
+               cards: IndexedCards | None = None) -> DeckCheckResult:
     errors = []
     warnings = []
     messages = []
-    cards = load_cards_from_decks(dist, [d])
+    if cards is None:
+        cards = IndexedCards(dist, get_legality_index(dist), [d])
 
     for x in checkers:
         status, response = x(d, cards)
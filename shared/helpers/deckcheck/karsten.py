@@ -1,9 +1,11 @@
+from itertools import chain
 from math import ceil
-from typing import cast
+from threading import Lock
+from typing import Iterable, cast
 
 from shared.card_enums import ManaSymbol
 from shared.core_enums import Distribution
-from shared.helpers.db_loader import load_cards_from_decks
+from shared.helpers.database import connect, get_card_generation
 from shared.helpers.deckcheck.core import DeckCheckStatus, deck_check_statuses
 from shared.helpers.magic import process_mana_cost_text
 from shared.types.card import Card
@@ -40,18 +42,106 @@ def requires_colors(c: Card | None, color_combo: ManaSymbol, num: int) -> bool:
     return False
 
 
-def get_ij_producers(d: Deck, all_cards: dict[str, Card], color_combo: str, num: int) -> int:
-    cc_split = color_combo.split('/')
-    cards = [(x, z) for x, z in d.mainboard.items() if all_cards[x].mana_value <= 3 and
-             [y for y in cc_split if y in all_cards[x].produces]]
-    # this is all cool but we don't want to count e.g. Birds of Paradise for itself or other G cards.
-    # but we do want to count it for cards that cost GG, for example
-    colors = color_combo.split('/')
-    symbol_counts = [sum([y for x, y in all_cards[i].mana_cost.items() if x in colors]) for i, _ in cards]
-    cards = [u for u, v in zip(cards, symbol_counts) if v < num]
-    creatures = sum([z for x, z in cards if 'Creature' in all_cards[x].types])
-    noncreatures = sum([z for x, z in cards if 'Creature' not in all_cards[x].types])
-    return ceil(creatures / 2 + noncreatures)
+karsten_colors: list[ManaSymbol] = ['white', 'blue', 'black', 'red', 'green', 'colorless', 'snow']
+karsten_color_combos: list[ManaSymbol] = ['white/blue', 'blue/black', 'black/red', 'red/green', 'green/white',
+                                          'white/black', 'blue/red', 'black/green', 'red/white', 'green/blue']
+karsten_combos = karsten_colors + karsten_color_combos
+
+
+class KarstenProfile:
+    """
+    Everything the Karsten check needs to know about a card.
+    For every color combination the card requires or produces, the profile has a bitmask of the symbol counts (bit 0
+    for 1 symbol, up to bit 2 for 3 symbols) the card requires, and a bitmask of the symbol counts the card is a
+    source for. A card is a source if it costs 3 or less, produces a color of the combination and costs less symbols
+    of the combination, so that Birds of Paradise counts for GG cards but not for itself or other G cards.
+    """
+
+    def __init__(self, c: Card) -> None:
+        self.cost_index = min(c.mana_value, 6) - 1
+        self.creature = 'Creature' in c.types
+        # (index in karsten_combos, required symbol counts, source symbol counts)
+        self.combos: list[tuple[int, int, int]] = []
+        for i, combo in enumerate(karsten_combos):
+            colors = combo.split('/')
+            required = sum(1 << j for j in range(3) if requires_colors(c, combo, j + 1))
+            sources = 0
+            if c.mana_value <= 3 and [x for x in colors if x in c.produces]:
+                symbols = sum([y for x, y in c.mana_cost.items() if x in colors])
+                sources = sum(1 << j for j in range(3) if symbols < j + 1)
+            if required or sources:
+                self.combos.append((i, required, sources))
+
+
+_profiles: dict[Distribution, tuple[int, dict[str, KarstenProfile | None]]] = {}
+_profile_lock = Lock()
+
+
+def get_karsten_profiles(dist: Distribution, names: Iterable[str]) -> dict[str, KarstenProfile]:
+    """
+    Get the Karsten profiles of some cards. The profiles are kept until the generation of the card data changes, so
+    only the cards that were not checked since the last scrape are loaded.
+    :param dist: the distribution
+    :param names: the names of the cards
+    :return: the profiles of the known cards
+    """
+    db = connect(dist)
+    generation = get_card_generation(db)
+    with _profile_lock:
+        cached = _profiles.get(dist)
+        if cached is None or cached[0] != generation:
+            cached = (generation, {})
+            _profiles[dist] = cached
+    profiles = cached[1]
+    names = set(names)
+    missing = [x for x in names if x not in profiles]
+    if missing:
+        loaded = {x['name']: KarstenProfile(Card().load(x)) for x in db.cards.find({'name': {'$in': missing}})}
+        profiles.update({x: loaded.get(x) for x in missing})
+    return {x: y for x in names if (y := profiles[x]) is not None}
+
+
+def karsten_requirements(d: Deck, profiles: dict[str, KarstenProfile]) -> list[tuple[str, str, int, int]]:
+    """
+    Check the mana sources of a deck in a single pass over the deck, see check_karsten.
+    Unknown cards are ignored.
+    :param d: the deck to process
+    :param profiles: the Karsten profiles of the cards of the deck
+    :return: a list of checking results, see check_karsten
+    """
+    # per color combination and symbol count: the cards that require it and the sources as (creatures, others)
+    requirements: list[list[list[tuple[str, KarstenProfile]]]] = [[[], [], []] for _ in karsten_combos]
+    sources = [[[0, 0], [0, 0], [0, 0]] for _ in karsten_combos]
+    for name, count in d.mainboard.items():
+        p = profiles.get(name)
+        if p is None:
+            continue
+        for i, required, source in p.combos:
+            for j in range(3):
+                if required >> j & 1:
+                    requirements[i][j].append((name, p))
+                if source >> j & 1:
+                    sources[i][j][0 if p.creature else 1] += count
+    for name in d.sideboard:
+        p = profiles.get(name)
+        if p is None or name in d.mainboard:
+            continue
+        for i, required, _ in p.combos:
+            for j in range(3):
+                if required >> j & 1:
+                    requirements[i][j].append((f'{name} (Sideboard)', p))
+
+    answer: list[tuple[str, str, int, int]] = []
+    multiplier = max(1.0, (sum(d.mainboard.values()) / 60) ** 1.2)
+    for i, combo in enumerate(karsten_combos):
+        for j in range(3):
+            if not requirements[i][j]:
+                continue
+            creatures, others = sources[i][j]
+            prod_number = ceil(creatures / 2 + others)
+            for name, p in requirements[i][j]:
+                answer.append((name, combo, round(all_costs[j][p.cost_index] * multiplier), prod_number))
+    return answer
 
 
 def check_karsten(dist: Distribution, d: Deck) -> list[tuple[str, str, int, int]]:
@@ -63,25 +153,7 @@ def check_karsten(dist: Distribution, d: Deck) -> list[tuple[str, str, int, int]
     :return: a list of checking results. Consists of tuples in the form of
     (card_name, mana_symbol, required_sources, given_sources).
     """
-    all_cards = load_cards_from_decks(dist, [d])
-    colors: list[ManaSymbol] = ['white', 'blue', 'black', 'red', 'green', 'colorless', 'snow']
-    color_combos: list[ManaSymbol] = ['white/blue', 'blue/black', 'black/red', 'red/green', 'green/white',
-                                      'white/black', 'blue/red', 'black/green', 'red/white', 'green/blue']
-    answer: list[tuple[str, str, int, int]] = []
-    multiplier = max(1.0, (sum(d.mainboard.values()) / 60) ** 1.2)
-    for i in colors + color_combos:
-        for j in range(3):
-            requirement_cards = [x for x in d.mainboard if requires_colors(all_cards.get(x), i, j + 1)] + \
-                                [f'{x} (Sideboard)' for x in d.sideboard if x not in d.mainboard and
-                                 requires_colors(all_cards.get(x), i, j + 1)]
-            if not requirement_cards:
-                continue
-            # we need this to be different, in case G card produces G and we have GG, so now we need 16 instead of 20
-            prod_number = get_ij_producers(d, all_cards, i, j + 1)
-            for k in requirement_cards:
-                mana_value = min(all_cards[k.split(' (')[0]].mana_value, 6) - 1
-                answer.append((k, i, round(all_costs[j][mana_value] * multiplier), prod_number))
-    return answer
+    return karsten_requirements(d, get_karsten_profiles(dist, chain(d.mainboard, d.sideboard)))
 
 
 def stringify(u: tuple[str, str, int, int]) -> str:
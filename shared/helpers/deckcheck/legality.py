@@ -0,0 +1,200 @@
+import logging
+from itertools import chain
+from threading import Lock
+from typing import Iterable, Iterator, Mapping
+
+import numpy as np
+import numpy.typing as npt
+from pymongo.database import Database
+
+from shared.card_enums import Color
+from shared.core_enums import Distribution
+from shared.helpers.database import connect, get_card_generation
+from shared.types.card import Card
+from shared.types.deck import Deck
+
+logger = logging.getLogger('dreadrise.deckcheck.legality')
+
+# the code 0 means that the card has no legality in the format
+legality_codes: tuple[str, ...] = ('', 'legal', 'restricted', 'banned', 'not_legal')
+_legality_code_index = {x: i for i, x in enumerate(legality_codes)}
+
+_index_projection = {'_id': 0, 'name': 1, 'legality': 1, 'categories': 1, 'max_count': 1, 'types': 1, 'colors': 1}
+
+
+class LegalityIndex:
+    """
+    The card data used by the deck checks, stored by card ID instead of by card document.
+    Every card name gets a small integer ID. Each format has an array with the legality code of every card, and each
+    category has an array with a flag for every card, so these checks are array lookups.
+    The index is built for a generation of the card data and must be rebuilt when the cards are scraped again.
+    """
+
+    generation: int
+    names: list[str]
+    ids: dict[str, int]
+    legality: dict[str, npt.NDArray[np.int8]]
+    categories: dict[str, npt.NDArray[np.bool_]]
+    max_count: npt.NDArray[np.int16]
+    types: list[str]
+    colors: list[frozenset[Color]]
+
+    @staticmethod
+    def build(cards: Iterable[dict], generation: int = 0) -> 'LegalityIndex':
+        """
+        Create the index from card documents.
+        :param cards: the card documents, only the fields of the index are needed
+        :param generation: the generation of the card data
+        :return: the index
+        """
+        names: list[str] = []
+        max_count: list[int] = []
+        types: list[str] = []
+        colors: list[frozenset[Color]] = []
+        color_sets: dict[frozenset[Color], frozenset[Color]] = {}
+        legality: dict[str, list[tuple[int, int]]] = {}
+        categories: dict[str, list[int]] = {}
+        unknown: set[str] = set()
+        for c in cards:
+            card_id = len(names)
+            names.append(c['name'])
+            max_count.append(c.get('max_count', 4))
+            types.append(c.get('types', ''))
+            card_colors = frozenset(c.get('colors', []))
+            colors.append(color_sets.setdefault(card_colors, card_colors))
+            for fmt, value in c.get('legality', {}).items():
+                code = _legality_code_index.get(value)
+                if code is None:
+                    unknown.add(value)
+                    code = 0
+                legality.setdefault(fmt, []).append((card_id, code))
+            for category in set(c.get('categories', [])):
+                categories.setdefault(category, []).append(card_id)
+        if unknown:
+            logger.warning(f'Unknown legalities, treated as missing: {", ".join(sorted(unknown))}')
+
+        li = LegalityIndex()
+        li.generation = generation
+        li.names = names
+        li.ids = {x: i for i, x in enumerate(names)}
+        li.max_count = np.array(max_count, dtype=np.int16)
+        li.types = types
+        li.colors = colors
+        li.legality = {}
+        for fmt, entries in legality.items():
+            codes = np.zeros(len(names), dtype=np.int8)
+            card_ids, values = zip(*entries)
+            codes[list(card_ids)] = values
+            li.legality[fmt] = codes
+        li.categories = {}
+        for category, members in categories.items():
+            flags = np.zeros(len(names), dtype=np.bool_)
+            flags[members] = True
+            li.categories[category] = flags
+        return li
+
+    @staticmethod
+    def load(db: Database, generation: int = 0) -> 'LegalityIndex':
+        """
+        Create the index from the cards of a database.
+        :param db: the database
+        :param generation: the generation of the card data
+        :return: the index
+        """
+        li = LegalityIndex.build(db.cards.find({}, _index_projection), generation)
+        logger.info(f'Legality index built, {len(li.names)} cards, {len(li.legality)} formats, '
+                    f'{len(li.categories)} categories')
+        return li
+
+    def get_legality(self, name: str, fmt: str) -> str:
+        """
+        Get the legality of a card in a format.
+        :param name: the name of the card
+        :param fmt: the format
+        :return: the legality, an empty string if the card or the format is unknown
+        """
+        card_id = self.ids.get(name)
+        codes = self.legality.get(fmt)
+        if card_id is None or codes is None:
+            return ''
+        return legality_codes[codes[card_id]]
+
+    def in_category(self, name: str, category: str) -> bool:
+        card_id = self.ids.get(name)
+        flags = self.categories.get(category)
+        return card_id is not None and flags is not None and bool(flags[card_id])
+
+
+_indexes: dict[Distribution, LegalityIndex] = {}
+_index_lock = Lock()
+
+
+def get_legality_index(dist: Distribution) -> LegalityIndex:
+    """
+    Get the legality index of a distribution. It is built on first use and rebuilt when the generation of the card data
+    changes, that is, after the cards are scraped.
+    :param dist: the distribution
+    :return: the index
+    """
+    db = connect(dist)
+    generation = get_card_generation(db)
+    with _index_lock:
+        index = _indexes.get(dist)
+        if index is None or index.generation != generation:
+            index = LegalityIndex.load(db, generation)
+            _indexes[dist] = index
+        return index
+
+
+class IndexedCards(Mapping[str, Card]):
+    """
+    The cards of some decks as seen by the deck checkers.
+    The fields of the legality index are read from the index. Looking up a card loads the full card documents of all
+    decks with a single query, which is only needed for the fields the index does not have.
+    """
+
+    def __init__(self, dist: Distribution, index: LegalityIndex, decks: Iterable[Deck]) -> None:
+        self.dist = dist
+        self.index = index
+        self.names = {x: None for x in chain.from_iterable(chain(y.mainboard, y.sideboard) for y in decks)
+                      if x in index.ids}
+        self.cards: dict[str, Card] | None = None
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.names
+
+    def __getitem__(self, name: str) -> Card:
+        if name not in self.names:
+            raise KeyError(name)
+        if self.cards is None:
+            db = connect(self.dist)
+            self.cards = {x['name']: Card().load(x) for x in db.cards.find({'name': {'$in': list(self.names)}})}
+        return self.cards[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def legality(self, name: str, fmt: str) -> str:
+        return self.index.get_legality(name, fmt)
+
+    def in_category(self, name: str, category: str) -> bool:
+        return self.index.in_category(name, category)
+
+    def max_count(self, name: str) -> int:
+        return int(self.index.max_count[self.index.ids[name]])
+
+    def types(self, name: str) -> str:
+        """
+        Get the type line of a card.
+        :param name: the name of the card
+        :return: the type line, an empty string if the card is unknown
+        """
+        card_id = self.index.ids.get(name)
+        return '' if card_id is None else self.index.types[card_id]
+
+    def colors(self, name: str) -> frozenset[Color]:
+        card_id = self.index.ids.get(name)
+        return frozenset() if card_id is None else self.index.colors[card_id]
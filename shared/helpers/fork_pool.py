@@ -0,0 +1,62 @@
+import multiprocessing
+from multiprocessing.pool import AsyncResult, Pool
+from typing import Any, Callable, Generic, Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+_task: Callable[[Any], Any] | None = None
+
+
+def _run_task(argument: Any) -> Any:
+    assert _task is not None
+    return _task(argument)
+
+
+class ForkPool(Generic[T, R]):
+    """
+    A pool of worker processes that run a single task.
+    The workers are forked after the data used by the task is loaded, so they share it copy-on-write and the task is
+    not pickled. Only the arguments and the results are sent between the processes.
+    The forked workers find the task in a module variable, so only one pool can be open at a time.
+    Use it as a context manager, the workers are stopped when it exits.
+    """
+
+    def __init__(self, task: Callable[[T], R], workers: int) -> None:
+        self.task = task
+        self.workers = workers
+        self.pool: Pool | None = None
+
+    def __enter__(self) -> 'ForkPool[T, R]':
+        global _task
+        _task = self.task
+        try:
+            self.pool = multiprocessing.get_context('fork').Pool(self.workers)
+        except BaseException:
+            _task = None
+            raise
+        return self
+
+    def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        global _task
+        assert self.pool is not None
+        self.pool.terminate()
+        self.pool = None
+        _task = None
+
+    def apply_async(self, argument: T) -> 'AsyncResult[R]':
+        """
+        Run the task in a worker.
+        :param argument: the argument of the task
+        :return: the pending result
+        """
+        assert self.pool is not None
+        return self.pool.apply_async(_run_task, (argument,))
+
+    def imap_unordered(self, arguments: Iterable[T]) -> Iterator[R]:
+        """
+        Run the task for every argument in the workers.
+        :param arguments: the arguments of the task
+        :return: the results, in the order in which they are done
+        """
+        assert self.pool is not None
+        return self.pool.imap_unordered(_run_task, arguments)
@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import resource
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Iterable, Iterator, TypeVar, cast
+
+from pymongo.database import Database
+from pymongo.errors import PyMongoError
+
+from shared.helpers import configuration
+
+logger = logging.getLogger('dreadrise.jobs')
+
+T = TypeVar('T')
+_end = object()
+
+
+def _cpu_time() -> float:
+    # includes the finished worker processes
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _peak_rss() -> float:
+    # ru_maxrss is in KiB on Linux
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+
+
+class PhaseReport:
+    """
+    The measurements of a single phase of a job.
+    The peak RSS is the peak of the process up to the end of the phase, since the OS only tracks the overall peak.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_rss = 0.0
+        self.documents = 0
+
+    def count(self, documents: int) -> None:
+        self.documents += documents
+
+    def save(self) -> dict[str, Any]:
+        return {
+            'name': self.name,
+            'wall_time': round(self.wall_time, 3),
+            'cpu_time': round(self.cpu_time, 3),
+            'peak_rss_mb': round(self.peak_rss, 1),
+            'documents': self.documents
+        }
+
+
+class JobReport:
+    """
+    Records the phases of a batch job.
+    When the job ends, the report is logged, written as JSON into the job_report_dir directory (unless it is empty)
+    and inserted into the job_runs collection.
+    Usage:
+        with JobReport('popularities', client) as report:
+            with report.phase('load') as p:
+                p.count(len(decks))
+    """
+
+    def __init__(self, job: str, client: Database | None, **parameters: Any) -> None:
+        self.job = job
+        self.client = client
+        self.parameters = parameters
+        self.phases: list[PhaseReport] = []
+        self.start = datetime.utcnow()
+        self.start_time = time.perf_counter()
+        self.start_cpu = _cpu_time()
+        self.status = 'running'
+
+    def __enter__(self) -> 'JobReport':
+        return self
+
+    def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        self.finish('success' if exc_type is None else 'failed')
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[PhaseReport]:
+        """
+        Measure a phase of the job. Measuring a phase again adds to its previous measurements.
+        :param name: the name of the phase
+        :return: the phase report, which can count the processed documents
+        """
+        p = next((x for x in self.phases if x.name == name), None)
+        if p is None:
+            p = PhaseReport(name)
+            self.phases.append(p)
+        start_time = time.perf_counter()
+        start_cpu = _cpu_time()
+        try:
+            yield p
+        finally:
+            p.wall_time += time.perf_counter() - start_time
+            p.cpu_time += _cpu_time() - start_cpu
+            p.peak_rss = _peak_rss()
+
+    def iterate(self, name: str, items: Iterable[T]) -> Iterator[T]:
+        """
+        Iterate over a lazy iterable, measuring the time spent producing the items as a phase.
+        The time spent by the caller between the items is not included.
+        :param name: the name of the phase
+        :param items: the iterable
+        :return: the items
+        """
+        iterator = iter(items)
+        while True:
+            with self.phase(name) as p:
+                item = next(iterator, _end)
+                if item is not _end:
+                    p.count(1)
+            if item is _end:
+                return
+            yield cast(T, item)
+
+    def save(self) -> dict[str, Any]:
+        return {
+            'job': self.job,
+            'parameters': self.parameters,
+            'status': self.status,
+            'start': self.start,
+            'wall_time': round(time.perf_counter() - self.start_time, 3),
+            'cpu_time': round(_cpu_time() - self.start_cpu, 3),
+            'peak_rss_mb': round(_peak_rss(), 1),
+            'phases': [x.save() for x in self.phases]
+        }
+
+    def finish(self, status: str = 'success') -> dict[str, Any]:
+        """
+        Store the report of the job. A failure to store it is logged and does not fail the job.
+        :param status: the final status of the job
+        :return: the report
+        """
+        self.status = status
+        report = self.save()
+        logger.info(f'Job {self.job} finished with status {status} in {report["wall_time"]:.2f}s')
+        for p in self.phases:
+            logger.info(f'Phase {p.name}: {p.wall_time:.2f}s wall, {p.cpu_time:.2f}s CPU, '
+                        f'{p.peak_rss:.0f} MiB peak RSS, {p.documents} documents')
+
+        directory = configuration.get('job_report_dir')
+        if directory:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f'{self.job}-{self.start.strftime("%Y%m%d-%H%M%S-%f")}.json')
+                with open(path, 'w') as f:
+                    json.dump(report, f, indent=2, default=str)
+                logger.info(f'Job report written to {path}')
+            except OSError as e:
+                logger.error(f'Unable to write the job report: {e}')
+
+        if self.client is not None:
+            try:
+                self.client.job_runs.insert_one(dict(report))
+            except PyMongoError as e:
+                logger.error(f'Unable to store the job report: {e}')
+        return report
@@ -1,3 +1,5 @@
+from typing import Any
+
 from plotly import graph_objects as pgo
 from pymongo.database import Database
 
@@ -7,14 +9,6 @@ from shared.types.deck import Deck
 from shared.types.deck_tag import DeckTag
 
 
-def calculate_winrate(decks: list[Deck]) -> float:
-    wins = sum([x.wins for x in decks])
-    losses = sum([x.losses for x in decks])
-    if wins + losses > 0:
-        return wins / (wins + losses)
-    return -1
-
-
 def interpolate(num: float, breakpoints: list[tuple[int, int, int]]) -> tuple[int, int, int]:
     single_percentage = 1 / (len(breakpoints) - 1)
     segment_num = int(num / single_percentage)
@@ -47,16 +41,57 @@ def calculate_winrate_color(wr: float) -> str:
     return tuple_to_color(color)
 
 
+TagStats = tuple[int, int, int]  # (deck_count, wins, losses)
+
+
+def count_tag_stats(decks: list[Deck]) -> dict[str, TagStats]:
+    """
+    Count the decks, wins and losses of each primary tag. Untagged decks are counted as 'unknown'.
+    :param decks: the decks to process
+    :return: the dictionary of tag_id -> (deck_count, wins, losses)
+    """
+    stats: dict[str, TagStats] = {}
+    for d in decks:
+        tag = d.tags[0] if d.tags else 'unknown'
+        count, wins, losses = stats.get(tag, (0, 0, 0))
+        stats[tag] = (count + 1, wins + d.wins, losses + d.losses)
+    return stats
+
+
+def aggregate_tag_stats(db: Database, query: dict) -> dict[str, TagStats]:
+    """
+    Count the decks, wins and losses of each primary tag for every deck matching a query, without loading the decks.
+    :param db: the database
+    :param query: the deck query
+    :return: the dictionary of tag_id -> (deck_count, wins, losses), same as count_tag_stats
+    """
+    pipeline: list[dict[str, Any]] = [
+        {'$match': query},
+        {'$group': {'_id': {'$ifNull': [{'$arrayElemAt': ['$tags', 0]}, 'unknown']}, 'count': {'$sum': 1},
+                    'wins': {'$sum': '$wins'}, 'losses': {'$sum': '$losses'}}}
+    ]
+    return {x['_id']: (x['count'], x['wins'], x['losses']) for x in db.decks.aggregate(pipeline)}
+
+
+def stats_winrate(stats: list[TagStats]) -> float:
+    wins = sum([x[1] for x in stats])
+    losses = sum([x[2] for x in stats])
+    if wins + losses > 0:
+        return wins / (wins + losses)
+    return -1
+
+
 def metagame_breakdown(db: Database, decks: list[Deck], winrate_colors: bool = True) -> pgo.Figure:
-    required_tags = list({x.tags[0] if x.tags else '' for x in decks})
+    return metagame_breakdown_from_stats(db, count_tag_stats(decks), winrate_colors)
+
+
+def metagame_breakdown_from_stats(db: Database, stats: dict[str, TagStats], winrate_colors: bool = True) -> pgo.Figure:
+    required_tags = list(stats.keys())
     # loaded_tags = {x.tag_id: x for x in DeckTag.objects(tag_id__in=required_tags)}
     loaded_tags = {x['tag_id']: DeckTag().load(x) for x in db.deck_tags.find({'tag_id': {'$in': required_tags}})}
     loaded_tags['unknown'] = default_tag
-    for d in decks:
-        if not d.tags:
-            d.tags = ['unknown']
 
-    tag_counts = [(len([y for y in decks if y.tags[0] == x]), x) for x in required_tags]
+    tag_counts = [(stats[x][0], x) for x in required_tags]
     sorted_tag_counts = sorted(tag_counts, reverse=True)
     if len(sorted_tag_counts) < 10:
         min_decks = 1
@@ -65,25 +100,25 @@ def metagame_breakdown(db: Database, decks: list[Deck], winrate_colors: bool = T
 
     data: list[tuple[str, str, int, str, str, float]] = []
     for i in archetypes:
-        with_this_archetype = [x for x in decks if loaded_tags[x.tags[0]].archetype == i]
+        with_this_archetype = [y for x, y in stats.items() if loaded_tags.get(x, default_tag).archetype == i]
         if not with_this_archetype:
             continue
         arch_name = i.title()
-        wr = calculate_winrate(with_this_archetype)
+        wr = stats_winrate(with_this_archetype)
         wr_str = str(round(wr * 100, 2)) + '% winrate'
         color = calculate_winrate_color(wr) if i != 'unclassified' else tuple_to_color((128, 128, 128))
-        data.append((arch_name, '', len(with_this_archetype), wr_str, color, wr))
+        data.append((arch_name, '', sum([x[0] for x in with_this_archetype]), wr_str, color, wr))
 
         if i != 'unclassified':
             tags_with_this_archetype = [x for x in loaded_tags.values() if x.archetype == i]
             for j in tags_with_this_archetype:
-                with_this_tag = [x for x in decks if x.tags[0] == j.tag_id]
-                if len(with_this_tag) < min_decks:
+                with_this_tag = stats.get(j.tag_id, (0, 0, 0))
+                if with_this_tag[0] < min_decks:
                     continue
                 if j.name != arch_name:
-                    wr = calculate_winrate(with_this_tag)
+                    wr = stats_winrate([with_this_tag])
                     wr_str = str(round(wr * 100, 2)) + '% winrate'
-                    data.append((j.name, arch_name, len(with_this_tag), wr_str, calculate_winrate_color(wr), wr))
+                    data.append((j.name, arch_name, with_this_tag[0], wr_str, calculate_winrate_color(wr), wr))
 
     dict_data = {
         'labels': [x[0] for x in data],
@@ -3,10 +3,11 @@ import logging
 from pymongo import UpdateOne
 
 from shared.core_enums import Distribution
+from shared.helpers.bulk_writer import BulkWriter
 from shared.helpers.database import connect
+from shared.helpers.db_loader import stream_decks
 from shared.helpers.util2 import calculate_color_data
 from shared.types.card import Card
-from shared.types.deck import Deck
 
 logger = logging.getLogger('dreadrise.migration')
 
@@ -15,18 +16,16 @@ def run_migration(dist: Distribution) -> None:
     db = connect(dist)
     logger.info('Loading cards...')
     cards: dict[str, Card] = {x['name']: Card().load(x) for x in db.cards.find()}
-    logger.info('Loading decks...')
-    decks: dict[str, Deck] = {x['deck_id']: Deck().load(x) for x in db.decks.find()}
-    logger.info(f'{len(decks)} decks loaded.')
-
-    operation = []
-    for i, j in decks.items():
+    logger.info('Processing decks...')
+    deck_count = 0
+    writer = BulkWriter(db.decks)
+    for j in stream_decks(db, {}, 'colors'):
+        deck_count += 1
         if j.color_data:
             continue
-        operation.append(UpdateOne({'deck_id': i}, {'$set': {'color_data': calculate_color_data(j, cards)}}))
-    logger.info(f'Calculated {len(operation)} operations.')
-    if operation:
-        db.decks.bulk_write(operation)
+        writer.add(UpdateOne({'deck_id': j.deck_id}, {'$set': {'color_data': calculate_color_data(j, cards)}}))
+    logger.info(f'{deck_count} decks processed.')
+    if writer.close():
         logger.info('Operation complete.')
     else:
         logger.info('Nothing to do.')
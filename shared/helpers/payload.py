@@ -0,0 +1,74 @@
+from typing import Any
+
+EntityRef = tuple[str, str]  # (id, name)
+
+tables = ('cards', 'users', 'tags', 'competitions', 'formats')
+deck_columns = ('deck_id', 'name', 'wins', 'losses', 'ties', 'color_data', 'format', 'author', 'tags', 'competition')
+popular_card_columns = ('card', 'weight', 'wins', 'losses')
+
+
+class CompactPayload:
+    """
+    The v2 format of deck list responses.
+    Cards, users, tags, competitions and formats are sent once in `tables` and referenced by their index,
+    decks and popular cards are sent column by column. expand_v2 in mixins.js restores the v1 format.
+    """
+
+    def __init__(self) -> None:
+        self.tables: dict[str, dict[str, list[str]]] = {x: {'id': [], 'name': []} for x in tables}
+        self.indexes: dict[str, dict[str, int]] = {x: {} for x in tables}
+        self.decks: dict[str, list[Any]] = {x: [] for x in deck_columns}
+        self.popular_cards: dict[str, list[Any]] = {x: [] for x in popular_card_columns}
+
+    def intern(self, table: str, entity: EntityRef) -> int:
+        """
+        Add an entity to a table if it is not there yet.
+        :param table: the table name
+        :param entity: the id and the name of the entity
+        :return: the index of the entity in the table
+        """
+        index = self.indexes[table]
+        if entity[0] not in index:
+            index[entity[0]] = len(index)
+            self.tables[table]['id'].append(entity[0])
+            self.tables[table]['name'].append(entity[1])
+        return index[entity[0]]
+
+    def add_deck(self, deck_id: str, name: str, record: tuple[int, int, int], color_data: list[float] | None,
+                 fmt: EntityRef, author: EntityRef, tags: list[EntityRef], competition: EntityRef | None) -> None:
+        """
+        Add a deck to the payload.
+        :param deck_id: the deck ID
+        :param name: the deck name
+        :param record: the wins, losses and ties of the deck
+        :param color_data: the color bar of the deck, if calculated
+        :param fmt: the format code and its localized name
+        :param author: the user ID and nickname of the author
+        :param tags: the IDs and names of the tags
+        :param competition: the competition ID and name, if any
+        :return: nothing
+        """
+        self.decks['deck_id'].append(deck_id)
+        self.decks['name'].append(name)
+        self.decks['wins'].append(record[0])
+        self.decks['losses'].append(record[1])
+        self.decks['ties'].append(record[2])
+        self.decks['color_data'].append(color_data)
+        self.decks['format'].append(self.intern('formats', fmt))
+        self.decks['author'].append(self.intern('users', author))
+        self.decks['tags'].append([self.intern('tags', x) for x in tags])
+        self.decks['competition'].append(self.intern('competitions', competition) if competition else -1)
+
+    def add_popular_card(self, card: EntityRef, weight: int, wins: int, losses: int) -> None:
+        self.popular_cards['card'].append(self.intern('cards', card))
+        self.popular_cards['weight'].append(weight)
+        self.popular_cards['wins'].append(wins)
+        self.popular_cards['losses'].append(losses)
+
+    def jsonify(self) -> dict:
+        return {
+            'v': 2,
+            'tables': self.tables,
+            'decks': self.decks,
+            'popular_cards': self.popular_cards
+        }
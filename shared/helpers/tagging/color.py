@@ -8,6 +8,27 @@ from shared.types.deck import Deck
 logger = logging.getLogger('dreadrise.tagging.color')
 
 
+def color_signature(d: Deck, cards: dict[str, Card]) -> frozenset[Color]:
+    """
+    Find the colors used to cast the cards of a deck. The missing cards are reported once for the whole deck.
+    :param d: the deck
+    :param cards: the card dictionary
+    :return: the set of cast colors
+    """
+    used_colors: set[Color] = set()
+    missing: list[str] = []
+    i: str
+    for i in chain(d.mainboard.keys(), d.sideboard.keys()):
+        card = cards.get(i)
+        if card is None:
+            missing.append(i)
+            continue
+        used_colors.update(card.cast_colors)
+    if missing:
+        logger.warning(f'Cards not found in deck {d.deck_id}: {", ".join(missing)}')
+    return frozenset(used_colors)
+
+
 def color_rule_applies(d: Deck, cards: dict[str, Card], colors: set[Color]) -> bool:
     """
     Check whether a color rule applies to a deck.
@@ -16,12 +37,4 @@ def color_rule_applies(d: Deck, cards: dict[str, Card], colors: set[Color]) -> b
     :param colors: the set of colors to test
     :return: true if the rule applies, false otherwise
     """
-    used_colors = set()
-    i: str
-    for i in chain(d.mainboard.keys(), d.sideboard.keys()):
-        if i not in cards:
-            logger.warning(f'Card {i} not found')
-            continue
-        for c in cards[i].cast_colors:
-            used_colors.add(c)
-    return colors == used_colors
+    return colors == color_signature(d, cards)
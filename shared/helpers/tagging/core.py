@@ -1,11 +1,17 @@
 import logging
-from typing import Any, Iterable, Sequence
+from typing import Any, Callable, Iterable, Sequence
 
 from pymongo import UpdateOne
+from pymongo.database import Database
 
 from shared.core_enums import Distribution
+from shared.helpers.bulk_writer import BulkWriter, bulk_write
 from shared.helpers.database import connect
-from shared.helpers.db_loader import load_cards_from_decks
+from shared.helpers.db_loader import load_cards_from_decks, stream_decks
+from shared.helpers.job_report import JobReport
+from shared.helpers.tagging.index import RuleIndex
+from shared.helpers.tagging.pool import map_chunks
+from shared.helpers.tagging.text import save_compiled_rule
 from shared.helpers.util2 import get_dist_constants
 from shared.types.card import Card
 from shared.types.deck import Deck
@@ -16,63 +22,107 @@ logger = logging.getLogger('dreadrise.tagging.core')
 MaybeCC = dict[str, Card] | None
 
 
-def run(dist: Distribution, rules: Iterable[DeckRule], q: Iterable[Deck], card_cache: MaybeCC = None) -> MaybeCC:
-    constants = get_dist_constants(dist)
-    if 'archetyping' not in constants.EnabledModules:
-        logger.warning(f'Distribution {dist} does not support tags')
-        return None
-
-    db = connect(dist)
-    logger.info('Loading tags')
-    tags = {x['tag_id']: DeckTag().load(x) for x in db.deck_tags.find()}
-    logger.info(f'{len(tags)} tags loaded')
-    rule_list = list(rules)
-    decks = list(q)
-
-    need_to_load_cards = len([x for x in rule_list if isinstance(x, ColorDeckRule)]) > 0
-    cards = card_cache or (load_cards_from_decks(dist, decks) if need_to_load_cards else {})
-    rule_set = {x.rule_id for x in rule_list}
-    full_text_rule_dict = {x['rule_id']: TextDeckRule().load(x) for x in db.text_deck_rules.find()}
-    full_rule_dict: dict[str, DeckRule] = {x['rule_id']: ColorDeckRule().load(x) for x in db.color_deck_rules.find()}
-    logger.info(f'{len(full_text_rule_dict)} text and {len(full_rule_dict)} color rules loaded')
-    full_rule_dict.update(full_text_rule_dict)
-    logger.info(f'{len(full_rule_dict)} rules loaded')
-
-    actions = []
-    for deck in decks:
+def load_text_rules(db: Database, query: dict | None = None) -> list[TextDeckRule]:
+    """
+    Load the text rules with their stored compiled form.
+    The rules stored without an up-to-date compiled form are compiled and the result is stored, so that they are only
+    parsed again after they change.
+    :param db: the database
+    :param query: the rule query
+    :return: the rules
+    """
+    rules = []
+    outdated = []
+    for x in db.text_deck_rules.find(query or {}):
+        rule = TextDeckRule().load(x)
+        if rule.compiled is None:
+            outdated.append(rule)
+        rules.append(rule)
+    if outdated:
+        logger.info(f'Storing {len(outdated)} compiled text rules')
+        bulk_write(db.text_deck_rules, (UpdateOne({'rule_id': x.rule_id},
+                                                  {'$set': {'compiled': save_compiled_rule(x.text, x.get_compiled())}})
+                                        for x in outdated))
+    return rules
+
+
+def aggregate_rule_counts(db: Database, rule_ids: list[str]) -> dict[str, int]:
+    """
+    Count the decks that have each rule, without loading the decks.
+    Only the decks with one of the rules are read, through the index on assigned_rules.
+    :param db: the database
+    :param rule_ids: the IDs of the rules
+    :return: the dictionary of rule_id -> deck count, the rules without decks are missing
+    """
+    pipeline: list[dict[str, Any]] = [
+        {'$match': {'assigned_rules': {'$in': rule_ids}}},
+        {'$project': {'_id': 0, 'rule': {'$setUnion': ['$assigned_rules', []]}}},
+        {'$unwind': '$rule'},
+        {'$match': {'rule': {'$in': rule_ids}}},
+        {'$group': {'_id': '$rule', 'count': {'$sum': 1}}}
+    ]
+    return {x['_id']: x['count'] for x in db.decks.aggregate(pipeline)}
+
+
+class TaggedChunk:
+    """
+    The result of tagging a chunk of decks: the amount of decks and the changes to the decks that need them.
+    """
+
+    def __init__(self, decks: int, actions: list[tuple[str, dict[str, Any]]]) -> None:
+        self.decks = decks
+        self.actions = actions
+
+
+class DeckTagger:
+    """
+    Everything needed to tag a deck: the indexed rules, the card dictionary (for the color rules), all rules and tags.
+    """
+
+    def __init__(self, index: RuleIndex, cards: dict[str, Card], rule_set: set[str],
+                 full_rule_dict: dict[str, DeckRule], tags: dict[str, DeckTag]) -> None:
+        self.index = index
+        self.cards = cards
+        self.rule_set = rule_set
+        self.full_rule_dict = full_rule_dict
+        self.tags = tags
+
+    def tag(self, deck: Deck) -> dict[str, Any] | None:
+        """
+        Apply the rules to a deck.
+        :param deck: the deck
+        :return: the changes to the deck, None if it does not change
+        """
         logger.debug(f'Deck {deck.name}')
-        assigned_rules: list[str] = list(set([x for x in deck.assigned_rules if x not in rule_set and
-                                              x in full_rule_dict]))
-        assigned_existing_rules = {x for x in deck.assigned_rules if x in rule_set}
-
-        action_done = False
-        for rule in rule_list:
-            applies = rule.applies_to(deck, cards)
-            if (applies and rule.rule_id not in assigned_rules) or \
-                    (not applies and rule.rule_id in assigned_existing_rules):
+        # dict.fromkeys keeps the order of the rules, so that rules with the same priority keep their order
+        assigned_rules: list[str] = list(dict.fromkeys(x for x in deck.assigned_rules if x not in self.rule_set and
+                                                       x in self.full_rule_dict))
+        assigned_existing_rules = {x for x in deck.assigned_rules if x in self.rule_set}
+
+        matching = self.index.matching(deck, self.cards)
+        action_done = not assigned_existing_rules <= {x.rule_id for x in matching}
+        for rule in matching:
+            if rule.rule_id not in assigned_rules:
                 action_done = True
-            if applies:
-                assigned_rules.append(rule.rule_id)
-            # logger.debug(f'Deck: {deck.name} rule: {rule.id} applies: {applies} '
-            #             f'has_rule: {rule.rule_id in assigned_rules}')
+            assigned_rules.append(rule.rule_id)
 
         if not action_done:
-            continue
+            return None
         logger.debug(assigned_rules)
 
         action: dict[str, Any] = {}
-        assigned_rules.sort(key=lambda x: -full_rule_dict[x].priority)
+        assigned_rules.sort(key=lambda x: -self.full_rule_dict[x].priority)
         deck.tags = []
         for r in assigned_rules:
-            if full_rule_dict[r].tag_id not in deck.tags:
-                deck.tags.append(full_rule_dict[r].tag_id)
+            if self.full_rule_dict[r].tag_id not in deck.tags:
+                deck.tags.append(self.full_rule_dict[r].tag_id)
 
         action['assigned_rules'] = assigned_rules
         action['tags'] = deck.tags
 
         if not deck.name or deck.is_name_placeholder:
             logger.warning('Setting the name automatically')
-            tag_name = tags[deck.tags[0]].name.replace('Color: ', '')
+            tag_name = self.tags[deck.tags[0]].name.replace('Color: ', '')
             new_name = f'{deck.author[0:3]}\'s {tag_name}'
             action['name'] = new_name
             logger.debug(f'New name: {new_name}')
@@ -80,34 +130,90 @@ def run(dist: Distribution, rules: Iterable[DeckRule], q: Iterable[Deck], card_c
 
         logger.debug('Rules: %s', action['assigned_rules'])
         logger.debug('Tags: %s', action['tags'])
-        actions.append(UpdateOne({'deck_id': deck.deck_id}, {'$set': action}))
-    logger.warning(f'Generated {len(actions)} actions')
-    if actions:
-        db.decks.bulk_write(actions)
-    logger.warning('Sorting complete.')
+        return action
+
+    def tag_chunk(self, decks: Sequence[Deck]) -> TaggedChunk:
+        actions = []
+        for deck in decks:
+            action = self.tag(deck)
+            if action is not None:
+                actions.append((deck.deck_id, action))
+        return TaggedChunk(len(decks), actions)
+
+
+def run(dist: Distribution, rules: Iterable[DeckRule], query: dict, card_cache: MaybeCC = None,
+        workers: int = 1, progress: Callable[[int], None] | None = None) -> MaybeCC:
+    """
+    Apply rules to the decks matching a query. The decks are streamed from the database instead of being kept in memory.
+    With multiple workers, the chunks of decks are tagged in parallel and the changes are written by this process.
+    :param dist: the distribution
+    :param rules: the rules to apply
+    :param query: the deck query
+    :param card_cache: the card dictionary, if it was already loaded
+    :param workers: the number of processes that tag decks in parallel
+    :param progress: called with the amount of processed decks after each chunk
+    :return: the card dictionary, if it was loaded
+    """
+    constants = get_dist_constants(dist)
+    if 'archetyping' not in constants.EnabledModules:
+        logger.warning(f'Distribution {dist} does not support tags')
+        return None
+
+    db = connect(dist)
+    with JobReport('tagging', db, query=str(query), workers=workers) as report:
+        with report.phase('load'):
+            logger.info('Loading tags')
+            tags = {x['tag_id']: DeckTag().load(x) for x in db.deck_tags.find()}
+            logger.info(f'{len(tags)} tags loaded')
+            rule_list = list(rules)
+
+            need_to_load_cards = len([x for x in rule_list if isinstance(x, ColorDeckRule)]) > 0
+            cards = card_cache or (load_cards_from_decks(dist, stream_decks(db, query, 'tagging'))
+                                   if need_to_load_cards else {})
+            rule_set = {x.rule_id for x in rule_list}
+            index = RuleIndex(rule_list)
+            full_text_rule_dict = {x.rule_id: x for x in load_text_rules(db)}
+            full_rule_dict: dict[str, DeckRule] = {x['rule_id']: ColorDeckRule().load(x)
+                                                   for x in db.color_deck_rules.find()}
+            logger.info(f'{len(full_text_rule_dict)} text and {len(full_rule_dict)} color rules loaded')
+            full_rule_dict.update(full_text_rule_dict)
+            logger.info(f'{len(full_rule_dict)} rules loaded')
+
+        tagger = DeckTagger(index, cards, rule_set, full_rule_dict, tags)
+        writer = BulkWriter(db.decks)
+        with report.phase('tag') as p:
+            for chunk in map_chunks(tagger.tag_chunk, stream_decks(db, query, 'tagging'), workers):
+                p.count(chunk.decks)
+                writer.write_all(UpdateOne({'deck_id': x}, {'$set': y}) for x, y in chunk.actions)
+                if progress:
+                    progress(p.documents)
+        with report.phase('write') as p:
+            p.count(writer.close())
+        logger.warning(f'Generated {p.documents} actions')
+        logger.warning('Sorting complete.')
     return cards or None
 
 
-def run_new_rules(dist: Distribution, rules: Sequence[DeckRule], card_cache: MaybeCC = None) -> MaybeCC:
-    db = connect(dist)
+def run_new_rules(dist: Distribution, rules: Sequence[DeckRule], card_cache: MaybeCC = None,
+                  workers: int = 1) -> MaybeCC:
     logger.debug('Running the checker for new rules.')
     logger.debug(f'Found {len(rules)} rules.')
-    return run(dist, rules, (Deck().load(x) for x in db.decks.find()), card_cache=card_cache)
+    return run(dist, rules, {}, card_cache=card_cache, workers=workers)
 
 
-def run_new_decks(dist: Distribution, card_cache: MaybeCC = None) -> MaybeCC:
+def run_new_decks(dist: Distribution, card_cache: MaybeCC = None, workers: int = 1) -> MaybeCC:
     db = connect(dist)
     logger.debug('Running the checker for new decks.')
-    tdr: list[DeckRule] = [TextDeckRule().load(x) for x in db.text_deck_rules.find()]
+    tdr: list[DeckRule] = list(load_text_rules(db))
     tdr += [ColorDeckRule().load(x) for x in db.color_deck_rules.find()]
     logger.debug(f'Found {len(tdr)} rules.')
-    return run(dist, tdr, (Deck().load(x) for x in db.decks.find({'is_sorted': False})), card_cache=card_cache)
+    return run(dist, tdr, {'is_sorted': False}, card_cache=card_cache, workers=workers)
 
 
-def run_all_decks(dist: Distribution, card_cache: MaybeCC = None) -> MaybeCC:
+def run_all_decks(dist: Distribution, card_cache: MaybeCC = None, workers: int = 1) -> MaybeCC:
     db = connect(dist)
     logger.debug('Running the checker for all decks.')
-    tdr: list[DeckRule] = [TextDeckRule().load(x) for x in db.text_deck_rules.find()]
+    tdr: list[DeckRule] = list(load_text_rules(db))
     tdr += [ColorDeckRule().load(x) for x in db.color_deck_rules.find()]
     logger.debug(f'Found {len(tdr)} rules.')
-    return run(dist, tdr, (Deck().load(x) for x in db.decks.find()), card_cache=card_cache)
+    return run(dist, tdr, {}, card_cache=card_cache, workers=workers)
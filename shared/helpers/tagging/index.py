@@ -0,0 +1,73 @@
+from itertools import chain
+from typing import Sequence
+
+from shared.card_enums import Color
+from shared.helpers.tagging.color import color_signature
+from shared.helpers.tagging.text import holds_without_cards
+from shared.types.card import Card
+from shared.types.deck import Deck
+from shared.types.deck_tag import ColorDeckRule, DeckRule, TextDeckRule
+
+
+class RuleIndex:
+    """
+    The rules of a tagging run, indexed so that each deck is only checked against the rules that can apply to it.
+    A text rule is only a candidate for the decks that contain one of its cards, unless it also applies to decks without
+    any of them (like `Card < 1`). Text rules that never apply are dropped.
+    Color rules are indexed by their colors: they apply to the decks with exactly that color signature, which is
+    computed once per deck. Other rules are candidates for every deck.
+    """
+
+    def __init__(self, rules: Sequence[DeckRule]) -> None:
+        self.rules = list(rules)
+        self.always: list[int] = []
+        self.by_card: dict[str, list[int]] = {}
+        self.by_colors: dict[frozenset[Color], list[int]] = {}
+        for i, rule in enumerate(self.rules):
+            if isinstance(rule, ColorDeckRule):
+                self.by_colors.setdefault(frozenset(rule.colors), []).append(i)
+                continue
+            if not isinstance(rule, TextDeckRule):
+                self.always.append(i)
+                continue
+            compiled = rule.get_compiled()
+            if not compiled:
+                continue
+            if holds_without_cards(compiled):
+                self.always.append(i)
+                continue
+            for name in {card for clause in compiled for card, _ in clause.cards}:
+                self.by_card.setdefault(name, []).append(i)
+
+    def candidates(self, d: Deck) -> list[int]:
+        """
+        Find the rules that can apply to a deck, except for the color rules.
+        :param d: the deck
+        :return: the positions of the rules, in order
+        """
+        found = set(self.always)
+        for name in chain(d.mainboard, d.sideboard):
+            found.update(self.by_card.get(name, ()))
+        return sorted(found)
+
+    def matching_colors(self, d: Deck, cards: dict[str, Card]) -> list[int]:
+        """
+        Find the color rules that apply to a deck.
+        :param d: the deck
+        :param cards: the card dictionary
+        :return: the positions of the rules, in order
+        """
+        if not self.by_colors:
+            return []
+        return self.by_colors.get(color_signature(d, cards), [])
+
+    def matching(self, d: Deck, cards: dict[str, Card]) -> list[DeckRule]:
+        """
+        Find the rules that apply to a deck.
+        :param d: the deck
+        :param cards: the card dictionary
+        :return: the rules, in order
+        """
+        found = [i for i in self.candidates(d) if self.rules[i].applies_to(d, cards)]
+        found += self.matching_colors(d, cards)
+        return [self.rules[i] for i in sorted(found)]
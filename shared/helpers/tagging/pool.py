@@ -0,0 +1,53 @@
+import logging
+from collections import deque
+from itertools import islice
+from multiprocessing.pool import AsyncResult
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from shared.helpers.fork_pool import ForkPool
+
+logger = logging.getLogger('dreadrise.tagging.pool')
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def chunked(items: Iterable[T], chunk_size: int) -> Iterator[list[T]]:
+    """
+    Split an iterable into lists.
+    :param items: the iterable, can be a generator
+    :param chunk_size: the maximum length of the lists
+    :return: the lists
+    """
+    iterator = iter(items)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+def map_chunks(task: Callable[[list[T]], R], items: Iterable[T], workers: int = 1,
+               chunk_size: int = 500) -> Iterator[R]:
+    """
+    Process an iterable in chunks, in a pool of worker processes if there are multiple workers.
+    The workers are forked after the data used by the task is loaded, see ForkPool. Only the chunks and the results are
+    sent between the processes.
+    At most two chunks per worker are queued, so that a cursor is not read into memory ahead of the workers.
+    :param task: the calculation for a single chunk
+    :param items: the items to process, can be a generator
+    :param workers: the number of worker processes, 1 means no pool
+    :param chunk_size: the amount of items in a chunk
+    :return: the result of each chunk, in order
+    """
+    if workers <= 1:
+        for chunk in chunked(items, chunk_size):
+            yield task(chunk)
+        return
+
+    logger.info(f'Processing chunks of {chunk_size} with {workers} workers')
+    with ForkPool(task, workers) as pool:
+        pending: deque[AsyncResult[R]] = deque()
+        for chunk in chunked(items, chunk_size):
+            pending.append(pool.apply_async(chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
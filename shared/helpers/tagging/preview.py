@@ -0,0 +1,189 @@
+import logging
+from itertools import chain
+from threading import Lock
+from typing import Any
+
+from pymongo.database import Database
+
+from shared.core_enums import Distribution
+from shared.helpers.database import connect, get_deck_generation
+from shared.helpers.db_loader import stream_decks
+from shared.helpers.tagging.text import TextClause, holds_without_cards, text_rule_applies
+from shared.types.deck import LeanDeck
+from shared.types.deck_tag import TextDeckRule
+
+logger = logging.getLogger('dreadrise.tagging.preview')
+
+PREVIEW_SAMPLE_SIZE = 10
+
+
+class DeckCardIndex:
+    """
+    The card lists of every deck, indexed by card, to evaluate rules without reading the decks from the database.
+    Every write of the cards of a deck stores the deck generation in the deck, so the index only reloads the decks
+    written since its last refresh. The deleted decks are found by comparing the deck IDs with the database.
+    Everything else about the decks (their rules and tags) should be read from the database.
+    """
+
+    def __init__(self) -> None:
+        self.generation = 0
+        self.decks: list[LeanDeck] = []
+        self.positions: dict[str, int] = {}
+        self.by_card: dict[str, list[int]] = {}
+        self.lock = Lock()
+
+    def clear(self) -> None:
+        self.generation = 0
+        self.decks = []
+        self.positions = {}
+        self.by_card = {}
+
+    def add(self, d: LeanDeck) -> None:
+        """
+        Add a deck, or replace the cards of a deck that is already indexed.
+        The positions of a replaced deck stay under the cards it lost, matching checks the current cards anyway.
+        :param d: the deck
+        :return: nothing
+        """
+        position = self.positions.get(d.deck_id)
+        if position is None:
+            position = len(self.decks)
+            self.decks.append(d)
+            self.positions[d.deck_id] = position
+            old_names: set[str] = set()
+        else:
+            old = self.decks[position]
+            old_names = set(chain(old.mainboard, old.sideboard))
+            self.decks[position] = d
+        for name in set(chain(d.mainboard, d.sideboard)) - old_names:
+            self.by_card.setdefault(name, []).append(position)
+
+    def remove(self, deck_ids: set[str]) -> None:
+        """
+        Remove decks from the index. The remaining decks are moved to close the gaps.
+        :param deck_ids: the IDs of the decks
+        :return: nothing
+        """
+        kept = [x for x in self.decks if x.deck_id not in deck_ids]
+        moved = {self.positions[x.deck_id]: i for i, x in enumerate(kept)}
+        self.decks = kept
+        self.positions = {x.deck_id: i for i, x in enumerate(kept)}
+        by_card: dict[str, list[int]] = {}
+        for name, positions in self.by_card.items():
+            new_positions = [moved[x] for x in positions if x in moved]
+            if new_positions:
+                by_card[name] = new_positions
+        self.by_card = by_card
+
+    def refresh(self, db: Database) -> None:
+        """
+        Load the decks that were written since the last refresh and drop the decks that were deleted.
+        :param db: the database
+        :return: nothing
+        """
+        with self.lock:
+            # the generation is read first, a deck written during the refresh is loaded again by the next one
+            generation = get_deck_generation(db)
+            if not self.decks:
+                query: dict[str, Any] = {}
+            else:
+                # the deck count can stay the same when a deck is deleted and another one is added
+                deck_ids = {x['deck_id'] for x in db.decks.find({}, {'_id': 0, 'deck_id': 1})}
+                deleted = self.positions.keys() - deck_ids
+                if deleted:
+                    logger.info(f'Removing {len(deleted)} deleted decks from the deck index')
+                    self.remove(deleted)
+                # the decks written before generations were introduced are found by their IDs
+                new_ids = sorted(deck_ids - self.positions.keys())
+                query = {'$or': [{'generation': {'$gte': self.generation}}, {'deck_id': {'$in': new_ids}}]}
+            for d in stream_decks(db, query, 'cards'):
+                self.add(d)
+            self.generation = generation
+            logger.info(f'Deck index refreshed, {len(self.decks)} decks')
+
+    def matching(self, compiled_rule: list[TextClause]) -> list[LeanDeck]:
+        """
+        Find the decks that a rule applies to.
+        :param compiled_rule: the clauses of the rule
+        :return: the decks
+        """
+        with self.lock:
+            if holds_without_cards(compiled_rule):
+                candidates = list(self.decks)
+            else:
+                positions = {x for clause in compiled_rule for name, _ in clause.cards
+                             for x in self.by_card.get(name, ())}
+                candidates = [self.decks[x] for x in sorted(positions)]
+        return [x for x in candidates if text_rule_applies(x, compiled_rule)]
+
+
+_indexes: dict[Distribution, DeckCardIndex] = {}
+
+
+def get_deck_index(dist: Distribution) -> DeckCardIndex:
+    """
+    Get the deck index of a distribution, built on first use and refreshed with the changed decks on every use.
+    :param dist: the distribution
+    :return: the deck index
+    """
+    index = _indexes.setdefault(dist, DeckCardIndex())
+    index.refresh(connect(dist))
+    return index
+
+
+def _primary_tag(rule_ids: list[str], rules: dict[str, tuple[int, str]]) -> str | None:
+    known = [x for x in rule_ids if x in rules]
+    if not known:
+        return None
+    return rules[min(known, key=lambda x: -rules[x][0])][1]
+
+
+def preview_rule(dist: Distribution, rule: TextDeckRule) -> dict[str, Any]:
+    """
+    Find the decks that would gain or lose a rule if it was changed, and the decks whose primary tag would change.
+    Nothing is written into the database.
+    :param dist: the distribution
+    :param rule: the changed rule
+    :return: the counts and samples of the decks
+    """
+    db = connect(dist)
+    compiled = rule.get_compiled()
+    matching = {x.deck_id: x for x in get_deck_index(dist).matching(compiled)} if compiled else {}
+
+    projection = {'_id': 0, 'deck_id': 1, 'name': 1, 'tags': 1, 'assigned_rules': 1}
+    current = {x['deck_id']: x for x in db.decks.find({'assigned_rules': rule.rule_id}, projection)}
+    gained = [x for x in matching if x not in current]
+    lost = [x for x in current if x not in matching]
+
+    rule_projection = {'_id': 0, 'rule_id': 1, 'tag_id': 1, 'priority': 1}
+    rules = {x['rule_id']: (x.get('priority', 0), x['tag_id']) for x in
+             chain(db.text_deck_rules.find({}, rule_projection), db.color_deck_rules.find({}, rule_projection))}
+    rules[rule.rule_id] = (rule.priority, rule.tag_id)
+    tag_names = {x['tag_id']: x['name'] for x in db.deck_tags.find({}, {'_id': 0, 'tag_id': 1, 'name': 1})}
+
+    # the priority can change the primary tag of the decks that keep the rule as well
+    affected = list(current.values()) + list(db.decks.find({'deck_id': {'$in': gained}}, projection))
+    tag_changes = []
+    for d in affected:
+        old_tag = d['tags'][0] if d.get('tags') else None
+        rule_ids = [x for x in d.get('assigned_rules', []) if x != rule.rule_id]
+        if d['deck_id'] in matching:
+            rule_ids.append(rule.rule_id)
+        new_tag = _primary_tag(rule_ids, rules)
+        if new_tag != old_tag:
+            tag_changes.append({'deck_id': d['deck_id'], 'name': d.get('name', ''),
+                                'old_tag': tag_names.get(old_tag or '', old_tag),
+                                'new_tag': tag_names.get(new_tag or '', new_tag)})
+
+    names = {x['deck_id']: x.get('name', '') for x in current.values()}
+    names.update({x: y.name for x, y in matching.items()})
+    return {
+        'valid': bool(compiled) or not rule.text,
+        'matching': len(matching),
+        'gained': len(gained),
+        'lost': len(lost),
+        'tag_changes': len(tag_changes),
+        'gained_sample': [{'deck_id': x, 'name': names[x]} for x in gained[:PREVIEW_SAMPLE_SIZE]],
+        'lost_sample': [{'deck_id': x, 'name': names[x]} for x in lost[:PREVIEW_SAMPLE_SIZE]],
+        'tag_change_sample': tag_changes[:PREVIEW_SAMPLE_SIZE]
+    }
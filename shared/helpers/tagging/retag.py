@@ -0,0 +1,152 @@
+import logging
+from datetime import datetime, timedelta
+from threading import Thread
+from typing import Any, Iterable
+from uuid import uuid4
+
+from pymongo.database import Database
+from pymongo.errors import DuplicateKeyError
+
+from shared.core_enums import Distribution
+from shared.helpers.database import connect
+from shared.helpers.tagging.core import run
+from shared.helpers.tagging.text import TextClause, holds_without_cards
+from shared.types.deck_tag import TextDeckRule
+
+logger = logging.getLogger('dreadrise.tagging.retag')
+
+_scope_fields = {'main': ('mainboard',), 'side': ('sideboard',), 'any': ('mainboard', 'sideboard')}
+# the worker updates its heartbeat after every chunk of decks, a worker silent for this long has stopped
+RULE_UPDATE_TIMEOUT = timedelta(minutes=10)
+
+
+def candidate_query(rule_id: str, compiled_rules: Iterable[list[TextClause]]) -> dict[str, Any]:
+    """
+    Build the query for the decks that can change when a rule is edited: the decks that contain a card named in one
+    of the versions of the rule and the decks that currently have the rule.
+    If a version of the rule applies to decks without any of its cards, every deck is a candidate.
+    :param rule_id: the ID of the rule
+    :param compiled_rules: the versions of the rule, usually the old and the new one
+    :return: the deck query
+    """
+    conditions: list[dict[str, Any]] = [{'assigned_rules': rule_id}]
+    fields: set[str] = set()
+    for compiled in compiled_rules:
+        if holds_without_cards(compiled):
+            return {}
+        for clause in compiled:
+            for name, scope in clause.cards:
+                fields.update(f'{x}.{name}' for x in _scope_fields[scope])
+    conditions += [{x: {'$gt': 0}} for x in sorted(fields)]
+    return {'$or': conditions}
+
+
+def expire_rule_updates(db: Database) -> int:
+    """
+    Mark the running updates whose worker stopped, for example because the process was restarted, as failed.
+    :param db: the database
+    :return: the amount of expired updates
+    """
+    now = datetime.utcnow()
+    expired = db.rule_updates.update_many({'status': 'running', 'heartbeat': {'$lt': now - RULE_UPDATE_TIMEOUT}},
+                                          {'$set': {'status': 'failed', 'error': 'The worker stopped', 'end': now}})
+    if expired.modified_count:
+        logger.warning(f'Expired {expired.modified_count} rule updates')
+    return expired.modified_count
+
+
+def _acquire_worker_lock(db: Database, owner: str) -> bool:
+    now = datetime.utcnow()
+    try:
+        db.job_locks.insert_one({'name': 'rule_updates', 'owner': owner, 'heartbeat': now})
+        return True
+    except DuplicateKeyError:
+        return db.job_locks.update_one({'name': 'rule_updates', 'heartbeat': {'$lt': now - RULE_UPDATE_TIMEOUT}},
+                                       {'$set': {'owner': owner, 'heartbeat': now}}).modified_count > 0
+
+
+def _run_rule_update(dist: Distribution, db: Database, owner: str, update: dict[str, Any]) -> None:
+    update_id = update['update_id']
+
+    def progress(processed: int) -> None:
+        now = datetime.utcnow()
+        db.rule_updates.update_one({'update_id': update_id}, {'$set': {'processed': processed, 'heartbeat': now}})
+        db.job_locks.update_one({'name': 'rule_updates', 'owner': owner}, {'$set': {'heartbeat': now}})
+
+    rule_doc = db.text_deck_rules.find_one({'rule_id': update['rule_id']})
+    if not rule_doc:
+        db.rule_updates.update_one({'update_id': update_id}, {'$set': {
+            'status': 'failed', 'error': 'The rule was deleted', 'end': datetime.utcnow()}})
+        return
+    try:
+        # the rule is reloaded, so the update uses its latest version even if it was edited again in the meantime
+        rule = TextDeckRule().load(rule_doc)
+        old_rule = [TextClause.from_document(x) for x in update['old_clauses']]
+        query = candidate_query(rule.rule_id, [old_rule, rule.get_compiled()])
+        db.rule_updates.update_one({'update_id': update_id}, {'$set': {'total': db.decks.count_documents(query)}})
+        logger.info(f'Re-tagging the decks for rule {rule.rule_id}')
+        run(dist, [rule], query, progress=progress)
+    except Exception as e:
+        logger.exception(f'Re-tagging the decks for rule {update["rule_id"]} failed')
+        db.rule_updates.update_one({'update_id': update_id}, {'$set': {
+            'status': 'failed', 'error': str(e), 'end': datetime.utcnow()}})
+        return
+    db.rule_updates.update_one({'update_id': update_id}, {'$set': {'status': 'done', 'end': datetime.utcnow()}})
+
+
+def _rule_update_worker(dist: Distribution) -> None:
+    db = connect(dist)
+    owner = uuid4().hex
+    while _acquire_worker_lock(db, owner):
+        try:
+            expire_rule_updates(db)
+            while True:
+                update = db.rule_updates.find_one({'status': 'queued'}, sort=[('start', 1)])
+                if not update:
+                    break
+                # the update is only run if its status is still queued when it is claimed
+                if db.rule_updates.update_one({'update_id': update['update_id'], 'status': 'queued'}, {'$set': {
+                        'status': 'running', 'heartbeat': datetime.utcnow()}}).modified_count:
+                    _run_rule_update(dist, db, owner, update)
+        finally:
+            db.job_locks.delete_one({'name': 'rule_updates', 'owner': owner})
+        # an update queued while the lock was being released found the lock taken and is picked up here
+        if not db.rule_updates.count_documents({'status': 'queued'}, limit=1):
+            return
+
+
+def check_rule_updates(dist: Distribution) -> None:
+    """
+    Mark the stopped updates as failed and start a worker if some updates are still queued.
+    The updates run one at a time in a single worker, even if the website runs in several processes.
+    :param dist: the distribution
+    :return: nothing
+    """
+    db = connect(dist)
+    expire_rule_updates(db)
+    if db.rule_updates.count_documents({'status': 'queued'}, limit=1):
+        Thread(target=_rule_update_worker, args=(dist, ), daemon=True).start()
+
+
+def start_rule_update(dist: Distribution, rule: TextDeckRule, old_rule: list[TextClause]) -> str:
+    """
+    Queue the re-tagging of the decks affected by an edited rule.
+    The queue and the progress are stored in the rule_updates collection.
+    :param dist: the distribution
+    :param rule: the edited rule
+    :param old_rule: the rule before the edit
+    :return: the ID of the update
+    """
+    db = connect(dist)
+    update_id = uuid4().hex
+    db.rule_updates.insert_one({
+        'update_id': update_id,
+        'rule_id': rule.rule_id,
+        'old_clauses': [x.save() for x in old_rule],
+        'status': 'queued',
+        'processed': 0,
+        'total': 0,
+        'start': datetime.utcnow()
+    })
+    check_rule_updates(dist)
+    return update_id
@@ -1,4 +1,6 @@
 import logging
+from functools import lru_cache
+from typing import Any
 
 import pyparsing as pp
 import pyparsing.exceptions
@@ -7,8 +9,11 @@ from shared.types.deck import Deck
 
 logger = logging.getLogger('dreadrise.tagging.text')
 comparisons = ['>', '<', '>=', '<=', '=']
+# the version of the stored compiled rules, increase it when the grammar or TextClause changes
+COMPILED_RULE_VERSION = 1
 
 
+@lru_cache(maxsize=None)
 def _get_parser() -> pp.ParserElement:
     letters = pp.alphanums + '\'-, /'
     card_name = pp.Word(letters)
@@ -21,52 +26,117 @@ def _get_parser() -> pp.ParserElement:
     return multiple_card_names + comparison + number
 
 
-def compile_rule(rule: str) -> list:
+class TextClause:
+    """
+    A line of a text rule: the sum of the copies of some cards, compared to a threshold.
+    The scope of each card is `main`, `side` or `any` (both).
+    """
+
+    def __init__(self, cards: list[tuple[str, str]], comparison: str, threshold: int) -> None:
+        self.cards = cards
+        self.comparison = comparison
+        self.threshold = threshold
+
+    def count(self, d: Deck) -> int:
+        return sum((d.mainboard.get(name, 0) if scope != 'side' else 0) +
+                   (d.sideboard.get(name, 0) if scope != 'main' else 0) for name, scope in self.cards)
+
+    def holds(self, total: int) -> bool:
+        if self.comparison == '=':
+            return total == self.threshold
+        if self.comparison == '>':
+            return total > self.threshold
+        if self.comparison == '>=':
+            return total >= self.threshold
+        if self.comparison == '<':
+            return total < self.threshold
+        return total <= self.threshold
+
+    def save(self) -> dict[str, Any]:
+        return {'cards': [list(x) for x in self.cards], 'comparison': self.comparison, 'threshold': self.threshold}
+
+    @staticmethod
+    def from_document(data: dict[str, Any]) -> 'TextClause':
+        return TextClause([(name, scope) for name, scope in data['cards']], data['comparison'], data['threshold'])
+
+
+def _compile_line(tokens: pp.ParseResults) -> TextClause:
+    cards: list[tuple[str, str]] = []
+    scope = 'main'
+    comparison = ''
+    threshold = 0
+    for j in tokens:
+        if j == '*':
+            scope = 'any'
+        elif j == 'side':
+            scope = 'side'
+        elif isinstance(j, str) and j not in comparisons:
+            cards.append((j.strip(), scope))
+            scope = 'main'
+        elif j in comparisons:
+            comparison = j
+        else:
+            threshold = j
+    return TextClause(cards, comparison, threshold)
+
+
+def compile_rule(rule: str) -> list[TextClause]:
+    """
+    Compile a text rule into its clauses.
+    The rule should be formatted as:
+    <card_a> + <card_b> + <card_c> >= (= <= > <) (number)
+    each card is either [Card name] for maindeck, side.[Card name] for sideboard, or *.[Card name] for any.
+    Every line of the rule is a clause and all of them should hold.
+    :param rule: the text of the rule
+    :return: the clauses, an empty list if the rule is empty or invalid
+    """
     if not rule:
         return []
 
     parser = _get_parser()
     try:
-        return [parser.parse_string(x) for x in rule.split('\n')]
+        return [_compile_line(parser.parse_string(x)) for x in rule.split('\n')]
     except pyparsing.exceptions.ParseException as e:
         logger.error('Error while running text rules: %s - %s!', rule, e.msg)
         return []
 
 
-def text_rule_applies(d: Deck, compiled_rule: list) -> bool:
+def save_compiled_rule(rule: str, compiled_rule: list[TextClause]) -> dict[str, Any]:
     """
-    Check whether a text rule applies to a deck.
-    The rule should be formatted as:
-    <card_a> + <card_b> + <card_c> >= (= <= > <) (number)
-    each card is either [Card name] for maindeck, side.[Card name] for sideboard, or *.[Card name] for any.
+    Convert a compiled text rule into the form stored alongside the rule.
+    :param rule: the text the rule was compiled from
+    :param compiled_rule: the clauses of the rule
+    :return: the stored form
+    """
+    return {'version': COMPILED_RULE_VERSION, 'text': rule, 'clauses': [x.save() for x in compiled_rule]}
+
+
+def load_compiled_rule(data: dict[str, Any] | None, rule: str) -> list[TextClause] | None:
+    """
+    Load a stored compiled text rule.
+    :param data: the stored form
+    :param rule: the current text of the rule
+    :return: the clauses, None if they are missing, outdated or were compiled from a different text
+    """
+    if not data or data.get('version') != COMPILED_RULE_VERSION or data.get('text') != rule:
+        return None
+    return [TextClause.from_document(x) for x in data['clauses']]
+
+
+def text_rule_applies(d: Deck, compiled_rule: list[TextClause]) -> bool:
+    """
+    Check whether a compiled text rule applies to a deck.
     :param d: the deck
-    :param compiled_rule: the rule compiled from one with the rules above
+    :param compiled_rule: the clauses of the rule
     :return: true if applies, false otherwise
     """
-    if not compiled_rule:
-        return False
-
-    for i in compiled_rule:
-        current_sum = 0
-        current_mode = -1
-        comp = ''
-        for j in i:
-            if j == '*':
-                current_mode = 0
-            elif j == 'side':
-                current_mode = 1
-            elif isinstance(j, str) and j not in comparisons:
-                j = j.strip()
-                current_sum += (d.mainboard.get(j, 0) if current_mode <= 0 else 0)
-                current_sum += (d.sideboard.get(j, 0) if current_mode >= 0 else 0)
-                current_mode = -1
-            elif j in comparisons:
-                comp = j
-            elif not comp:
-                return False
-            else:
-                if (comp == '=' and current_sum != j) or (comp == '>' and current_sum <= j) or \
-                        (comp == '>=' and current_sum < j) or (comp == '<' and current_sum >= j) or \
-                        (comp == '<=' and current_sum > j):
-                    return False
-    return True
+    return bool(compiled_rule) and all(x.holds(x.count(d)) for x in compiled_rule)
+
+
+def holds_without_cards(compiled_rule: list[TextClause]) -> bool:
+    """
+    Check whether a compiled text rule applies to decks without any of its cards.
+    :param compiled_rule: the clauses of the rule
+    :return: true if the rule applies when every count is 0
+    """
+    return bool(compiled_rule) and all(x.holds(0) for x in compiled_rule)
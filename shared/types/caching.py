@@ -46,3 +46,21 @@ class CardPlayability(PseudoType):
     deck_count: int
     winrate: float
     playability: str  # impossible to make this an enum due to database differences
+
+
+class CompetitionSummary(PseudoType):
+    competition: str
+    format: str
+    deck_count: int
+    main_card: str
+    popular_cards: list[dict]  # [{card_name, weight, wins, losses}]
+    metagame: list[dict]  # [{tag, deck_count, wins, losses}], by the primary tag of each deck
+
+
+class CompetitionBundle(PseudoType):
+    competition: str
+    format: str
+    # sorted like db_loader.deck_page_sort
+    decks: list[dict]  # [{deck_id, name, author, tags, wins, losses, ties, format, color_data}]
+    users: list[tuple[str, str]]  # [(user_id, nickname)]
+    tags: list[tuple[str, str]]  # [(tag_id, name)]
@@ -1,4 +1,5 @@
 from datetime import datetime
+from sys import intern
 
 from shared.card_enums import DeckPrivacy
 from shared.types.pseudotype import PseudoType
@@ -13,6 +14,8 @@ class DeckGameRecord(PseudoType):
 
 
 class Deck(PseudoType):
+    # Decks can be loaded from partial documents (see db_loader.deck_projections): the fields that were not
+    # loaded keep the class defaults, and the record is not recalculated if the games were not loaded.
     def pre_load(self, data: dict) -> None:
         super().pre_load(data)
         if 'games' in data:
@@ -66,3 +69,42 @@ class Deck(PseudoType):
             self.ties = len([x for x in self.games if x.result == 0])
             if not self.deck_id and self.competition:
                 self.deck_id = self.competition + '--' + self.author
+
+
+class LeanDeck(Deck):
+    """
+    A compact deck record for the batch jobs that go over every deck, see db_loader.stream_decks.
+    The fields are stored in slots instead of an instance dictionary, the repeated strings (card names, tags,
+    formats, competitions, authors) are interned and the game records are never loaded.
+    The fields that were not projected keep the Deck defaults. Lean decks must not be saved.
+    """
+    __slots__ = ('deck_id', 'name', 'is_name_placeholder', 'author', 'competition', 'format', 'source', 'date',
+                 'main_card', 'tags', 'is_sorted', 'mainboard', 'sideboard', 'wins', 'losses', 'ties', 'privacy',
+                 'assigned_rules', 'color_data')
+
+    @staticmethod
+    def from_document(data: dict) -> 'LeanDeck':
+        """
+        Create a lean deck from a (projected) deck document.
+        :param data: the deck document
+        :return: the lean deck
+        """
+        deck = LeanDeck()
+        for x in LeanDeck.__slots__:
+            if x in data:
+                setattr(deck, x, data[x])
+            elif hasattr(Deck, x):
+                setattr(deck, x, getattr(Deck, x))
+        for x in ('author', 'competition', 'format', 'source'):
+            if x in data and isinstance(data[x], str):
+                setattr(deck, x, intern(data[x]))
+        if 'mainboard' in data:
+            deck.mainboard = {intern(x): y for x, y in data['mainboard'].items()}
+        if 'sideboard' in data:
+            deck.sideboard = {intern(x): y for x, y in data['sideboard'].items()}
+        if 'tags' in data:
+            deck.tags = [intern(x) for x in data['tags']]
+        return deck
+
+    def virtual_save(self) -> dict:
+        raise TypeError('Lean decks are read-only, load a Deck to save it')
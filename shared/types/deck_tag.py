@@ -1,6 +1,7 @@
 from shared.card_enums import Archetype, Color
 from shared.helpers.tagging.color import color_rule_applies
-from shared.helpers.tagging.text import compile_rule, text_rule_applies
+from shared.helpers.tagging.text import (TextClause, compile_rule, load_compiled_rule, save_compiled_rule,
+                                         text_rule_applies)
 from shared.types.card import Card
 from shared.types.deck import Deck
 from shared.types.pseudotype import PseudoType
@@ -24,13 +25,35 @@ class DeckRule(PseudoType):
 
 
 class TextDeckRule(DeckRule):
+    """
+    A rule based on the counts of cards, see shared.helpers.tagging.text.
+    The compiled rule is stored alongside the text, so that loading a rule does not parse it again.
+    """
     text: str
-    compiled: list | None = None
+    compiled: list[TextClause] | None = None
 
-    def applies_to(self, d: Deck, cards: dict[str, Card]) -> bool:
-        if not self.compiled:
+    def pre_load(self, data: dict) -> None:
+        data = dict(data)
+        stored = data.pop('compiled', None)
+        super().pre_load(data)
+        self.compiled = load_compiled_rule(stored, self.get('text', ''))
+
+    def virtual_save(self) -> dict:
+        dct = super().virtual_save()
+        dct['compiled'] = save_compiled_rule(self.text, self.get_compiled())
+        return dct
+
+    def set_text(self, text: str) -> None:
+        self.text = text
+        self.compiled = None
+
+    def get_compiled(self) -> list[TextClause]:
+        if self.compiled is None:
             self.compiled = compile_rule(self.text)
-        return text_rule_applies(d, self.compiled)
+        return self.compiled
+
+    def applies_to(self, d: Deck, cards: dict[str, Card]) -> bool:
+        return text_rule_applies(d, self.get_compiled())
 
 
 class ColorDeckRule(DeckRule):
@@ -1,6 +1,7 @@
 import abc
 from typing import Callable, Literal
 
+from shared.helpers.deckcheck.legality import IndexedCards
 from shared.search.syntaxes.abstract import SearchSyntaxCardAbstract, SearchSyntaxDeckAbstract
 from shared.types.card import Card
 from shared.types.deck import Deck
@@ -47,7 +48,7 @@ class DistConstants:
     CardSearchSyntax: type[SearchSyntaxCardAbstract]
     DeckSearchSyntax: type[SearchSyntaxDeckAbstract]
     DefaultCard: str
-    DeckCheckers: list[Callable[[Deck, dict[str, Card]],
+    DeckCheckers: list[Callable[[Deck, IndexedCards],
                                 tuple[Literal['Success!', 'Warnings found!', 'Errors found!'], str]]]
 
     @staticmethod
@@ -0,0 +1,134 @@
+from timeit import timeit
+
+import numpy as np
+
+from dists.penny_dreadful.constants import DeckCheckers
+from shared.helpers.caching.popularity import count, prefix_counts, run_popularity
+from shared.helpers.db_loader import analyze_decks
+from shared.helpers.deck_matrix import DeckMatrix
+from shared.helpers.deckcheck.core import deck_check
+from shared.helpers.deckcheck.karsten import KarstenProfile, karsten_requirements
+from shared.helpers.deckcheck.legality import IndexedCards, LegalityIndex
+from shared.helpers.tagging.core import DeckTagger
+from shared.helpers.tagging.index import RuleIndex
+from shared.helpers.tagging.pool import map_chunks
+from shared.types.deck_tag import DeckTag
+from tests.fixtures import (make_archetype, make_deck, make_karsten_card, make_random_metagame, make_rules_and_decks,
+                            reference_analysis, reference_karsten, reference_popularity)
+
+
+def benchmark_deck_analysis(deck_count=5000, card_count=600, repeat=3):
+    """Time the tag page analysis on a synthetic archetype."""
+    decks, cards = make_archetype(deck_count, card_count)
+    print(f'Deck analysis, {deck_count} decks, {len(cards)} cards:')
+    single_pass = timeit(lambda: analyze_decks(decks, cards, 0.05), number=repeat) / repeat
+    print(f'  analyze_decks: {single_pass * 1000:.1f} ms')
+    per_type = timeit(lambda: reference_analysis(decks, cards, 0.05), number=1)
+    print(f'  per-type reference: {per_type * 1000:.1f} ms')
+
+
+def benchmark_deck_matrix(deck_count=30000, card_count=2000, repeat=3):
+    """Time the popularity calculation of a format on synthetic decks."""
+    decks, cards, competitions, tags = make_random_metagame(deck_count, card_count, competition_count=300,
+                                                            tag_count=150)
+    print(f'Format popularity, {deck_count} decks, {len(cards)} cards:')
+    build = timeit(lambda: DeckMatrix.build(decks), number=1)
+    print(f'  DeckMatrix.build: {build * 1000:.1f} ms')
+    dm = DeckMatrix.build(decks)
+    matrix = timeit(lambda: run_popularity('f0', cards, dm, competitions, tags), number=repeat) / repeat
+    print(f'  run_popularity: {matrix * 1000:.1f} ms')
+    dict_based = timeit(lambda: reference_popularity('f0', cards, decks, competitions, tags), number=1)
+    print(f'  dict-based reference: {dict_based * 1000:.1f} ms')
+
+
+def benchmark_ordered_popularity(deck_count=30000, card_count=2000, season_count=30):
+    """Time the cumulative popularities of ordered formats, as in a full recalculation of the seasons."""
+    decks, cards, _, _ = make_random_metagame(deck_count, card_count)
+    for i, x in enumerate(decks):
+        x.format = f's{i * season_count // deck_count}'
+    seasons = [f's{i}' for i in range(season_count)]
+    dm = DeckMatrix.build(decks)
+    print(f'Ordered popularity, {deck_count} decks in {season_count} seasons:')
+
+    def growing_prefixes():
+        for i in range(season_count):
+            local = dm.subset(np.isin(dm.formats, [dm.format_names.index(x) for x in seasons[:i + 1]]))
+            count(local, cards)
+            local.subset(local.in_format(seasons[i]))
+
+    def prefix_sums():
+        prefix_counts(dm, cards, seasons)
+        dm.split_by_format()
+
+    print(f'  prefix sums: {timeit(prefix_sums, number=1) * 1000:.1f} ms')
+    print(f'  growing prefixes: {timeit(growing_prefixes, number=1) * 1000:.1f} ms')
+
+
+def benchmark_rule_index(rule_count=500, deck_count=5000, card_count=3000):
+    """Time the text rules of a tagging run, checking every rule against every deck or only the indexed ones."""
+    rules, decks = make_rules_and_decks(rule_count, deck_count, card_count)
+    rules = [x for x in rules if x.get_compiled()]
+    print(f'Text rules, {len(rules)} rules, {deck_count} decks:')
+    index = RuleIndex(rules)
+    indexed = timeit(lambda: [index.matching(x, {}) for x in decks], number=1)
+    print(f'  rule index: {indexed * 1000:.1f} ms')
+    every_rule = timeit(lambda: [[y for y in rules if y.applies_to(x, {})] for x in decks], number=1)
+    print(f'  every rule: {every_rule * 1000:.1f} ms')
+
+
+def benchmark_parallel_tagging(rule_count=500, deck_count=20000, card_count=3000, workers=(1, 2, 4)):
+    """Time the tagging of decks, in a single process and in pools of worker processes."""
+    rules, decks = make_rules_and_decks(rule_count, deck_count, card_count)
+    rules = [x for x in rules if x.get_compiled()]
+    tags = {x.tag_id: DeckTag().load({'tag_id': x.tag_id, 'name': x.tag_id}) for x in rules}
+    tagger = DeckTagger(RuleIndex(rules), {}, {x.rule_id for x in rules}, {x.rule_id: x for x in rules}, tags)
+    print(f'Tagging, {len(rules)} rules, {deck_count} decks:')
+    for x in workers:
+        elapsed = timeit(lambda: sum(len(y.actions) for y in map_chunks(tagger.tag_chunk, iter(decks), x)), number=1)
+        print(f'  {x} workers: {elapsed * 1000:.1f} ms')
+
+
+def benchmark_legality_index(card_count=30000, deck_count=5000):
+    """Time the creation of a legality index and the deck checks that use it."""
+    rng = np.random.default_rng(0)
+    legality = ['legal', 'restricted', 'banned', 'not_legal']
+    cards = [{'name': f'card {i}', 'types': 'Creature' if i % 3 else 'Land',
+              'legality': {f'f{j}': legality[x] for j, x in enumerate(rng.integers(0, 4, 20))},
+              'categories': [f'c{x}' for x in rng.choice(10, 3, replace=False)]} for i in range(card_count)]
+    decks = [make_deck(f'f{i % 20}', {f'card {x}': 4 for x in rng.choice(card_count, 15, replace=False)},
+                       {f'card {x}': 3 for x in rng.choice(card_count, 5, replace=False)}) for i in range(deck_count)]
+    elapsed = timeit(lambda: LegalityIndex.build(cards), number=1)
+    print(f'Legality index, {card_count} cards: {elapsed * 1000:.1f} ms')
+    index = LegalityIndex.build(cards)
+    elapsed = timeit(lambda: [deck_check('penny_dreadful', x, DeckCheckers, IndexedCards('penny_dreadful', index, [x]))
+                              for x in decks], number=1)
+    print(f'Deck checks, {deck_count} decks: {elapsed * 1000:.1f} ms')
+
+
+def benchmark_karsten(card_count=500, deck_count=500):
+    """Compare the Karsten check using card profiles with the check that scans the deck for every color."""
+    rng = np.random.default_rng(0)
+    symbols = ['white', 'blue', 'black', 'red', 'green', 'white/blue']
+    cards = {f'card {i}': make_karsten_card(f'card {i}', 'normal', [{symbols[x]: 1 + i % 3 for x in
+                                                                     rng.choice(6, 1 + i % 2, replace=False)}],
+                                            'Creature' if i % 2 else 'Land', [symbols[i % 5]] if i % 4 else [])
+             for i in range(card_count)}
+    decks = [make_deck('f', {f'card {x}': 4 for x in rng.choice(card_count, 15, replace=False)},
+                       {f'card {x}': 3 for x in rng.choice(card_count, 5, replace=False)}) for _ in range(deck_count)]
+    print(f'Karsten check, {deck_count} decks:')
+    elapsed = timeit(lambda: [reference_karsten(x, cards) for x in decks], number=1)
+    print(f'  deck scans: {elapsed * 1000:.1f} ms')
+    profiles = {x: KarstenProfile(y) for x, y in cards.items()}
+    elapsed = timeit(lambda: [karsten_requirements(x, profiles) for x in decks], number=1)
+    print(f'  profiles: {elapsed * 1000:.1f} ms')
+
+
+def run_benchmarks():
+    """Run the benchmarks."""
+    benchmark_deck_analysis()
+    benchmark_deck_matrix()
+    benchmark_ordered_popularity()
+    benchmark_rule_index()
+    benchmark_parallel_tagging()
+    benchmark_legality_index()
+    benchmark_karsten()
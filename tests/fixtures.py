@@ -0,0 +1,262 @@
+import heapq
+import random
+from collections import Counter
+from itertools import chain
+from math import ceil
+
+from shared.card_enums import card_types, format_popularity, popularity_multiplier
+from shared.helpers.deckcheck.karsten import all_costs, karsten_combos, requires_colors
+from shared.helpers.tagging.text import _get_parser, comparisons
+from shared.type_defaults import make_card
+from shared.types.card import Card
+from shared.types.competition import Competition
+from shared.types.deck import Deck
+from shared.types.deck_tag import DeckTag, TextDeckRule
+
+
+def make_archetype(deck_count, card_count=120, seed=0):
+    """Create a synthetic archetype: a shared core and a random tail of cards in each deck."""
+    rng = random.Random(seed)
+    cards = {}
+    for i in range(card_count):
+        card = make_card(f'Card {i}')
+        card.main_type = card_types[i % len(card_types)]
+        cards[card.name] = card
+    names = list(cards) + ['Unknown Card']
+    decks = []
+    for i in range(deck_count):
+        deck = Deck()
+        deck.deck_id = str(i)
+        deck.mainboard = {x: rng.randint(1, 4) for x in names[:8] + rng.sample(names, 12)}
+        deck.sideboard = {x: rng.randint(1, 3) for x in rng.sample(names, 5)}
+        deck.wins = rng.randint(0, 5)
+        deck.losses = rng.randint(0, 5)
+        decks.append(deck)
+    return decks, cards
+
+
+def reference_analysis(decks, cards, threshold):
+    """The per-type implementation that analyze_decks replaced, kept to check the results."""
+    def analyze(cards_to_load, attr):
+        result = []
+        for card_name, card_def, s_decks in sorted(cards_to_load, key=lambda u: -len(u[2])):
+            card_count = sum([getattr(x, attr).get(card_name, 0) for x in s_decks])
+            wins = sum([x.wins for x in s_decks])
+            losses = sum([x.losses for x in s_decks])
+            result.append((card_name, len(s_decks), card_count, round(card_count / len(s_decks), 2), wins, losses,
+                           round(wins * 100 / max(1, wins + losses), 2)))
+        return result
+
+    deck_count = len(decks)
+    analysis = []
+    for ct in chain(card_types[1:-1], ['land']):
+        cards_dict = {x: (y, [z for z in decks if x in z.mainboard]) for x, y in cards.items() if y.main_type == ct}
+        count_of_this = sum([z.mainboard.get(x, 0) for z in decks for x, y in cards.items() if y.main_type == ct])
+        cards_to_load = [(x, y[0], y[1]) for x, y in cards_dict.items() if len(y[1]) >= deck_count * threshold]
+        if cards_to_load:
+            analysis.append((ct.title(), round(count_of_this / deck_count, 2), analyze(cards_to_load, 'mainboard')))
+
+    sb_dict = {x: (y, [z for z in decks if x in z.sideboard]) for x, y in cards.items()}
+    sb_to_load = [(x, y[0], y[1]) for x, y in sb_dict.items() if len(y[1]) >= deck_count * threshold]
+    if sb_to_load:
+        count_of_this = sum([y for z in decks for y in z.sideboard.values()])
+        analysis.append(('Sideboard', round(count_of_this / deck_count, 2), analyze(sb_to_load, 'sideboard')))
+    return analysis
+
+
+def make_random_metagame(deck_count, card_count=400, competition_count=60, tag_count=40, seed=0):
+    """Create synthetic decks spread over three formats, with some decks outside of competitions."""
+    rng = random.Random(seed)
+    cards = {}
+    for i in range(card_count):
+        card = make_card(f'Card {i}')
+        card.main_type = 'land' if i % 10 == 0 else 'creature'
+        card.types = ['Basic', 'Land'] if i % 20 == 0 else ['Creature']
+        cards[card.name] = card
+    names = list(cards) + ['Unknown Card']
+    lands = [x for x, y in cards.items() if y.main_type == 'land']
+    competitions = [Competition().load({'competition_id': f'c{i}', 'format': f'f{i % 3}'})
+                    for i in range(competition_count)]
+    tags = [DeckTag().load({'tag_id': f't{i}', 'name': f'Tag {i}'}) for i in range(tag_count)]
+    decks = []
+    for i in range(deck_count):
+        deck = Deck()
+        deck.deck_id = str(i)
+        deck.name = f'Deck {i}'
+        deck.format = f'f{i % 3}'
+        deck.competition = f'c{rng.randrange(competition_count)}' if i % 17 else ''
+        if i % 101 == 0:
+            deck.mainboard = {}
+        elif i % 97 == 0:
+            deck.mainboard = {x: rng.randint(1, 4) for x in rng.sample(lands + ['Unknown Card'], 5)}
+        else:
+            deck.mainboard = {x: rng.randint(1, 4) for x in rng.sample(names, 15)}
+        if not deck.competition:  # the reference fails on cards that are only played outside of competitions
+            deck.mainboard = {x: y for x, y in deck.mainboard.items() if x in names[:30]}
+        deck.tags = rng.choices([x.tag_id for x in tags], k=rng.randint(0, 3))
+        deck.wins = rng.randint(0, 5)
+        deck.losses = rng.randint(0, 5)
+        decks.append(deck)
+    return decks, cards, competitions, tags
+
+
+def reference_popularity(fmt, all_cards, all_decks, all_competitions, all_tags):
+    """The dict-based run_popularity that the deck matrix replaced, kept to check the results."""
+    def normalize(counts):
+        max_popularity = max(counts.values()) + 1 if len(counts) > 0 else 1
+        return {x: c / max_popularity for x, c in counts.items()}
+
+    def weights(decks):
+        counts = Counter()
+        buckets = {}
+        for i in decks:
+            if i.competition:
+                for j, c in i.mainboard.items():
+                    if j in all_cards and all_cards[j].main_type != 'land':
+                        for b in [counts, buckets.setdefault(i.competition, Counter())] + \
+                                [buckets.setdefault(('tag', x), Counter()) for x in dict.fromkeys(i.tags)]:
+                            b[j] += c * (i.wins * 2 + i.losses + 1)
+        return counts, buckets
+
+    def top(bucket):
+        return heapq.nsmallest(3, normalize(bucket).items(),
+                               key=lambda x: card_popularities[x[0]] * popularity_multiplier - x[1])
+
+    decks_from_format = [x for x in all_decks if x.format == fmt] if fmt != '_all' else all_decks
+    format_counts, buckets = weights(decks_from_format)
+    card_popularities = normalize(format_counts)
+    total_popularities = normalize(weights(all_decks)[0])
+    comp_pop = [(i.competition_id, c, val, card_popularities[c])
+                for i in all_competitions for c, val in top(buckets.get(i.competition_id, {}))]
+    dt_pop = [(j.tag_id, c, val, card_popularities[c])
+              for j in all_tags for c, val in top(buckets.get(('tag', j.tag_id), {}))]
+    fp = None
+    if fmt != '_all' and card_popularities:
+        fp = min(card_popularities.items(), key=lambda x: total_popularities[x[0]] * format_popularity - x[1])
+
+    tops = {}
+    if fmt != '_all':
+        for k in decks_from_format:
+            nonland = [x for x in k.mainboard.items() if x[0] in all_cards and all_cards[x[0]].main_type != 'land']
+            if nonland:
+                tops[k.deck_id] = max(nonland, key=lambda u: u[1] / 2 - card_popularities[u[0]])[0]
+            elif k.mainboard:
+                tops[k.deck_id] = max(k.mainboard.items(), key=lambda u: (
+                    100 if u[0] not in all_cards or 'Basic' in all_cards[u[0]].types else 0) + u[1])[0]
+    return comp_pop, dt_pop, fp, tops
+
+
+def reference_parse(rule):
+    if not rule:
+        return []
+    try:
+        return [_get_parser().parse_string(x) for x in rule.split('\n')]
+    except Exception:
+        return []
+
+
+def reference_text_rule_applies(d, parsed):
+    """The token-walking evaluator that the compiled text rules replaced, kept to check the results."""
+    if not parsed:
+        return False
+
+    for i in parsed:
+        current_sum = 0
+        current_mode = -1
+        comp = ''
+        for j in i:
+            if j == '*':
+                current_mode = 0
+            elif j == 'side':
+                current_mode = 1
+            elif isinstance(j, str) and j not in comparisons:
+                j = j.strip()
+                current_sum += (d.mainboard.get(j, 0) if current_mode <= 0 else 0)
+                current_sum += (d.sideboard.get(j, 0) if current_mode >= 0 else 0)
+                current_mode = -1
+            elif j in comparisons:
+                comp = j
+            elif not comp:
+                return False
+            else:
+                if (comp == '=' and current_sum != j) or (comp == '>' and current_sum <= j) or \
+                        (comp == '>=' and current_sum < j) or (comp == '<' and current_sum >= j) or \
+                        (comp == '<=' and current_sum > j):
+                    return False
+    return True
+
+
+def make_rules_and_decks(rule_count, deck_count, card_count=60, seed=0):
+    """Create random text rules (including invalid and empty ones) and random decks over the same cards."""
+    rng = random.Random(seed)
+    names = [f'Card {i}' for i in range(card_count)] + ["Sorin's Thirst", 'Fire // Ice']
+    texts = ['', 'Card 1 >= ', '>= 2', 'Card 1 >= 1\n']
+    for _ in range(rule_count):
+        lines = []
+        for _ in range(rng.choice([1, 1, 1, 2, 3])):
+            cards = [rng.choice(['', '', 'side.', '*.', 'side.*.', '*.side.']) + rng.choice(names)
+                     for _ in range(rng.randint(1, 3))]
+            lines.append(f'{rng.choice(["", " "]).join([" + ".join(cards)])} {rng.choice(comparisons)} '
+                         f'{rng.randint(0, 5)}')
+        texts.append('\n'.join(lines))
+    rules = []
+    for i, x in enumerate(texts):
+        rule = TextDeckRule()
+        rule.rule_id = f'r{i}'
+        rule.tag_id = f't{i % 7}'
+        rule.text = x
+        rules.append(rule)
+
+    decks = []
+    for i in range(deck_count):
+        d = Deck()
+        d.deck_id = str(i)
+        d.mainboard = {x: rng.randint(1, 4) for x in rng.sample(names, rng.randint(0, 12))}
+        d.sideboard = {x: rng.randint(1, 3) for x in rng.sample(names, rng.randint(0, 5))}
+        decks.append(d)
+    return rules, decks
+
+
+def make_deck(fmt, mainboard, sideboard):
+    d = Deck()
+    d.format = fmt
+    d.mainboard = mainboard
+    d.sideboard = sideboard
+    return d
+
+
+def make_karsten_card(name, layout, faces, types, produces):
+    mana_cost = {}
+    for x in faces:
+        for k, v in x.items():
+            mana_cost[k] = mana_cost.get(k, 0) + v
+    if layout != 'split':
+        mana_cost = faces[0]
+    return Card().load({
+        'name': name, 'card_id': name, 'layout': layout, 'oracle': '', 'types': types, 'produces': produces,
+        'mana_cost': mana_cost, 'mana_value': sum(mana_cost.values()),
+        'faces': [{'name': f'{name} {i}', 'mana_cost': x, 'types': types} for i, x in enumerate(faces)]
+    })
+
+
+def reference_karsten(d, cards):
+    """The deck scan for every color that the Karsten profiles replaced, kept to check the results."""
+    answer = []
+    multiplier = max(1.0, (sum(d.mainboard.values()) / 60) ** 1.2)
+    for i in karsten_combos:
+        colors = i.split('/')
+        for j in range(3):
+            requirement_cards = [x for x in d.mainboard if requires_colors(cards.get(x), i, j + 1)] + \
+                                [f'{x} (Sideboard)' for x in d.sideboard if x not in d.mainboard and
+                                 requires_colors(cards.get(x), i, j + 1)]
+            if not requirement_cards:
+                continue
+            producers = [(x, z) for x, z in d.mainboard.items() if cards[x].mana_value <= 3 and
+                         [y for y in colors if y in cards[x].produces] and
+                         sum([y for u, y in cards[x].mana_cost.items() if u in colors]) < j + 1]
+            creatures = sum([z for x, z in producers if 'Creature' in cards[x].types])
+            noncreatures = sum([z for x, z in producers if 'Creature' not in cards[x].types])
+            for k in requirement_cards:
+                mana_value = min(cards[k.split(' (')[0]].mana_value, 6) - 1
+                answer.append((k, i, round(all_costs[j][mana_value] * multiplier), ceil(creatures / 2 + noncreatures)))
+    return answer
@@ -1,6 +1,13 @@
 from unittest import TestResult, TestSuite
 
+from tests.unittests.bulk_writer import TestBulkWriter
+from tests.unittests.deck_analysis import TestDeckAnalysis
+from tests.unittests.deck_check import TestDeckCheck
+from tests.unittests.deck_matrix import TestDeckMatrix
+from tests.unittests.job_report import TestJobReport
 from tests.unittests.mana import TestMana
+from tests.unittests.payload import TestPayload
+from tests.unittests.tagging import TestTagging
 
 
 def run_tests():
@@ -9,6 +16,13 @@ def run_tests():
     suite = TestSuite()
 
     suite.addTest(TestMana('run_all'))
+    suite.addTest(TestDeckAnalysis('run_all'))
+    suite.addTest(TestPayload('run_all'))
+    suite.addTest(TestDeckMatrix('run_all'))
+    suite.addTest(TestBulkWriter('run_all'))
+    suite.addTest(TestJobReport('run_all'))
+    suite.addTest(TestTagging('run_all'))
+    suite.addTest(TestDeckCheck('run_all'))
     suite.run(result)
 
     return result
@@ -0,0 +1,65 @@
+from unittest import TestCase
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from shared.helpers.bulk_writer import BulkWriter, bulk_insert
+
+
+class RecordingCollection:
+    """A collection that records the chunks written into it and fails as instructed."""
+
+    name = 'recording'
+
+    def __init__(self, failures=()):
+        self.chunks = []
+        self.failures = list(failures)
+
+    def bulk_write(self, requests, ordered=True):
+        assert not ordered
+        if self.failures:
+            raise self.failures.pop(0)
+        self.chunks.append(list(requests))
+
+
+def duplicate_error(index):
+    return BulkWriteError({'writeErrors': [{'index': index, 'code': 11000, 'errmsg': 'duplicate key'}],
+                           'writeConcernErrors': []})
+
+
+class TestBulkWriter(TestCase):
+    def run_all(self):
+        self.test_chunks()
+        self.test_retries()
+
+    def test_chunks(self):
+        collection = RecordingCollection()
+        documents = ({'i': i} for i in range(25))
+        self.assertEqual(bulk_insert(collection, documents, chunk_size=10), 25)
+        self.assertEqual([len(x) for x in collection.chunks], [10, 10, 5])
+        self.assertTrue(all(isinstance(x, InsertOne) for x in collection.chunks[0]))
+        self.assertEqual(bulk_insert(collection, []), 0)
+        self.assertEqual(len(collection.chunks), 3)
+
+    def test_retries(self):
+        collection = RecordingCollection([AutoReconnect('connection lost')])
+        with self.assertLogs('dreadrise.bulk', 'WARNING'):
+            with BulkWriter(collection, chunk_size=5, retry_delay=0) as writer:
+                writer.write_all(UpdateOne({'i': i}, {'$set': {'x': 1}}) for i in range(5))
+        self.assertEqual(writer.written, 5)
+        self.assertEqual(len(collection.chunks), 1)
+
+        # inserts from the failed attempt are duplicates on the retry
+        collection = RecordingCollection([AutoReconnect('connection lost'), duplicate_error(1)])
+        with self.assertLogs('dreadrise.bulk', 'WARNING'):
+            self.assertEqual(bulk_insert(collection, [{'i': 0}, {'i': 1}]), 2)
+
+        collection = RecordingCollection([duplicate_error(0)])
+        with self.assertRaises(BulkWriteError):
+            bulk_insert(collection, [{'i': 0}])
+
+        writer = BulkWriter(collection, retries=2, retry_delay=0)
+        collection.failures = [AutoReconnect('connection lost')] * 3
+        writer.insert({'i': 0})
+        with self.assertLogs('dreadrise.bulk', 'WARNING'), self.assertRaises(AutoReconnect):
+            writer.close()
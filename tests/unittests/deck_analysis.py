@@ -0,0 +1,56 @@
+from unittest import TestCase
+
+from shared.helpers.db_loader import analyze_decks
+from shared.type_defaults import make_card
+from shared.types.deck import Deck
+from tests.fixtures import make_archetype, reference_analysis
+
+
+def make_group():
+    cards = {}
+    for name, main_type in [('Bolt', 'instant'), ('Goblin', 'creature'), ('Elf', 'creature'), ('Mountain', 'land'),
+                            ('Duress', 'sorcery')]:
+        card = make_card(name)
+        card.main_type = main_type
+        cards[name] = card
+    decks = []
+    for mainboard, sideboard, wins, losses in [
+        ({'Bolt': 4, 'Goblin': 4, 'Mountain': 20}, {'Duress': 3, 'Unknown Card': 1}, 3, 1),
+        ({'Bolt': 3, 'Elf': 4, 'Mountain': 18}, {'Bolt': 1}, 1, 2),
+        ({'Goblin': 2, 'Mountain': 22, 'Unknown Card': 4}, {}, 0, 0)
+    ]:
+        deck = Deck()
+        deck.mainboard = mainboard
+        deck.sideboard = sideboard
+        deck.wins = wins
+        deck.losses = losses
+        decks.append(deck)
+    return decks, cards
+
+
+def flatten_analysis(analysis):
+    return [(sta.type, sta.average_count, [(x.card_name, x.deck_count, x.card_count, x.average, x.wins, x.losses,
+                                            x.winrate) for x in sta.sca]) for sta in analysis]
+
+
+class TestDeckAnalysis(TestCase):
+    def run_all(self):
+        self.test_analysis()
+        self.test_reference_parity()
+
+    def test_analysis(self):
+        decks, cards = make_group()
+        self.assertEqual(flatten_analysis(analyze_decks(decks, cards, 0.3)), [
+            ('Creature', 3.33, [('Goblin', 2, 6, 3.0, 3, 1, 75.0), ('Elf', 1, 4, 4.0, 1, 2, 33.33)]),
+            ('Instant', 2.33, [('Bolt', 2, 7, 3.5, 4, 3, 57.14)]),
+            ('Land', 20.0, [('Mountain', 3, 60, 20.0, 4, 3, 57.14)]),
+            ('Sideboard', 1.67, [('Bolt', 1, 1, 1.0, 1, 2, 33.33), ('Duress', 1, 3, 3.0, 3, 1, 75.0)])
+        ])
+        self.assertEqual(flatten_analysis(analyze_decks(decks, cards, 1)),
+                         [('Land', 20.0, [('Mountain', 3, 60, 20.0, 4, 3, 57.14)])])
+
+    def test_reference_parity(self):
+        decks, cards = make_archetype(60)
+        for threshold in (0.05, 0.2):
+            self.assertEqual(flatten_analysis(analyze_decks(decks, cards, threshold)),
+                             reference_analysis(decks, cards, threshold))
@@ -0,0 +1,155 @@
+import random
+from unittest import TestCase
+from unittest.mock import patch
+
+from shared.helpers.deckcheck import cache
+from shared.helpers.deckcheck.cache import ResultCache, cached_deck_checks, deck_content_hash
+from shared.helpers.deckcheck.core import deck_check, deck_check_statuses
+from shared.helpers.deckcheck.default import check_general_legality, check_max_count, check_restricted_list
+from shared.helpers.deckcheck.karsten import KarstenProfile, karsten_requirements
+from shared.helpers.deckcheck.legality import IndexedCards, LegalityIndex
+from tests.fixtures import make_deck, make_karsten_card, reference_karsten
+
+
+class TestDeckCheck(TestCase):
+    def run_all(self):
+        self.test_content_hash()
+        self.test_result_cache()
+        self.test_cached_checks()
+        self.test_legality_index()
+        self.test_indexed_checks()
+        self.test_karsten()
+        self.test_karsten_parity()
+
+    def test_content_hash(self):
+        d = make_deck('f', {'A': 4, 'B': 2}, {'C': 1})
+        self.assertEqual(deck_content_hash(d), deck_content_hash(make_deck('f', {'B': 2, 'A': 4}, {'C': 1})))
+        self.assertNotEqual(deck_content_hash(d), deck_content_hash(make_deck('g', {'A': 4, 'B': 2}, {'C': 1})))
+        self.assertNotEqual(deck_content_hash(d), deck_content_hash(make_deck('f', {'A': 4, 'B': 2, 'C': 1}, {})))
+        self.assertNotEqual(deck_content_hash(d), deck_content_hash(make_deck('f', {'A': 4, 'B': 3}, {'C': 1})))
+
+    def test_result_cache(self):
+        results = ResultCache(2)
+        result = (deck_check_statuses[0], [], [], [])
+        results.put('a', result)
+        results.put('b', result)
+        self.assertIs(results.get('a'), result)
+        results.put('c', result)  # drops b, the least recently used
+        self.assertIsNone(results.get('b'))
+        self.assertIsNotNone(results.get('a'))
+        self.assertEqual((results.hits, results.misses), (2, 1))
+
+    def test_cached_checks(self):
+        checked = []
+
+        def checker(d, cards):
+            checked.append(d)
+            return deck_check_statuses[2 if len(d.mainboard) > 1 else 0], 'checked'
+
+        indexes = [LegalityIndex.build([{'name': 'A'}, {'name': 'B'}], 1)]
+        decks = [make_deck('f', {'A': 1, 'B': 1}, {}), make_deck('f', {'A': 1}, {}),
+                 make_deck('f', {'B': 1, 'A': 1}, {})]
+        with patch.object(cache, 'check_cache', ResultCache(10)), \
+                patch.object(cache, 'get_legality_index', lambda dist: indexes[-1]):
+            first = cached_deck_checks('msem', decks, [checker])
+            expected = [deck_check_statuses[2], deck_check_statuses[0], deck_check_statuses[2]]
+            self.assertEqual([x[0] for x in first], expected)
+            self.assertEqual(len(checked), 3)
+
+            self.assertEqual(cached_deck_checks('msem', decks[1:], [checker]), first[1:])
+            self.assertEqual(len(checked), 3)
+
+            indexes.append(LegalityIndex.build([{'name': 'A'}, {'name': 'B'}], 2))  # the cards were scraped again
+            cached_deck_checks('msem', decks[:1], [checker])
+            self.assertEqual(len(checked), 4)
+
+    def test_legality_index(self):
+        cards = [
+            {'name': 'A', 'legality': {'f': 'legal', 'g': 'banned'}, 'categories': ['lurrus', 'lurrus'],
+             'types': 'Creature — Cat', 'colors': ['white'], 'max_count': 4},
+            {'name': 'B', 'legality': {'f': 'restricted'}, 'categories': [], 'types': 'Land', 'colors': []},
+            {'name': 'C', 'legality': {'f': 'not_legal', 'g': 'legal'}, 'categories': ['lurrus', 'yorion'],
+             'types': 'Instant', 'colors': ['blue', 'red'], 'max_count': 1}
+        ]
+        index = LegalityIndex.build(cards, 3)
+        self.assertEqual((index.generation, index.ids), (3, {'A': 0, 'B': 1, 'C': 2}))
+        for c in cards:
+            for fmt in ['f', 'g', 'h']:
+                self.assertEqual(index.get_legality(c['name'], fmt), c['legality'].get(fmt, ''))
+            for category in ['lurrus', 'yorion', 'zirda']:
+                self.assertEqual(index.in_category(c['name'], category), category in c['categories'])
+        self.assertEqual(index.get_legality('D', 'f'), '')
+        self.assertFalse(index.in_category('D', 'lurrus'))
+
+        view = IndexedCards('msem', index, [make_deck('f', {'A': 1, 'D': 1}, {'C': 1})])
+        self.assertEqual(list(view), ['A', 'C'])
+        self.assertNotIn('B', view)
+        self.assertEqual((view.max_count('A'), view.max_count('C')), (4, 1))
+        self.assertEqual((view.types('A'), view.types('D')), ('Creature — Cat', ''))
+        self.assertEqual((view.colors('C'), view.colors('D')), (frozenset(['blue', 'red']), frozenset()))
+
+        # an unknown legality is treated as a missing one instead of failing the whole index
+        with self.assertLogs('dreadrise.deckcheck.legality', 'WARNING'):
+            odd = LegalityIndex.build([{'name': 'A', 'legality': {'f': 'suspended', 'g': 'legal'}}])
+        self.assertEqual((odd.get_legality('A', 'f'), odd.get_legality('A', 'g')), ('', 'legal'))
+
+    def test_indexed_checks(self):
+        index = LegalityIndex.build([
+            {'name': 'A', 'legality': {'f': 'legal'}},
+            {'name': 'B', 'legality': {'f': 'restricted'}},
+            {'name': 'C', 'legality': {'f': 'banned'}, 'max_count': 1},
+            {'name': 'E', 'legality': {}}
+        ])
+        checkers = [check_general_legality, check_restricted_list, check_max_count]
+        d = make_deck('f', {'A': 4, 'B': 1, 'E': 1}, {})
+        self.assertEqual(deck_check('msem', d, checkers, IndexedCards('msem', index, [d]))[0], deck_check_statuses[0])
+
+        d = make_deck('f', {'A': 5, 'B': 1, 'C': 2, 'D': 1}, {'B': 1})
+        _, errors, _, _ = deck_check('msem', d, checkers, IndexedCards('msem', index, [d]))
+        self.assertEqual(errors, ['The following cards are illegal: C, D',
+                                  'The following cards are restricted but are present in more than 1 copy: B, B',
+                                  'The following cards have too many copies of them: A, C, D'])
+
+    def test_karsten(self):
+        cards = {x[0]: make_karsten_card(*x) for x in [
+            ('Counterspell', 'normal', [{'blue': 2}], 'Instant', []),
+            ('Lightning Helix', 'normal', [{'white': 1, 'red': 1}], 'Instant', []),
+            ('Fire // Ice', 'split', [{'red': 1, 'any': 1}, {'blue': 1, 'any': 1}], 'Instant', []),
+            ('Brazen Borrower', 'adventure', [{'blue': 2, 'any': 1}, {'blue': 1, 'any': 1}], 'Creature', []),
+            ('Sprite', 'normal', [{'white/blue': 2, 'any': 1}], 'Creature', []),
+            ('Birds', 'normal', [{'green': 1}], 'Creature', ['white', 'blue', 'black', 'red', 'green']),
+            ('Signet', 'normal', [{'any': 2}], 'Artifact', ['blue', 'red']),
+            ('Island', 'normal', [{}], 'Land', ['blue'])
+        ]}
+        profiles = {x: KarstenProfile(y) for x, y in cards.items()}
+        d = make_deck('f', {'Counterspell': 4, 'Lightning Helix': 2, 'Fire // Ice': 2, 'Birds': 4, 'Signet': 2,
+                            'Island': 20}, {'Brazen Borrower': 2, 'Counterspell': 1, 'Sprite': 1})
+        self.assertEqual(karsten_requirements(d, profiles), [
+            ('Lightning Helix', 'white', 13, 2), ('Fire // Ice', 'blue', 10, 24),
+            ('Brazen Borrower (Sideboard)', 'blue', 11, 24), ('Counterspell', 'blue', 20, 24),
+            ('Brazen Borrower (Sideboard)', 'blue', 18, 24), ('Lightning Helix', 'red', 13, 4),
+            ('Fire // Ice', 'red', 10, 4), ('Birds', 'green', 14, 0), ('Sprite (Sideboard)', 'white/blue', 18, 24),
+            ('Lightning Helix', 'red/white', 20, 4)
+        ])
+        # a deck of more than 60 cards needs more sources
+        d = make_deck('f', {'Counterspell': 4, 'Sprite': 4, 'Island': 72}, {})
+        self.assertEqual(karsten_requirements(d, profiles),
+                         [('Counterspell', 'blue', 28, 72), ('Sprite', 'white/blue', 25, 72)])
+
+    def test_karsten_parity(self):
+        rng = random.Random(0)
+        symbols = ['white', 'blue', 'black', 'red', 'green', 'colorless', 'snow', 'white/blue', 'black/green', 'any']
+        produced = ['white', 'blue', 'black', 'red', 'green', 'colorless', 'snow']
+        cards = {}
+        for i in range(80):
+            layout = rng.choice(['normal', 'normal', 'split', 'adventure', 'modal_dfc', 'transform'])
+            faces = [{x: rng.randint(1, 4) for x in rng.sample(symbols, rng.randint(0, 3))}
+                     for _ in range(1 if layout == 'normal' else 2)]
+            types = rng.choice(['Creature', 'Land', 'Instant'])
+            produces = rng.sample(produced, rng.choice([0, 0, 1, 2]))
+            cards[f'card {i}'] = make_karsten_card(f'card {i}', layout, faces, types, produces)
+        profiles = {x: KarstenProfile(y) for x, y in cards.items()}
+        for i in range(40):
+            d = make_deck('f', {x: rng.randint(1, 4) for x in rng.sample(list(cards), rng.randint(1, 30))},
+                          {x: rng.randint(1, 3) for x in rng.sample(list(cards), rng.randint(0, 8))})
+            self.assertEqual(karsten_requirements(d, profiles), reference_karsten(d, cards))
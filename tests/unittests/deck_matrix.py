@@ -0,0 +1,166 @@
+from unittest import TestCase
+
+import numpy as np
+
+from shared.helpers.caching.playability import run_playability
+from shared.helpers.caching.popularity import count, prefix_counts, run_popularity
+from shared.helpers.caching.tag_covers import run_tag_covers
+from shared.helpers.deck_matrix import DeckMatrix
+from shared.type_defaults import make_card
+from shared.types.caching import DeckTagPopularity
+from shared.types.competition import Competition
+from shared.types.deck import Deck
+from shared.types.deck_tag import DeckTag
+from tests.fixtures import make_random_metagame, reference_popularity
+
+
+def make_metagame():
+    cards = {}
+    for name, main_type, types in [('Bolt', 'instant', ['Instant']), ('Goblin', 'creature', ['Creature']),
+                                   ('Elf', 'creature', ['Creature']), ('Mountain', 'land', ['Basic', 'Land']),
+                                   ('Temple', 'land', ['Land'])]:
+        card = make_card(name)
+        card.main_type = main_type
+        card.types = types
+        cards[name] = card
+    competitions = [Competition().load({'competition_id': 'c0', 'format': 'f0'}),
+                    Competition().load({'competition_id': 'c1', 'format': 'f1'})]
+    tags = [DeckTag().load({'tag_id': f't{i}', 'name': f'Tag {i}'}) for i in range(3)]
+    decks = []
+    for i, (fmt, competition, mainboard, deck_tags, wins, losses) in enumerate([
+        ('f0', 'c0', {'Bolt': 4, 'Goblin': 4, 'Mountain': 20}, ['t0'], 3, 1),
+        ('f0', 'c0', {'Bolt': 2, 'Elf': 4, 'Temple': 4}, ['t1', 't0'], 1, 2),
+        ('f1', 'c1', {'Goblin': 3, 'Elf': 1, 'Mountain': 10}, ['t0', 't0'], 2, 2),
+        ('f1', '', {'Goblin': 1}, [], 0, 0),
+        ('f0', 'c0', {'Mountain': 20, 'Temple': 2}, ['t2'], 0, 3),
+        ('f1', 'c1', {}, ['t1'], 1, 0)
+    ]):
+        deck = Deck()
+        deck.deck_id = str(i)
+        deck.format = fmt
+        deck.competition = competition
+        deck.mainboard = mainboard
+        deck.tags = deck_tags
+        deck.wins = wins
+        deck.losses = losses
+        decks.append(deck)
+    return decks, cards, competitions, tags
+
+
+def flatten_popularity(result):
+    comp_pop, dt_pop, fp, tops = result
+    return ([(x.competition, x.card_name, x.self_popularity, x.total_popularity) for x in comp_pop],
+            [(x.deck_tag, x.card_name, x.self_popularity, x.total_popularity) for x in dt_pop],
+            (fp.card_name, fp.self_popularity) if hasattr(fp, 'card_name') else None, tops)
+
+
+class TestDeckMatrix(TestCase):
+    def run_all(self):
+        self.test_build()
+        self.test_subset()
+        self.test_split_by_format()
+        self.test_popularity()
+        self.test_popularity_parity()
+        self.test_playability()
+        self.test_tag_covers()
+
+    def test_build(self):
+        decks, _, _, _ = make_metagame()
+        dm = DeckMatrix.build(decks)
+        self.assertEqual(dm.deck_count, len(decks))
+        for i, d in enumerate(decks):
+            row = slice(dm.indptr[i], dm.indptr[i + 1])
+            self.assertEqual(dict(zip([dm.card_names[x] for x in dm.cards[row]], dm.counts[row].tolist())),
+                             d.mainboard)
+        self.assertEqual([[dm.tag_names[x] for x in dm.tag_codes[dm.tag_indptr[i]:dm.tag_indptr[i + 1]]]
+                          for i in range(dm.deck_count)], [['t0'], ['t1', 't0'], ['t0'], [], ['t2'], ['t1']])
+        self.assertEqual([dm.tag_names[x] if x >= 0 else None for x in dm.first_tags],
+                         ['t0', 't1', 't0', None, 't2', 't1'])
+
+    def test_subset(self):
+        decks, cards, competitions, tags = make_metagame()
+        dm = DeckMatrix.build(decks)
+        sub = dm.subset(dm.formats != dm.format_names.index('f1'))
+        with self.assertLogs('dreadrise.popularity', 'WARNING'):  # a deck with only lands
+            result = run_popularity('f0', cards, sub, competitions, tags)
+        self.assertEqual(flatten_popularity(result), (
+            [('c0', 'Bolt', 42 / 43, 42 / 43), ('c0', 'Goblin', 32 / 43, 32 / 43), ('c0', 'Elf', 20 / 43, 20 / 43)],
+            [('t0', 'Bolt', 42 / 43, 42 / 43), ('t0', 'Goblin', 32 / 43, 32 / 43), ('t0', 'Elf', 20 / 43, 20 / 43),
+             ('t1', 'Elf', 20 / 21, 20 / 43), ('t1', 'Bolt', 10 / 21, 42 / 43)],
+            ('Elf', 20 / 43), {'0': 'Goblin', '1': 'Elf', '4': 'Mountain'}))
+
+    def test_split_by_format(self):
+        decks, cards, _, _ = make_metagame()
+        dm = DeckMatrix.build(decks)
+        split = dm.split_by_format()
+        self.assertEqual(sorted(split), ['f0', 'f1'])
+        self.assertEqual([split[x].deck_ids for x in ('f0', 'f1')], [['0', '1', '4'], ['2', '3', '5']])
+        for fmt, sub in split.items():
+            expected = dm.subset(dm.in_format(fmt))
+            for x in ('wins', 'competitions', 'first_tags', 'indptr', 'cards', 'counts', 'entry_decks',
+                      'tag_indptr', 'tag_codes'):
+                self.assertTrue(np.array_equal(getattr(sub, x), getattr(expected, x)), x)
+
+        # a repeated format only counts the formats up to its first occurrence
+        prefixes = prefix_counts(dm, cards, ['f1', 'missing', 'f0', 'f1'])
+        self.assertEqual(dm.card_names, ['Bolt', 'Goblin', 'Mountain', 'Elf', 'Temple'])
+        self.assertEqual({x: y.tolist() for x, y in prefixes.items()}, {
+            'f1': [0, 21 / 22, 0, 7 / 22, 0],
+            'missing': [0, 21 / 22, 0, 7 / 22, 0],
+            'f0': [7 / 9, 53 / 54, 0, 1 / 2, 0]
+        })
+
+    def test_popularity(self):
+        decks, cards, competitions, tags = make_metagame()
+        dm = DeckMatrix.build(decks)
+        total = count(dm, cards)
+        with self.assertLogs('dreadrise.popularity', 'WARNING'):  # decks with only lands or an empty mainboard
+            for x in (None, total):
+                self.assertEqual(flatten_popularity(run_popularity('f1', cards, dm, competitions, tags, x)), (
+                    [('c1', 'Goblin', 21 / 22, 21 / 22), ('c1', 'Elf', 7 / 22, 7 / 22)],
+                    [('t0', 'Goblin', 21 / 22, 21 / 22), ('t0', 'Elf', 7 / 22, 7 / 22)],
+                    ('Elf', 7 / 22), {'2': 'Goblin', '3': 'Goblin'}))
+                self.assertEqual(flatten_popularity(run_popularity('_all', cards, dm, competitions, tags, x)), (
+                    [('c0', 'Bolt', 42 / 43, 7 / 9), ('c0', 'Elf', 20 / 43, 1 / 2), ('c0', 'Goblin', 32 / 43, 53 / 54),
+                     ('c1', 'Goblin', 21 / 22, 53 / 54), ('c1', 'Elf', 7 / 22, 1 / 2)],
+                    [('t0', 'Goblin', 53 / 54, 53 / 54), ('t0', 'Bolt', 7 / 9, 7 / 9), ('t0', 'Elf', 1 / 2, 1 / 2),
+                     ('t1', 'Elf', 20 / 21, 1 / 2), ('t1', 'Bolt', 10 / 21, 7 / 9)],
+                    None, {}))
+                self.assertEqual(flatten_popularity(run_popularity('missing', cards, dm, competitions, tags, x)),
+                                 ([], [], None, {}))
+
+    def test_popularity_parity(self):
+        decks, cards, competitions, tags = make_random_metagame(600)
+        dm = DeckMatrix.build(decks)
+        total = count(dm, cards)
+        with self.assertLogs('dreadrise.popularity', 'WARNING'):  # decks with only lands or an empty mainboard
+            for fmt in ('f0', '_all'):
+                expected = reference_popularity(fmt, cards, decks, competitions, tags)
+                self.assertEqual(flatten_popularity(run_popularity(fmt, cards, dm, competitions, tags)), expected)
+                self.assertEqual(flatten_popularity(run_popularity(fmt, cards, dm, competitions, tags, total)),
+                                 expected)
+
+    def test_playability(self):
+        decks, cards, _, _ = make_metagame()
+        dm = DeckMatrix.build(decks)
+        recent = dm.subset(np.arange(dm.deck_count) % 2 == 0)
+        self.assertEqual([(x.card_name, x.deck_count, x.winrate) for x in run_playability('f0', cards, dm)], [
+            ('Bolt', 2, 4 / 7), ('Goblin', 1, 3 / 4), ('Mountain', 2, 3 / 7), ('Elf', 1, 1 / 3), ('Temple', 2, 1 / 6)
+        ])
+        self.assertEqual([(x.card_name, x.deck_count, x.winrate) for x in run_playability('_all', cards, recent)], [
+            ('Bolt', 1, 3 / 4), ('Goblin', 2, 5 / 8), ('Mountain', 3, 5 / 11), ('Elf', 1, 1 / 2), ('Temple', 1, 0.0)
+        ])
+
+    def test_tag_covers(self):
+        decks, _, _, tags = make_metagame()
+        dm = DeckMatrix.build(decks)
+        pops = []
+        for x in tags[:2]:  # tags without popular cards are skipped
+            dtp = DeckTagPopularity()
+            dtp.deck_tag = x.tag_id
+            dtp.card_name = 'Bolt'
+            pops.append(dtp)
+        for fmt, expected in [('f0', [('t0', 1, 3, 1), ('t1', 1, 1, 2)]), ('_all', [('t0', 2, 5, 3), ('t1', 2, 2, 2)])]:
+            with self.assertLogs('dreadrise.popularity.tags', 'WARNING'):
+                covers = run_tag_covers(fmt, dm, tags, pops)
+            self.assertEqual([(x.tag, x.deck_count, x.deck_wins, x.deck_losses) for x in covers], expected)
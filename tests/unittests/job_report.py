@@ -0,0 +1,60 @@
+import json
+import os
+import time
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from shared.helpers.job_report import JobReport
+
+
+class RecordingDatabase:
+    """A database whose job_runs collection keeps the inserted documents in a list."""
+
+    def __init__(self):
+        self.job_runs = self
+        self.documents = []
+
+    def insert_one(self, document):
+        self.documents.append(document)
+
+
+class TestJobReport(TestCase):
+    def run_all(self):
+        self.test_phases()
+        self.test_failure()
+
+    def test_phases(self):
+        db = RecordingDatabase()
+        with TemporaryDirectory() as directory, patch('shared.helpers.configuration.get', return_value=directory):
+            with self.assertLogs('dreadrise.jobs', 'INFO'):
+                with JobReport('test_job', db, workers=2) as report:
+                    with report.phase('load') as p:
+                        p.count(10)
+                    for _ in report.iterate('calculate', (time.sleep(0.01) for _ in range(3))):
+                        time.sleep(0.02)  # not part of the phase
+                    with report.phase('load') as p:
+                        p.count(5)
+            files = os.listdir(directory)
+            self.assertEqual(len(files), 1)
+            with open(os.path.join(directory, files[0])) as f:
+                saved = json.load(f)
+
+        self.assertEqual(len(db.documents), 1)
+        self.assertEqual(db.documents[0]['status'], 'success')
+        self.assertEqual(saved['parameters'], {'workers': 2})
+        self.assertEqual([(x['name'], x['documents']) for x in saved['phases']], [('load', 15), ('calculate', 3)])
+        calculate = saved['phases'][1]
+        # only the lower bound, a busy machine can make the sleeps longer
+        self.assertGreaterEqual(calculate['wall_time'], 0.03)
+        self.assertGreater(calculate['peak_rss_mb'], 0)
+
+    def test_failure(self):
+        db = RecordingDatabase()
+        with patch('shared.helpers.configuration.get', return_value=''):
+            with self.assertLogs('dreadrise.jobs', 'INFO'), self.assertRaises(KeyError):
+                with JobReport('failing_job', db) as report:
+                    with report.phase('load'):
+                        raise KeyError('missing')
+        self.assertEqual(db.documents[0]['status'], 'failed')
+        self.assertEqual(db.documents[0]['phases'][0]['name'], 'load')
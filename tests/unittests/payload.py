@@ -0,0 +1,70 @@
+import json
+from unittest import TestCase
+
+from shared.helpers.db_loader import LoadedDeck, PopularCardData, compact_deck_list
+from shared.type_defaults import get_blank_user
+from shared.types.card import Card
+from shared.types.competition import Competition
+from shared.types.deck_tag import DeckTag
+from tests.fixtures import make_archetype
+
+
+def make_full_card(name):
+    face = {'name': name, 'types': 'Creature - Human Wizard', 'oracle': 'Flying\nWhen this enters, draw a card.',
+            'colors': ['blue'], 'cast_colors': ['blue'], 'mana_cost': {'blue': 1, 'any': 2}, 'mana_cost_str': '{2}{U}',
+            'mana_value': 3, 'image': f'https://example.com/{name}.png', 'produces': [], 'power': 2, 'toughness': 2}
+    return Card().load({'name': name, 'card_id': name.lower(), 'layout': 'normal', 'faces': [face],
+                        'oracle': face['oracle'], 'rarities': ['common'], 'sets': ['SET'],
+                        'legality': {'msem': 'legal'}, 'categories': []})
+
+
+def make_deck_list(deck_count):
+    decks, cards = make_archetype(deck_count)
+    cards = {x: make_full_card(x) for x in cards}
+    tags = [DeckTag().load({'tag_id': f'tag{i}', 'name': f'Tag {i}', 'description': '', 'archetype': 'aggro'})
+            for i in range(5)]
+    competition = Competition().load({'competition_id': 'comp', 'name': 'Competition', 'format': 'msem'})
+    loaded = []
+    for i, deck in enumerate(decks):
+        deck.name = f'Deck {i}'
+        deck.author = f'user{i % 20}'
+        deck.format = 'msem'
+        deck.ties = 0
+        deck.tags = [tags[i % 5].tag_id]
+        ld = LoadedDeck()
+        ld.deck = deck
+        ld.card_defs = {x: y for x, y in cards.items() if x in deck.mainboard or x in deck.sideboard}
+        ld.author = get_blank_user(deck.author)
+        ld.tags = [tags[i % 5]]
+        ld.format = 'MSEM'
+        ld.competition = competition
+        loaded.append(ld)
+
+    popular_cards = []
+    for card in list(cards.values())[:10]:
+        pcd = PopularCardData()
+        pcd.card = card
+        popular_cards.append(pcd)
+    return loaded, popular_cards
+
+
+class TestPayload(TestCase):
+    def run_all(self):
+        self.test_payload_size()
+        self.test_interning()
+
+    def test_payload_size(self):
+        decks, popular_cards = make_deck_list(250)
+        v1 = json.dumps({'decks': [x.jsonify() for x in decks], 'popular_cards': [x.jsonify() for x in popular_cards]})
+        v2 = json.dumps(compact_deck_list(decks, popular_cards))
+        self.assertLess(len(v2) * 10, len(v1))
+
+    def test_interning(self):
+        decks, popular_cards = make_deck_list(100)
+        payload = compact_deck_list(decks, popular_cards)
+        self.assertEqual(len(payload['tables']['users']['id']), 20)
+        self.assertEqual(len(payload['tables']['tags']['id']), 5)
+        self.assertEqual(payload['tables']['competitions']['id'], ['comp'])
+        self.assertEqual(len(payload['decks']['deck_id']), 100)
+        self.assertEqual(payload['decks']['author'][21], payload['decks']['author'][1])
+        self.assertEqual(payload['tables']['cards']['name'], [x.card.name for x in popular_cards])
@@ -0,0 +1,235 @@
+import random
+from itertools import chain
+from unittest import TestCase
+
+from shared.card_enums import colors
+from shared.helpers.tagging.color import color_rule_applies
+from shared.helpers.tagging.core import DeckTagger
+from shared.helpers.tagging.index import RuleIndex
+from shared.helpers.tagging.pool import map_chunks
+from shared.helpers.tagging.preview import DeckCardIndex
+from shared.helpers.tagging.retag import candidate_query
+from shared.helpers.tagging.text import COMPILED_RULE_VERSION, _get_parser, compile_rule, text_rule_applies
+from shared.types.card import Card
+from shared.types.deck import Deck
+from shared.types.deck_tag import ColorDeckRule, DeckTag, TextDeckRule
+from tests.fixtures import make_rules_and_decks, reference_parse, reference_text_rule_applies
+
+# each rule with the decks it applies to, the last three rules are invalid
+rule_texts = [
+    ('Card 1 >= 4', ['d0']),
+    ('Card 1 + Card 2 >= 3', ['d0', 'd1']),
+    ('side.Card 1 >= 1', ['d1']),
+    ('*.Card 1 >= 2', ['d0', 'd1']),
+    ('*.side.Card 3 = 1', ['d0']),
+    ('side.*.Card 1 > 1', ['d0', 'd1']),
+    ('Card 2 < 1', ['d2', 'd3']),
+    ("Sorin's Thirst >= 1\nFire // Ice = 0", ['d1']),
+    ('Fire // Ice <= 2\n*.Card 3 = 0', ['d1', 'd2', 'd3']),
+    ('Card 1 >= ', []),
+    ('>= 2', []),
+    ('', [])
+]
+
+
+def make_decks():
+    decks = []
+    for deck_id, mainboard, sideboard in [('d0', {'Card 1': 4, 'Card 2': 2}, {'Card 3': 1}),
+                                          ('d1', {'Card 2': 3, "Sorin's Thirst": 4}, {'Card 1': 2}),
+                                          ('d2', {'Fire // Ice': 2}, {}),
+                                          ('d3', {}, {})]:
+        d = Deck()
+        d.deck_id = deck_id
+        d.mainboard = mainboard
+        d.sideboard = sideboard
+        decks.append(d)
+    return decks
+
+
+def make_rules():
+    rules = []
+    for i, (text, _) in enumerate(rule_texts):
+        rule = TextDeckRule()
+        rule.rule_id = f'r{i}'
+        rule.tag_id = f't{i % 3}'
+        rule.text = text
+        rules.append(rule)
+    return rules
+
+
+class TestTagging(TestCase):
+    def run_all(self):
+        self.test_text_rules()
+        self.test_text_rule_parity()
+        self.test_rule_index()
+        self.test_color_rules()
+        self.test_stored_rules()
+        self.test_parallel_tagging()
+        self.test_candidate_query()
+        self.test_deck_card_index()
+
+    def test_text_rules(self):
+        decks = make_decks()
+        for text, expected in rule_texts[:-3]:
+            compiled = compile_rule(text)
+            self.assertEqual([x.deck_id for x in decks if text_rule_applies(x, compiled)], expected, text)
+        with self.assertLogs('dreadrise.tagging.text', 'ERROR'):
+            self.assertEqual([compile_rule(x) for x, _ in rule_texts[-3:]], [[], [], []])
+
+    def test_text_rule_parity(self):
+        rules, decks = make_rules_and_decks(100, 100)
+        with self.assertLogs('dreadrise.tagging.text', 'ERROR'):  # the invalid rules
+            compiled = [compile_rule(x.text) for x in rules]
+        parsed = [reference_parse(x.text) for x in rules]
+        for d in decks:
+            for rule, clauses, tokens in zip(rules, compiled, parsed):
+                self.assertEqual(text_rule_applies(d, clauses), reference_text_rule_applies(d, tokens), rule.text)
+
+    def test_rule_index(self):
+        with self.assertLogs('dreadrise.tagging.text', 'ERROR'):
+            index = RuleIndex(make_rules())
+        self.assertEqual(index.always, [6, 8])
+        self.assertEqual([[x.rule_id for x in index.matching(d, {})] for d in make_decks()], [
+            ['r0', 'r1', 'r3', 'r4', 'r5'],
+            ['r1', 'r2', 'r3', 'r5', 'r7', 'r8'],
+            ['r6', 'r8'],
+            ['r6', 'r8']
+        ])
+
+        # the index finds the same rules as checking every rule
+        rules, decks = make_rules_and_decks(200, 300, seed=1)
+        with self.assertLogs('dreadrise.tagging.text', 'ERROR'):
+            index = RuleIndex(rules)
+        self.assertLess(len(index.always), len(rules) // 2)
+        for d in decks:
+            self.assertEqual(index.matching(d, {}), [x for x in rules if x.applies_to(d, {})])
+
+    def test_color_rules(self):
+        cards = {}
+        for name, cast_colors in [('Card 1', ['white']), ('Card 2', ['blue']), ('Card 3', []),
+                                  ("Sorin's Thirst", ['black'])]:  # Fire // Ice is missing
+            card = Card()
+            card.cast_colors = cast_colors
+            cards[name] = card
+        rules = []
+        for i in range(32):
+            rule = ColorDeckRule()
+            rule.rule_id = f'c{i}'
+            rule.tag_id = f'c{i}'
+            rule.colors = [x for j, x in enumerate(colors) if i & (1 << j)]
+            rules.append(rule)
+        index = RuleIndex(rules)
+        self.assertEqual(len(index.by_colors), 32)
+        with self.assertLogs('dreadrise.tagging.color', 'WARNING') as logs:
+            self.assertEqual([[x.rule_id for x in index.matching(d, cards)] for d in make_decks()],
+                             [['c3'], ['c7'], ['c0'], ['c0']])
+        self.assertEqual(len(logs.output), 1)
+
+        # the index finds the same rules as checking every rule
+        _, decks = make_rules_and_decks(0, 300, seed=2)
+        rng = random.Random(2)
+        cards = {}
+        for name in {x for d in decks for x in chain(d.mainboard, d.sideboard)} - {'Card 0'}:  # one missing card
+            card = Card()
+            card.cast_colors = rng.sample(colors, rng.choice([0, 1, 1, 2]))
+            cards[name] = card
+        with self.assertLogs('dreadrise.tagging.color', 'WARNING'):
+            expected = [[x.rule_id for x in rules if color_rule_applies(d, cards, set(x.colors))] for d in decks]
+        self.assertTrue(all(len(x) == 1 for x in expected))
+        with self.assertLogs('dreadrise.tagging.color', 'WARNING') as logs:
+            self.assertEqual([[x.rule_id for x in index.matching(d, cards)] for d in decks], expected)
+        # once per deck with the missing card, instead of once per rule
+        missing = [d for d in decks if 'Card 0' in d.mainboard or 'Card 0' in d.sideboard]
+        self.assertEqual(len(logs.output), len(missing))
+
+    def test_stored_rules(self):
+        self.assertIs(_get_parser(), _get_parser())
+        decks = make_decks()
+        with self.assertLogs('dreadrise.tagging.text', 'ERROR'):
+            documents = [x.save() for x in make_rules()]
+        with self.assertNoLogs('dreadrise.tagging.text', 'ERROR'):  # the invalid rules are not parsed again
+            loaded = [TextDeckRule().load(x) for x in documents]
+        for stored, (text, expected) in zip(loaded, rule_texts):
+            self.assertIsNotNone(stored.compiled)
+            self.assertEqual([x.deck_id for x in decks if stored.applies_to(x, {})], expected, text)
+
+        documents[4]['compiled']['version'] = COMPILED_RULE_VERSION - 1
+        self.assertIsNone(TextDeckRule().load(documents[4]).compiled)
+        documents[5]['text'] += '\nCard 2 >= 1'
+        self.assertIsNone(TextDeckRule().load(documents[5]).compiled)
+        loaded[6].set_text('Card 2 >= 1')
+        self.assertEqual(loaded[6].save()['compiled']['clauses'],
+                         [{'cards': [['Card 2', 'main']], 'comparison': '>=', 'threshold': 1}])
+
+    def test_parallel_tagging(self):
+        rules = make_rules()
+        with self.assertLogs('dreadrise.tagging.text', 'ERROR'):
+            index = RuleIndex(rules)
+        tags = {x.tag_id: DeckTag().load({'tag_id': x.tag_id, 'name': x.tag_id}) for x in rules}
+        tagger = DeckTagger(index, {}, {x.rule_id for x in rules}, {x.rule_id: x for x in rules}, tags)
+        decks = make_decks()
+        expected = [
+            ('d0', {'assigned_rules': ['r0', 'r1', 'r3', 'r4', 'r5'], 'tags': ['t0', 't1', 't2'], 'is_sorted': True}),
+            ('d1', {'assigned_rules': ['r1', 'r2', 'r3', 'r5', 'r7', 'r8'], 'tags': ['t1', 't2', 't0'],
+                    'is_sorted': True}),
+            ('d2', {'assigned_rules': ['r6', 'r8'], 'tags': ['t0', 't2'], 'is_sorted': True}),
+            ('d3', {'assigned_rules': ['r6', 'r8'], 'tags': ['t0', 't2'], 'is_sorted': True})
+        ]
+        parallel = list(map_chunks(tagger.tag_chunk, iter(decks * 50), workers=2, chunk_size=16))
+        self.assertEqual([x.decks for x in parallel], [16] * 12 + [8])
+        self.assertEqual([x.actions for x in parallel], [expected * 4] * 12 + [expected * 2])
+
+    def test_candidate_query(self):
+        old = compile_rule('Card 1 + side.Card 2 >= 2')
+        new = compile_rule('*.Card 3 >= 1\nCard 1 = 4')
+        self.assertEqual(candidate_query('r', [old, new]), {'$or': [
+            {'assigned_rules': 'r'},
+            {'mainboard.Card 1': {'$gt': 0}},
+            {'mainboard.Card 3': {'$gt': 0}},
+            {'sideboard.Card 2': {'$gt': 0}},
+            {'sideboard.Card 3': {'$gt': 0}}
+        ]})
+        self.assertEqual(candidate_query('r', [[], new]), {'$or': [
+            {'assigned_rules': 'r'},
+            {'mainboard.Card 1': {'$gt': 0}},
+            {'mainboard.Card 3': {'$gt': 0}},
+            {'sideboard.Card 3': {'$gt': 0}}
+        ]})
+        self.assertEqual(candidate_query('r', [old, compile_rule('Card 1 < 1')]), {})
+
+    def test_deck_card_index(self):
+        decks = make_decks()
+        index = DeckCardIndex()
+        for d in decks:
+            index.add(d)
+        with self.assertLogs('dreadrise.tagging.text', 'ERROR'):
+            compiled = [compile_rule(x) for x, _ in rule_texts]
+        for clauses, (text, expected) in zip(compiled, rule_texts):
+            self.assertEqual([x.deck_id for x in index.matching(clauses)], expected, text)
+
+        # a replaced deck is only matched by its current cards
+        replaced = Deck()
+        replaced.deck_id = 'd0'
+        replaced.mainboard = {'Fire // Ice': 1, 'Card 2': 4}
+        index.add(replaced)
+        self.assertEqual(len(index.decks), 4)
+        self.assertEqual([[x.deck_id for x in index.matching(x)] for x in compiled[:3]], [[], ['d0', 'd1'], ['d1']])
+        self.assertEqual([x.deck_id for x in index.matching(compile_rule('Fire // Ice >= 1'))], ['d0', 'd2'])
+
+        # the decks after a deleted deck move to close the gap
+        index.remove({'d1'})
+        self.assertEqual(index.positions, {'d0': 0, 'd2': 1, 'd3': 2})
+        self.assertEqual([[x.deck_id for x in index.matching(x)] for x in compiled[1:3]], [['d0'], []])
+        self.assertEqual([x.deck_id for x in index.matching(compile_rule('Fire // Ice >= 1'))], ['d0', 'd2'])
+
+        # the index finds the same decks as the old evaluator
+        rules, decks = make_rules_and_decks(100, 200, seed=5)
+        index = DeckCardIndex()
+        for d in decks + decks[:10]:
+            index.add(d)
+        self.assertEqual(len(index.decks), len(decks))
+        with self.assertLogs('dreadrise.tagging.text', 'ERROR'):
+            compiled = [compile_rule(x.text) for x in rules]
+        for clauses, rule in zip(compiled, rules):
+            expected = [x.deck_id for x in decks if reference_text_rule_applies(x, reference_parse(rule.text))]
+            self.assertEqual([x.deck_id for x in index.matching(clauses)], expected)
@@ -27,7 +27,7 @@ from website.routers.index import b_index
 from website.routers.tag import b_tags, b_tags_api
 from website.routers.tools import b_tools, b_tools_api
 from website.routers.user import b_user, b_user_api
-from website.util import get_dist, split_import
+from website.util import compress_response, get_dist, split_import
 
 logger = logging.getLogger('dreadrise.website')
 
@@ -134,7 +134,7 @@ def after_request(r: Response) -> Response:
         g.session_dirty = False
     elif g.update_session:
         cast(Callable[[Response], None], g.update_session)(r)
-    return r
+    return compress_response(r)
 
 
 oauth.init_app(app)
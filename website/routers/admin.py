@@ -7,9 +7,11 @@ from pymongo.errors import OperationFailure
 from werkzeug import Response
 
 from shared.card_enums import Archetype, archetypes
-from shared.helpers.tagging.core import run_new_rules
+from shared.helpers.tagging.core import aggregate_rule_counts
+from shared.helpers.tagging.preview import preview_rule
+from shared.helpers.tagging.retag import check_rule_updates, start_rule_update
+from shared.helpers.tagging.text import save_compiled_rule
 from shared.helpers.util import clean_name, ireg
-from shared.types.deck import Deck
 from shared.types.deck_tag import ColorDeckRule, DeckRule, DeckTag, TextDeckRule
 from website.util import get_dist, privileges_required, requires_module, split_database
 
@@ -97,10 +99,12 @@ def rule_manager(db: Database) -> str:
         ('tag_id', 1),
         ('rule_id', 1)
     ])]
-    decks1 = [Deck().load(x) for x in db.decks.find()]
-    decks = {x.rule_id: len([y for y in decks1 if x.rule_id in y.assigned_rules]) for x in rules}
-    loaded_rules = [(x, tags[x.tag_id], decks[x.rule_id]) for x in rules]
-    return render_template('admin/rule-manager.html', tags=tags, rules=loaded_rules)
+    rule_counts = aggregate_rule_counts(db, [x.rule_id for x in rules])
+    loaded_rules = [(x, tags[x.tag_id], rule_counts.get(x.rule_id, 0)) for x in rules]
+    check_rule_updates(get_dist())
+    updates = list(db.rule_updates.find().sort('start', -1).limit(10))
+    return render_template('admin/rule-manager.html', tags=tags, rules=loaded_rules, updates=updates,
+                           updating=any(x['status'] in ('queued', 'running') for x in updates))
 
 
 @b_admin_api.route('/find-users', methods=['POST'])
@@ -282,6 +286,30 @@ def create_rules(db: Database) -> Response:
     return redirect(url_for('admin.rule_manager'))
 
 
+@b_admin_api.route('/preview-rule', methods=['POST'])
+@privileges_required(['deck_mod'])
+@requires_module('archetyping')
+@split_database
+def preview_rule_changes(db: Database) -> dict[str, Any]:
+    req = cast(dict[str, str], request.get_json())
+    rule = db.text_deck_rules.find_one({'rule_id': req['rule_id']})
+    if not rule:
+        return {'success': False, 'reason': 'Wrong rule ID!'}
+
+    try:
+        priority = int(req['priority'])
+    except ValueError:
+        return {'success': False, 'reason': 'The priority must be an integer!'}
+
+    rule_object = TextDeckRule().load(rule)
+    rule_object.priority = priority
+    rule_object.set_text(req['rule_text'].replace('\r', ''))
+    preview = preview_rule(get_dist(), rule_object)
+    if not preview['valid']:
+        return {'success': False, 'reason': 'The rule is invalid!'}
+    return {'success': True, **preview}
+
+
 @b_admin_api.route('/update-rule', methods=['POST'])
 @privileges_required(['deck_mod'])
 @requires_module('archetyping')
@@ -295,11 +323,15 @@ def update_rule(db: Database) -> Response:
         flash('Wrong rule ID!')
         return redirect(url_for('admin.rule_manager'))
 
-    new_text = rule_text.replace('\r', '')
-    db.text_deck_rules.update_one({'rule_id': rule_id}, {'$set': {'priority': int(priority), 'text': new_text}})
-
     rule_object = TextDeckRule().load(rule)
+    old_rule = rule_object.get_compiled()
     rule_object.priority = int(priority)
-    rule_object.text = new_text
-    run_new_rules(get_dist(), [rule_object])
+    rule_object.set_text(rule_text.replace('\r', ''))
+    db.text_deck_rules.update_one({'rule_id': rule_id}, {'$set': {
+        'priority': rule_object.priority,
+        'text': rule_object.text,
+        'compiled': save_compiled_rule(rule_object.text, rule_object.get_compiled())
+    }})
+    start_rule_update(get_dist(), rule_object, old_rule)
+    flash(f'Rule {rule_id} saved, the decks are being re-tagged.')
     return redirect(url_for('admin.rule_manager'))
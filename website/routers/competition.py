@@ -1,17 +1,16 @@
 import json
 from math import ceil
-from typing import Any
 
 from flask import Blueprint, abort, flash, make_response, render_template, request
 from plotly import utils
 from pymongo.database import Database
 from werkzeug import Response
 
-from shared.helpers.db_loader import load_competition_single, load_competitions
-from shared.helpers.metagame import metagame_breakdown
+from shared.helpers.db_loader import load_competition_bundle, load_competition_single, load_competitions
+from shared.helpers.metagame import aggregate_tag_stats, metagame_breakdown_from_stats
+from shared.types.caching import CompetitionSummary
 from shared.types.competition import Competition
-from shared.types.deck import Deck
-from website.util import get_dist, split_database, split_import
+from website.util import compact_requested, get_dist, split_database, split_import
 
 b_competition = Blueprint('competition', __name__)
 
@@ -44,10 +43,8 @@ def api_competitions(db: Database, page: int = 0) -> dict:
     fmt = request.args.get('format', constants.DefaultFormat)
     query = {} if 'all' in fmt else {'format': fmt}
     ccount = db.competitions.count_documents(query)
-    competition_cursor = db.competitions.find(query, sort=[('date', -1)])[page * 12 - 12:page * 12]  # type: ignore
-    comps = [Competition().load(x) for x in competition_cursor]
-    dist = get_dist()
-    loaded_comps = [load_competition_single(dist, x, set()).jsonify() for x in comps]
+    loaded = load_competitions(get_dist(), query, sort=[('date', -1)], skip=max(page - 1, 0) * 12, limit=12)
+    loaded_comps = [x.jsonify() for x in loaded]
     return {
         'success': True,
         'matches': ccount,
@@ -59,12 +56,21 @@ def api_competitions(db: Database, page: int = 0) -> dict:
 
 
 @b_competition_api.route('/single/<competition_id>')
-def api_single_competition(competition_id: str) -> dict:
+@b_competition_api.route('/single/<competition_id>/<int:page>')
+@split_database
+def api_single_competition(db: Database, competition_id: str, page: int = 1) -> dict:
     dist = get_dist()
-    competitions = load_competitions(dist, {'competition_id': competition_id}, {'users', 'tags', 'cards', 'decks'})
-    if not competitions:
+    competition_obj = db.competitions.find_one({'competition_id': competition_id})
+    if not competition_obj:
         return {}
-    return competitions[0].jsonify()
+    competition = Competition().load(competition_obj)
+    page = max(page, 1)
+    compact = compact_requested()
+    bundle = load_competition_bundle(dist, competition, page, compact)
+    if bundle:
+        return bundle
+    lc = load_competition_single(dist, competition, {'users', 'tags', 'cards', 'decks'}, page)
+    return lc.jsonify_compact() if compact else lc.jsonify()
 
 
 @b_competition_api.route('/metagame/<competition_id>')
@@ -76,16 +82,14 @@ def api_metagame_breakdown(db: Database, competition_id: str) -> Response:
         flash(f'Competition with ID {competition_id} not found.')
         abort(404)
 
-    # decks = list(Deck.objects(competition=competition))
-    query: dict[str, Any] = {'competition': competition_id}
-    deck_count = db.decks.count_documents(query)
-    if deck_count > 500:
-        min_wins = 5 if deck_count > 2000 else 4
-        query['wins'] = {'$gte': min_wins}
+    summary_obj = db.competition_summaries.find_one({'competition': competition_id})
+    if summary_obj:
+        cs = CompetitionSummary().load(summary_obj)
+        stats = {x['tag']: (x['deck_count'], x['wins'], x['losses']) for x in cs.metagame}
     else:
-        min_wins = 0
-    decks = [Deck().load(x) for x in db.decks.find(query)]
-    fig = metagame_breakdown(db, decks, min_wins == 0)
+        # decks = list(Deck.objects(competition=competition))
+        stats = aggregate_tag_stats(db, {'competition': competition_id})
+    fig = metagame_breakdown_from_stats(db, stats)
 
     resp = make_response(json.dumps(fig, cls=utils.PlotlyJSONEncoder))
     resp.headers['Content-Type'] = 'application/json'
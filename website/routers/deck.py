@@ -8,11 +8,12 @@ from plotly import utils
 from pymongo.database import Database
 from werkzeug import Response
 
-from shared.helpers.db_loader import generate_popular_cards, load_deck_data, load_multiple_decks
-from shared.helpers.deckcheck.core import deck_check
-from shared.helpers.deckcheck.karsten import karsten_dict
+from shared.helpers.database import bump_deck_generation
+from shared.helpers.db_loader import (DECK_PAGE_SIZE, aggregate_popular_cards, compact_deck_list, deck_page_info,
+                                      find_decks, load_deck_data, load_multiple_decks)
+from shared.helpers.deckcheck.cache import cached_deck_checks, cached_karsten
 from shared.helpers.masonry import generate_masonry
-from shared.helpers.metagame import metagame_breakdown
+from shared.helpers.metagame import aggregate_tag_stats, metagame_breakdown_from_stats
 from shared.helpers.query import deck_privacy
 from shared.helpers.util2 import build_deck
 from shared.type_defaults import bye_user, get_blank_user
@@ -20,7 +21,7 @@ from shared.types.card import Card
 from shared.types.competition import Competition
 from shared.types.deck import Deck
 from shared.types.user import User
-from website.util import get_dist, get_uid, has_priv, split_database, split_import, try_catch_json
+from website.util import compact_requested, get_dist, get_uid, has_priv, split_database, split_import, try_catch_json
 
 b_deck = Blueprint('deck', __name__)
 
@@ -46,7 +47,7 @@ def single_deck(db: Database, deck_id: str) -> str:
             abort(404)
         competition: Competition | None = Competition().load(comp)
         opposing_deck_ids = [x.opposing_deck_id for x in loaded_deck.games]
-        opposing_decks = {x['deck_id']: Deck().load(x) for x in db.decks.find({'deck_id': {'$in': opposing_deck_ids}})}
+        opposing_decks = {x.deck_id: x for x in find_decks(db, {'deck_id': {'$in': opposing_deck_ids}}, 'reference')}
         opponent_ids = [x.author for x in opposing_decks.values()]
         opponents = {x['user_id']: User().load(x) for x in db.users.find({'user_id': {'$in': opponent_ids}})}
 
@@ -128,11 +129,14 @@ def delete_deck(db: Database, deck_id: str = '') -> Response:
 
 
 b_deck_api = Blueprint('deck_api', __name__)
+# the maximum amount of decks in a batch check request
+MAX_CHECK_BATCH = 200
 
 
 @b_deck_api.route('/with-card/<card_id>')
+@b_deck_api.route('/with-card/<card_id>/<int:page>')
 @split_database
-def api_decks_with_card(db: Database, card_id: str) -> dict:
+def api_decks_with_card(db: Database, card_id: str, page: int = 1) -> dict:
     card = db.cards.find_one({'card_id': card_id})
     if not card:
         return {'decks': [], 'popular_cards': []}
@@ -147,22 +151,21 @@ def api_decks_with_card(db: Database, card_id: str) -> dict:
         base_query = {'$and': [base_query, {'format': fmt}]}
     query = deck_privacy(base_query, get_uid(), True, is_admin=has_priv('deck_admin'))
 
+    # only one page of decks is loaded, the popular cards are aggregated over all of them
+    page = max(page, 1)
     deck_count = db.decks.count_documents(query)
-    if deck_count > 250:
-        min_wins = 5 if deck_count > 1000 else 4
-        query = {'$and': [{'wins': {'$gte': min_wins}}, query]}
-    else:
-        min_wins = 0
-    decks = [Deck().load(x) for x in db.decks.find(query, sort=[('date', -1)])]
+    decks = find_decks(db, query, 'listing', sort=[('date', -1), ('deck_id', 1)], skip=(page - 1) * DECK_PAGE_SIZE,
+                       limit=DECK_PAGE_SIZE)
 
     dist = get_dist()
-    loaded_decks, cd = load_multiple_decks(dist, decks)
-    popular_card_data = generate_popular_cards(dist, cd, loaded_decks, threshold=10)
-    base: dict[str, Any] = {'decks': [x.jsonify() for x in loaded_decks],
-                            'popular_cards': [x.jsonify() for x in popular_card_data]}
-    if min_wins:
-        base['partial_load'] = True
-    return base
+    loaded_decks, _ = load_multiple_decks(dist, decks)
+    popular_card_data = aggregate_popular_cards(dist, query, threshold=10)
+    page_info = {'deck_count': deck_count, **deck_page_info(deck_count, page)}
+    if compact_requested():
+        return {**compact_deck_list(loaded_decks, popular_card_data), **page_info}
+    return {'decks': [x.jsonify() for x in loaded_decks],
+            'popular_cards': [x.jsonify() for x in popular_card_data],
+            **page_info}
 
 
 @b_deck_api.route('/metagame-with-card/<card_id>')
@@ -183,15 +186,7 @@ def api_card_metagame_breakdown(db: Database, card_id: str) -> Response:
         base_query = {'$and': [base_query, {'format': fmt}]}
 
     query = {'$and': [base_query, {'competition': {'$exists': 1}}]}
-
-    deck_count = db.decks.count_documents(query)
-    if deck_count > 250:
-        min_wins = 5 if deck_count > 1000 else 4
-        query = {'$and': [{'wins': {'$gte': min_wins}}, query]}
-    else:
-        min_wins = 0
-    decks = [Deck().load(x) for x in db.decks.find(query)]
-    fig = metagame_breakdown(db, decks, min_wins == 0)
+    fig = metagame_breakdown_from_stats(db, aggregate_tag_stats(db, query))
 
     resp = make_response(json.dumps(fig, cls=utils.PlotlyJSONEncoder))
     resp.headers['Content-Type'] = 'application/json'
@@ -228,7 +223,7 @@ def check_deck() -> dict:
     deck_list = req['deck_list']
     deck = build_deck(deck_list)
     deck.format = str(req['format'])
-    status, errors, warnings, messages = deck_check(get_dist(), deck, constants.DeckCheckers)
+    status, errors, warnings, messages = cached_deck_checks(get_dist(), [deck], constants.DeckCheckers)[0]
     return {
         'status': status,
         'errors': errors,
@@ -242,7 +237,7 @@ def karsten() -> dict:
     req = cast(dict[str, Any], request.get_json())
     deck_list = req['deck_list']
     deck = build_deck(deck_list)
-    status, errors, warnings, messages = karsten_dict(get_dist(), deck)
+    status, errors, warnings, messages = cached_karsten(get_dist(), deck)
     return {
         'status': status,
         'errors': errors,
@@ -251,6 +246,29 @@ def karsten() -> dict:
     }
 
 
+@b_deck_api.route('/check-batch', methods=['POST'])
+@try_catch_json
+def check_deck_batch() -> dict:
+    constants = split_import()
+    req = cast(dict[str, Any], request.get_json())
+    if len(req['decks']) > MAX_CHECK_BATCH:
+        abort(make_response({'error': f'At most {MAX_CHECK_BATCH} decks can be checked at once.'}, 400))
+    decks = []
+    for x in req['decks']:
+        deck = build_deck(x['deck_list'])
+        deck.format = str(x['format'])
+        decks.append(deck)
+    results = cached_deck_checks(get_dist(), decks, constants.DeckCheckers)
+    return {
+        'results': [{
+            'status': status,
+            'errors': errors,
+            'warnings': warnings,
+            'messages': messages
+        } for status, errors, warnings, messages in results]
+    }
+
+
 @b_deck_api.route('/formats')
 def formats() -> dict:
     stuff = split_import()
@@ -287,7 +305,7 @@ def create_deck(db: Database) -> dict:
         generated.format = fmt
         generated.privacy = priv
         generated.date = datetime.datetime.utcnow()
-        db.decks.insert_one(generated.save())
+        db.decks.insert_one({**generated.save(), 'generation': bump_deck_generation(db)})
         return {'success': True, 'deck_id': deck_id}
 
     can_edit = not deck.competition and 'user' in session and deck.author == session['user']['user_id']
@@ -299,6 +317,7 @@ def create_deck(db: Database) -> dict:
                             'mainboard': generated.mainboard,
                             'sideboard': generated.sideboard,
                             'privacy': priv,
-                            'format': fmt
+                            'format': fmt,
+                            'generation': bump_deck_generation(db)
                         }})
     return {'success': True, 'deck_id': deck_id}
@@ -16,11 +16,10 @@ logger = logging.getLogger('dreadrise.website.index')
 def index() -> str:
     logger.debug('Start /index')
     constants = split_import()
-    loaded = load_competitions(get_dist(), {'type': {'$in': constants.IndexTypes}})
+    loaded = load_competitions(get_dist(), {'type': {'$in': constants.IndexTypes}}, sort=[('date', -1)], limit=3)
     logger.debug('Loaded competitions')
-    loaded.sort(key=lambda x: x.competition.date, reverse=True)
 
-    return render_template('index/index.html', comps=loaded[:3])
+    return render_template('index/index.html', comps=loaded)
 
 
 @b_index.route('/formats')
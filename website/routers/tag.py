@@ -4,12 +4,11 @@ from typing import Any
 from flask import Blueprint, abort, flash, render_template, request
 from pymongo.database import Database
 
-from shared.helpers.db_loader import load_deck_analysis
+from shared.helpers.db_loader import find_decks, load_deck_analysis
 from shared.helpers.query import deck_privacy
 from shared.helpers.util import clean_name
 from shared.helpers.util2 import get_dist_constants
 from shared.types.card import Card
-from shared.types.deck import Deck
 from shared.types.deck_tag import DeckTag
 from website.util import get_dist, get_uid, has_priv, split_database, split_import
 
@@ -32,7 +31,7 @@ def single(db: Database, tag_id: str) -> str:
         init_query['format'] = fmt
 
     query = deck_privacy(init_query, get_uid(), True, is_admin=has_priv('deck_admin'))
-    decks = [Deck().load(x) for x in db.decks.find(query)]
+    decks = find_decks(db, query, 'analysis')
     deck_analysis = load_deck_analysis(get_dist(), decks, threshold=0.05 if 'all' in fmt else 0.2)
 
     tag_cover = db.archetype_cache.find_one({'tag': tag_id, 'format': fmt})
@@ -4,12 +4,11 @@ from flask import Blueprint, Response, abort, flash, make_response, render_templ
 from plotly import utils
 from pymongo.database import Database
 
-from shared.helpers.db_loader import generate_popular_cards, load_multiple_decks
+from shared.helpers.db_loader import compact_deck_list, find_decks, generate_popular_cards, load_multiple_decks
 from shared.helpers.metagame import metagame_breakdown
 from shared.helpers.query import deck_privacy
-from shared.types.deck import Deck
 from shared.types.user import User
-from website.util import get_dist, get_uid, has_priv, split_database, split_import
+from website.util import compact_requested, get_dist, get_uid, has_priv, split_database, split_import
 
 b_user = Blueprint('user', __name__)
 b_user_api = Blueprint('user_api', __name__)
@@ -41,11 +40,13 @@ def api_decks_by_user(db: Database, user_id: str) -> dict:
     if 'all' not in fmt:
         query['format'] = fmt
     query = deck_privacy(query, get_uid(), True, is_admin=has_priv('deck_admin'))
-    decks = [Deck().load(x) for x in db.decks.find(query, sort=[('date', -1)])]
+    decks = find_decks(db, query, 'listing', sort=[('date', -1)])
 
     dist = get_dist()
     loaded_decks, cd = load_multiple_decks(dist, decks)
     popular_card_data = generate_popular_cards(dist, cd, loaded_decks, threshold=10)
+    if compact_requested():
+        return compact_deck_list(loaded_decks, popular_card_data)
     base = {'decks': [x.jsonify() for x in loaded_decks], 'popular_cards': [x.jsonify() for x in popular_card_data]}
     return base
 
@@ -64,7 +65,7 @@ def api_user_metagame_breakdown(db: Database, user_id: str) -> Response:
     if 'all' not in fmt:
         query['format'] = fmt
 
-    decks = [Deck().load(x) for x in db.decks.find(query)]
+    decks = find_decks(db, query, 'metagame')
     fig = metagame_breakdown(db, decks)
 
     resp = make_response(json.dumps(fig, cls=utils.PlotlyJSONEncoder))
@@ -34,12 +34,56 @@ function deck_sort(key, obj) {
     })
 }
 
+function expand_v2(data) {
+    // restores the v1 format from the compact (?v=2) format of deck list responses
+    if (data.v !== 2)
+        return data
+    const t = data.tables
+    const entity = (table, key, nameKey, i) => i < 0 ? false : {[key]: t[table].id[i], [nameKey]: t[table].name[i]}
+    const d = data.decks
+    const p = data.popular_cards
+    return {
+        ...data,
+        decks: d.deck_id.map((deck_id, i) => ({
+            deck: {
+                deck_id: deck_id,
+                name: d.name[i],
+                wins: d.wins[i],
+                losses: d.losses[i],
+                ties: d.ties[i],
+                color_data: d.color_data[i],
+                format: t.formats.id[d.format[i]]
+            },
+            author: entity('users', 'user_id', 'nickname', d.author[i]),
+            tags: d.tags[i].map(x => entity('tags', 'tag_id', 'name', x)),
+            competition: entity('competitions', 'competition_id', 'name', d.competition[i]),
+            format: t.formats.name[d.format[i]]
+        })),
+        popular_cards: p.card.map((card, i) => ({
+            card: entity('cards', 'card_id', 'name', card),
+            weight: p.weight[i],
+            wins: p.wins[i],
+            losses: p.losses[i]
+        }))
+    }
+}
+
 const deck_list = {
     props: ['hide', 'data', 'format'],
+    emits: ['page'],
     template: `
-    <div v-if="data.partial_load" class="alert alert-info alert-dismissible fade show mt-1">
-        <span>This competition has too many decks to fully load it. Only the best decks were loaded.</span>
-        <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
+    <div v-if="!data.loading && data.last_page > 1" class="row g-3 align-items-center mb-1 mt-1">
+        <div class="col">
+            <span class="text-success">[[ data.deck_count ]] decks found - current page [[ data.page_num ]]/[[ data.last_page ]]</span>
+        </div>
+        <div class="col-auto">
+            <button class="btn btn-dark" @click="$emit('page', data.page_num - 1)"
+                    :disabled="data.page_num <= 1">Prev</button>
+        </div>
+        <div class="col-auto">
+            <button class="btn btn-dark" @click="$emit('page', data.page_num + 1)"
+                    :disabled="data.page_num >= data.last_page">Next</button>
+        </div>
     </div>
     <div id="deck-list">
         <table class="table table-striped" v-if="!data.loading && data.decks.length > 0">
@@ -1,9 +1,10 @@
+import gzip
 import logging
 import traceback
 from functools import wraps
 from typing import Any, Callable
 
-from flask import abort, g, jsonify, make_response, request
+from flask import Response, abort, g, jsonify, make_response, request
 
 from shared.core_enums import Distribution, default_distribution, distribution_rollback
 from shared.helpers.database import connect
@@ -105,3 +106,29 @@ def get_uid() -> str | None:
 def has_priv(priv: str) -> bool:
     session = g.actual_session
     return session['user'] and priv in session['user']['privileges'] and session['user']['privileges'][priv]
+
+
+def compact_requested() -> bool:
+    """
+    Check whether the client asked for the v2 (compact) format of deck list responses.
+    :return: True if `?v=2` was passed
+    """
+    return request.args.get('v') == '2'
+
+
+def compress_response(r: Response) -> Response:
+    """
+    Gzip a JSON response if the client accepts it and the response is large enough to benefit.
+    :param r: the response
+    :return: the same response, compressed if applicable
+    """
+    if r.status_code != 200 or r.direct_passthrough or r.mimetype != 'application/json' or \
+            'Content-Encoding' in r.headers or 'gzip' not in request.headers.get('Accept-Encoding', ''):
+        return r
+    data = r.get_data()
+    if len(data) < 1024:
+        return r
+    r.set_data(gzip.compress(data, compresslevel=6))
+    r.headers['Content-Encoding'] = 'gzip'
+    r.vary.add('Accept-Encoding')
+    return r